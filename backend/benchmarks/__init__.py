@@ -0,0 +1 @@
+# Benchmark scripts
\ No newline at end of file
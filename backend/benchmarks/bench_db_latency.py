@@ -0,0 +1,98 @@
+"""Compare p99 latency of blocking vs async database sessions under concurrent load.
+
+Mounts two versions of the same endpoint on a throwaway app: one using the
+old blocking ``SessionLocal()`` pattern and one using the async ``get_db``
+dependency. Each runs a slow query while a cheap ``/ping`` endpoint is probed
+concurrently, which is what the lunch-rush KDS traffic looks like.
+
+Usage (needs the Postgres from docker-compose):
+    python -m benchmarks.bench_db_latency --requests 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import SessionLocal, get_db
+
+QUERY = text("SELECT pg_sleep(:delay)")
+
+app = FastAPI()
+
+
+@app.get("/blocking")
+async def blocking_query(delay: float):
+    db = SessionLocal()
+    try:
+        db.execute(QUERY, {"delay": delay})
+    finally:
+        db.close()
+    return {"ok": True}
+
+
+@app.get("/async")
+async def async_query(delay: float, db: AsyncSession = Depends(get_db)):
+    await db.execute(QUERY, {"delay": delay})
+    return {"ok": True}
+
+
+@app.get("/ping")
+async def ping():
+    return {"ok": True}
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_mode(client, path, total, concurrency, delay):
+    semaphore = asyncio.Semaphore(concurrency)
+    query_latencies, ping_latencies = [], []
+
+    async def timed(url, bucket, **params):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.get(url, params=params)
+            response.raise_for_status()
+            bucket.append((time.perf_counter() - start) * 1000)
+
+    tasks = []
+    for _ in range(total):
+        tasks.append(timed(path, query_latencies, delay=delay))
+        tasks.append(timed("/ping", ping_latencies))
+    start = time.perf_counter()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    return {
+        "query_p50": statistics.median(query_latencies),
+        "query_p99": percentile(query_latencies, 99),
+        "ping_p50": statistics.median(ping_latencies),
+        "ping_p99": percentile(ping_latencies, 99),
+        "throughput": total / elapsed,
+    }
+
+
+async def main(args):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for label, path in (("before (blocking SessionLocal)", "/blocking"), ("after (AsyncSession)", "/async")):
+            result = await run_mode(client, path, args.requests, args.concurrency, args.delay)
+            print(f"{label}:")
+            print(f"  query p50 {result['query_p50']:.1f} ms  p99 {result['query_p99']:.1f} ms")
+            print(f"  ping  p50 {result['ping_p50']:.1f} ms  p99 {result['ping_p99']:.1f} ms")
+            print(f"  {result['throughput']:.1f} queries/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--delay", type=float, default=0.02, help="seconds each query sleeps in Postgres")
+    asyncio.run(main(parser.parse_args()))
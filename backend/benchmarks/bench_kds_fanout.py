@@ -0,0 +1,118 @@
+"""Measure KDS event fan-out latency across N workers and M screens per worker.
+
+Each worker is a separate process running the real KdsEventRelay and
+ConnectionManager with M in-memory screens. The producer publishes events
+through publish_kds_event and every screen records publish-to-delivery
+latency. Per-order ordering is checked on every screen as well.
+
+Usage (needs the Redis from docker-compose):
+    python -m benchmarks.bench_kds_fanout --workers 4 --screens 10 --events 500
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import statistics
+import time
+
+
+class RecordingScreen:
+    """Stands in for a kitchen tablet's websocket"""
+
+    def __init__(self):
+        self.latencies = []
+        self.last_seen = {}
+        self.out_of_order = 0
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        message = json.loads(text)
+        self.latencies.append(time.time() - message["sent_at"])
+        order_id, step = message["order_id"], message["step"]
+        if self.last_seen.get(order_id, -1) > step:
+            self.out_of_order += 1
+        self.last_seen[order_id] = step
+
+    async def close(self, code=1000):
+        pass
+
+
+def run_worker(screens, expected, ready, results):
+    from routes.kds import ConnectionManager
+    from services.kds_events import KdsEventRelay
+
+    async def main():
+        manager = ConnectionManager(queue_size=expected + 1)
+        sockets = [RecordingScreen() for _ in range(screens)]
+        for socket in sockets:
+            await manager.connect(socket)
+        relay = KdsEventRelay(manager.broadcast_text, block_ms=100)
+        relay_task = asyncio.create_task(relay.run())
+        await asyncio.sleep(0.5)  # let XREAD park on the stream tail
+        ready.set()
+        while sum(len(s.latencies) for s in sockets) < expected * screens:
+            await asyncio.sleep(0.05)
+        relay_task.cancel()
+        results.put((
+            [latency for s in sockets for latency in s.latencies],
+            sum(s.out_of_order for s in sockets),
+        ))
+
+    asyncio.run(main())
+
+
+async def produce(events, orders):
+    from services.kds_events import publish_kds_event
+
+    for i in range(events):
+        await publish_kds_event({
+            "type": "order_update",
+            "order_id": f"bench-{i % orders}",
+            "step": i // orders,
+            "sent_at": time.time(),
+        })
+
+
+def main(args):
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    readies = []
+    workers = []
+    for _ in range(args.workers):
+        ready = ctx.Event()
+        worker = ctx.Process(target=run_worker, args=(args.screens, args.events, ready, results))
+        worker.start()
+        readies.append(ready)
+        workers.append(worker)
+    for ready in readies:
+        ready.wait()
+
+    start = time.perf_counter()
+    asyncio.run(produce(args.events, args.orders))
+    latencies, out_of_order = [], 0
+    for _ in workers:
+        worker_latencies, worker_out_of_order = results.get()
+        latencies.extend(worker_latencies)
+        out_of_order += worker_out_of_order
+    elapsed = time.perf_counter() - start
+    for worker in workers:
+        worker.join()
+
+    latencies.sort()
+    print(f"{args.workers} workers x {args.screens} screens, {args.events} events "
+          f"-> {len(latencies)} deliveries in {elapsed:.2f}s")
+    print(f"  latency p50 {statistics.median(latencies) * 1000:.2f} ms"
+          f"  p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f} ms"
+          f"  max {latencies[-1] * 1000:.2f} ms")
+    print(f"  out-of-order deliveries: {out_of_order}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--screens", type=int, default=10)
+    parser.add_argument("--events", type=int, default=500)
+    parser.add_argument("--orders", type=int, default=20, help="distinct orders the events are spread over")
+    main(parser.parse_args())
@@ -0,0 +1,106 @@
+"""Login throughput and the latency other endpoints see during a login burst.
+
+Serves a login endpoint that verifies a bcrypt hash and a trivial endpoint
+from one in-process ASGI app, and fires concurrent logins while probing the
+trivial endpoint at a fixed interval. Runs twice: with verification inline
+on the event loop (the old behaviour) and through PasswordHasher.
+
+Usage (no services needed):
+    python -m benchmarks.bench_password_hashing --logins 200 --concurrency 20 --rounds 12
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+from fastapi import FastAPI, HTTPException
+
+from services.password_hasher import HasherBusy, PasswordHasher, make_context
+
+
+def percentile(values, pct):
+    return sorted(values)[min(len(values) - 1, int(len(values) * pct / 100))] * 1000
+
+
+def build_app(mode, context, stored_hash, hasher):
+    app = FastAPI()
+
+    @app.post("/login")
+    async def login():
+        if mode == "inline":
+            valid = context.verify("secret", stored_hash)
+        else:
+            try:
+                valid = await hasher.verify("secret", stored_hash)
+            except HasherBusy:
+                raise HTTPException(status_code=503)
+        if not valid:
+            raise HTTPException(status_code=401)
+        return {"ok": True}
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+
+async def run_mode(mode, args, context, stored_hash):
+    hasher = PasswordHasher(context, workers=args.workers, max_waiting=args.max_waiting)
+    app = build_app(mode, context, stored_hash, hasher)
+    login_times, ping_times = [], []
+    statuses = {}
+    remaining = iter(range(args.logins))
+    done = asyncio.Event()
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def login_worker():
+            for _ in remaining:
+                start = time.perf_counter()
+                response = await client.post("/login")
+                login_times.append(time.perf_counter() - start)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        async def prober():
+            # Latency counts from when the probe was due, so time spent
+            # waiting for a blocked event loop shows up too
+            while not done.is_set():
+                due = time.perf_counter() + args.probe_ms / 1000
+                await asyncio.sleep(args.probe_ms / 1000)
+                await client.get("/ping")
+                ping_times.append(time.perf_counter() - due)
+
+        probe = asyncio.create_task(prober())
+        start = time.perf_counter()
+        await asyncio.gather(*(login_worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probe
+    hasher.shutdown()
+
+    print(f"{mode}: {args.logins / elapsed:.1f} logins/s over {elapsed:.2f} s, statuses {statuses}")
+    print(f"  login  p50 {percentile(login_times, 50):.1f} ms  p99 {percentile(login_times, 99):.1f} ms")
+    print(f"  ping   p50 {percentile(ping_times, 50):.1f} ms  p99 {percentile(ping_times, 99):.1f} ms  "
+          f"max {max(ping_times) * 1000:.1f} ms  mean {statistics.mean(ping_times) * 1000:.1f} ms "
+          f"({len(ping_times)} probes)")
+    if mode == "pool":
+        print(f"  hasher {hasher.metrics()}")
+
+
+async def main(args):
+    context = make_context(args.rounds)
+    stored_hash = context.hash("secret")
+    for mode in ("inline", "pool"):
+        await run_mode(mode, args, context, stored_hash)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=2, help="hashing threads in pool mode")
+    parser.add_argument("--max-waiting", type=int, default=64)
+    parser.add_argument("--probe-ms", type=float, default=10, help="interval between /ping probes")
+    asyncio.run(main(parser.parse_args()))
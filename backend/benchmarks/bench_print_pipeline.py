@@ -0,0 +1,121 @@
+"""Push orders through queue_print_job -> dispatcher -> station workers -> dummy printers.
+
+Seeds bench orders in Postgres, queues them with the regular print queue,
+runs the real PrintWorkerPool against recording printers with simulated
+latency and failures, and reports tickets per second and retry behaviour.
+Everything runs under its own queue prefix and is cleaned up afterwards.
+
+Usage (needs the Postgres and Redis from docker-compose, no printer):
+    python -m benchmarks.bench_print_pipeline --orders 2000 --latency-ms 5 --failure-rate 0.02
+"""
+import argparse
+import json
+import os
+import time
+import uuid
+
+
+def configure(args):
+    # Must happen before the print modules are imported: they read these at import time
+    os.environ["PRINT_QUEUE"] = f"bench_print_queue_{uuid.uuid4().hex[:8]}"
+    os.environ["PRINT_RETRY_DELAY"] = str(args.retry_delay)
+    os.environ["PRINT_BATCH_SIZE"] = str(args.batch)
+    dummy = {"connection_type": "dummy", "latency": args.latency_ms / 1000, "failure_rate": args.failure_rate}
+    os.environ["PRINT_STATIONS"] = json.dumps({
+        "kitchen": {**dummy, "categories": ["*"]},
+        "bar": {**dummy, "categories": ["bench-drinks"]},
+    })
+
+
+def main(args):
+    configure(args)
+
+    from sqlalchemy import delete, func, select
+
+    from database import SessionLocal, redis_client
+    from models.menu import MenuItem
+    from models.order import Order
+    from services.print_dispatcher import PrintWorkerPool, station_stats
+    from services.print_queue_service import PRINT_QUEUE, PrinterService
+
+    run_id = uuid.uuid4().hex[:8]
+    menu = [
+        MenuItem(id=f"bench-{run_id}-burger", name="Burger", price=12.5, category="bench-mains", prep_time=12),
+        MenuItem(id=f"bench-{run_id}-fries", name="Fries", price=4.0, category="bench-sides", prep_time=5),
+        MenuItem(id=f"bench-{run_id}-cola", name="Cola", price=3.0, category="bench-drinks", prep_time=1),
+    ]
+    order_ids = [f"bench-{run_id}-{i}" for i in range(args.orders)]
+
+    db = SessionLocal()
+    try:
+        db.add_all(menu)
+        db.bulk_insert_mappings(Order, [{
+            "id": order_id,
+            "items": [
+                {"item_id": menu[0].id, "quantity": 1, "special_requests": None},
+                {"item_id": menu[1].id, "quantity": 2, "special_requests": None},
+                {"item_id": menu[2].id, "quantity": 1, "special_requests": None},
+            ],
+            "payment_method": "cash",
+            "status": "received",
+            "print_status": "pending",
+            "print_attempts": 0,
+        } for order_id in order_ids])
+        db.commit()
+
+        pool = PrintWorkerPool()
+        pool.start()
+
+        queue = PrinterService(db)
+        start = time.perf_counter()
+        for order_id in order_ids:
+            queue.queue_print_job(order_id)
+
+        done = 0
+        deadline = start + args.timeout
+        while time.perf_counter() < deadline:
+            done = db.scalar(select(func.count()).where(
+                Order.id.in_(order_ids), Order.print_status.in_(["completed", "failed"])
+            ))
+            db.rollback()
+            if done == len(order_ids):
+                break
+            time.sleep(0.2)
+        elapsed = time.perf_counter() - start
+
+        summary = db.execute(
+            select(Order.print_status, func.count(), func.sum(Order.print_attempts))
+            .where(Order.id.in_(order_ids))
+            .group_by(Order.print_status)
+        ).all()
+        stats = station_stats()
+
+        print(f"{done}/{len(order_ids)} orders finished in {elapsed:.2f}s "
+              f"({done / elapsed:.1f} orders/s)")
+        for status, count, attempts in summary:
+            print(f"  {status}: {count} orders, {attempts or 0} failed attempts")
+        for station, station_stat in stats.items():
+            print(f"  {station}: printed {station_stat['printed']} tickets "
+                  f"({station_stat['printed'] / elapsed:.1f}/s), "
+                  f"failed writes {station_stat['failed']}, dead-lettered {station_stat['dead']}, "
+                  f"avg {station_stat['avg_print_ms'] or 0:.2f} ms/ticket")
+    finally:
+        db.rollback()
+        db.execute(delete(Order).where(Order.id.in_(order_ids)))
+        db.execute(delete(MenuItem).where(MenuItem.id.in_([item.id for item in menu])))
+        db.commit()
+        db.close()
+        keys = list(redis_client.scan_iter(f"{PRINT_QUEUE}*"))
+        if keys:
+            redis_client.delete(*keys)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="simulated time per printer write")
+    parser.add_argument("--failure-rate", type=float, default=0.02, help="probability a printer write fails")
+    parser.add_argument("--retry-delay", type=float, default=0.5, help="seconds before a failed ticket is retried")
+    parser.add_argument("--batch", type=int, default=10, help="tickets per printer write")
+    parser.add_argument("--timeout", type=float, default=300)
+    main(parser.parse_args())
@@ -0,0 +1,68 @@
+"""Latency of slot bookings and "available slots for this basket" lookups as a day fills up.
+
+Books orders with random baskets and pickup times on a day far in the
+future, timing every booking and an availability lookup after each one.
+All keys it creates are deleted afterwards.
+
+Usage (needs the Redis from docker-compose):
+    python -m benchmarks.bench_slot_engine --bookings 2000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+from database import async_redis_client
+from services.slot_engine import (
+    CLOSING_HOUR, OPENING_HOUR, SLOT_BOOKING_PREFIX, SLOT_MINUTES,
+    available_slots, basket_weight, book, load_key,
+)
+
+PREP_TIMES = {"burger": 12, "fries": 5, "salad": 8, "pizza": 15, "cola": 1}
+DAY = date(2099, 1, 1)
+
+
+def percentile(values, pct):
+    return sorted(values)[min(len(values) - 1, int(len(values) * pct / 100))] * 1000
+
+
+async def main(args):
+    rng = random.Random(args.seed)
+    run_id = uuid.uuid4().hex[:8]
+    slots_per_day = (CLOSING_HOUR - OPENING_HOUR) * 60 // SLOT_MINUTES
+    opening = datetime(DAY.year, DAY.month, DAY.day, OPENING_HOUR)
+    now = opening - timedelta(days=1)
+
+    book_times, lookup_times = [], []
+    booked = 0
+    try:
+        for i in range(args.bookings):
+            basket = [(item, rng.randint(1, 3)) for item in rng.sample(list(PREP_TIMES), rng.randint(1, 3))]
+            weight, longest = basket_weight(basket, PREP_TIMES)
+            pickup = opening + timedelta(minutes=SLOT_MINUTES * rng.randint(1, slots_per_day))
+
+            start = time.perf_counter()
+            booked += await book(f"bench-{run_id}-{i}", pickup, weight, longest)
+            book_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            await available_slots(DAY, weight, longest, now=now)
+            lookup_times.append(time.perf_counter() - start)
+    finally:
+        keys = [key async for key in async_redis_client.scan_iter(f"{SLOT_BOOKING_PREFIX}bench-{run_id}-*")]
+        await async_redis_client.delete(load_key(DAY), load_key(DAY - timedelta(days=1)), *keys)
+
+    print(f"{args.bookings} booking attempts, {booked} accepted, {args.bookings - booked} rejected as full")
+    for label, times in (("book", book_times), ("available slots", lookup_times)):
+        print(f"  {label:<16} p50 {percentile(times, 50):.3f} ms  p99 {percentile(times, 99):.3f} ms  "
+              f"mean {statistics.mean(times) * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bookings", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,91 @@
+"""Tickets per second for per-command printing vs pre-rendered and batched buffers.
+
+The printer is a Dummy that counts writes and can add a fixed round-trip
+time per write, roughly what each call costs on a network or Bluetooth
+printer.
+
+Usage:
+    python -m benchmarks.bench_ticket_render --tickets 2000 --rtt-ms 2
+"""
+import argparse
+import time
+
+from escpos.printer import Dummy
+
+from services.ticket_renderer import render_kitchen_ticket, join_tickets
+
+TICKET = {
+    "order_time": "12:15",
+    "ready_time": "12:30",
+    "customer_name": "John Doe",
+    "customer_contact": "+32 123 456 789",
+    "items": ["2x Burger with fries", "1x Coca-Cola", "1x Chocolate cake (no nuts)"],
+}
+
+
+class CountingPrinter(Dummy):
+    def __init__(self, rtt: float):
+        super().__init__()
+        self.rtt = rtt
+        self.writes = 0
+
+    def _raw(self, msg):
+        self.writes += 1
+        if self.rtt:
+            time.sleep(self.rtt)
+        super()._raw(msg)
+
+
+def per_command(printer, details):
+    """The call sequence print_kitchen_order used before tickets were pre-rendered"""
+    printer.set(align='center', bold=True, double_width=True, double_height=True)
+    printer.text("KITCHEN ORDER\n")
+    printer.set(align='left', bold=True)
+    printer.text(f"Order Time: {details['order_time']}\n")
+    printer.text(f"Ready By: {details['ready_time']}\n\n")
+    printer.text(f"Customer: {details['customer_name']}\n")
+    printer.text(f"Contact: {details['customer_contact']}\n\n")
+    printer.set(bold=True, double_width=True, double_height=True)
+    printer.text("ORDER ITEMS:\n")
+    for item in details['items']:
+        printer.text(f"- {item}\n")
+    printer.set(bold=False)
+    printer.text("\n")
+    printer.cut()
+
+
+def run(label, tickets, rtt, send):
+    printer = CountingPrinter(rtt)
+    start = time.perf_counter()
+    send(printer, tickets)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {tickets / elapsed:>10.1f} tickets/s  {printer.writes / tickets:>6.2f} writes/ticket")
+
+
+def main(args):
+    rtt = args.rtt_ms / 1000
+
+    def send_per_command(printer, n):
+        for _ in range(n):
+            per_command(printer, TICKET)
+
+    def send_prerendered(printer, n):
+        for _ in range(n):
+            printer._raw(render_kitchen_ticket(TICKET))
+
+    def send_batched(printer, n):
+        for start in range(0, n, args.batch):
+            printer._raw(join_tickets(render_kitchen_ticket(TICKET) for _ in range(min(args.batch, n - start))))
+
+    print(f"{args.tickets} tickets, {args.rtt_ms} ms per write")
+    run("per-command writes", args.tickets, rtt, send_per_command)
+    run("pre-rendered, one write", args.tickets, rtt, send_prerendered)
+    run(f"pre-rendered, batches of {args.batch}", args.tickets, rtt, send_batched)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickets", type=int, default=2000)
+    parser.add_argument("--rtt-ms", type=float, default=0.0)
+    parser.add_argument("--batch", type=int, default=10)
+    main(parser.parse_args())
@@ -1,7 +1,7 @@
 from fastapi import FastAPI
 from database import engine, SessionLocal
 from models.base import Base
-from routes import orders, menu, auth, reservations, payments, kds
+from routes import orders, menu, auth, reservations, payments, kds, slots, printer
 from services.email import EmailService
 from utils.logger import setup_logger
 import logging
@@ -20,7 +20,8 @@ app.include_router(auth.router)
 app.include_router(reservations.router)
 app.include_router(payments.router)
 app.include_router(kds.router)
-# app.include_router(printer.router)
+app.include_router(slots.router)
+app.include_router(printer.router)
 
 if __name__ == "__main__":
     import uvicorn
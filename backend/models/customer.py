@@ -1,10 +1,11 @@
+import uuid
 from sqlalchemy import Column, String, Boolean, DateTime, LargeBinary
 from .base import Base
 
 class Customer(Base):
     __tablename__ = "customers"
 
-    id = Column(String, primary_key=True)
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     email = Column(String, unique=True, nullable=False)
     phone = Column(String, nullable=False)
     first_name = Column(String)
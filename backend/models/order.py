@@ -1,12 +1,13 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, Integer, JSON, Boolean
+from sqlalchemy import Column, String, DateTime, ForeignKey, Integer, JSON, Boolean, Index, text
 from sqlalchemy.orm import relationship
 from .base import Base
 from datetime import datetime
+import uuid
 
 class Order(Base):
     __tablename__ = "orders"
 
-    id = Column(String, primary_key=True)
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     customer_id = Column(String, ForeignKey("customers.id"), nullable=True)
     reservation_id = Column(String, ForeignKey("reservations.id"), nullable=True)
     status = Column(String, default="received")
@@ -21,4 +22,29 @@ class Order(Base):
     print_attempts = Column(Integer, default=0)
     last_print_attempt = Column(DateTime, nullable=True)
     email_sent = Column(Boolean, default=False)
-    customer_email = Column(String, nullable=True)
\ No newline at end of file
+    customer_email = Column(String, nullable=True)
+    total_amount = Column(Integer, nullable=True)  # in cents, priced from the menu when the order was placed
+
+    __table_args__ = (
+        # Date range scans (/kds/orders) and keyset pagination
+        Index("ix_orders_created_at_id", "created_at", "id"),
+        # Only the few open orders are indexed; the KDS and kitchen load read these
+        Index(
+            "ix_orders_open_status", "status", "created_at",
+            postgresql_where=text("status IN ('received', 'preparing', 'ready')"),
+        ),
+        # Payment callbacks look orders up by provider reference
+        Index(
+            "ix_orders_payment_reference", "payment_reference",
+            postgresql_where=text("payment_reference IS NOT NULL"),
+        ),
+        # Payment reconciliation pages through the few pending payments by reference
+        Index(
+            "ix_orders_pending_payment", "payment_reference",
+            postgresql_where=text("payment_status = 'pending'"),
+        ),
+        Index(
+            "ix_orders_reservation_id", "reservation_id",
+            postgresql_where=text("reservation_id IS NOT NULL"),
+        ),
+    )
@@ -0,0 +1,32 @@
+from sqlalchemy import Column, String, Integer, ForeignKey, Index
+from typing import Iterable, List
+from .base import Base
+
+class OrderItem(Base):
+    """One line of an order, normalized out of the Order.items JSON"""
+    __tablename__ = "order_items"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    order_id = Column(String, ForeignKey("orders.id", ondelete="CASCADE"), nullable=False)
+    menu_item_id = Column(String, ForeignKey("menu_items.id"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    special_requests = Column(String, nullable=True)
+    unit_price = Column(Integer, nullable=True)  # in cents, at the time of the order
+    line_total = Column(Integer, nullable=True)  # in cents
+
+    __table_args__ = (
+        # Covers the join from active orders, so kitchen load is an index-only lookup
+        Index("ix_order_items_order_id", "order_id", "menu_item_id", "quantity"),
+        Index("ix_order_items_menu_item_id", "menu_item_id"),
+    )
+
+def order_item_rows(order_id: str, items: Iterable[dict]) -> List[dict]:
+    """order_items rows for the items of one order, as stored in Order.items"""
+    return [{
+        "order_id": order_id,
+        "menu_item_id": item["item_id"],
+        "quantity": item["quantity"],
+        "special_requests": item.get("special_requests"),
+        "unit_price": item.get("unit_price"),
+        "line_total": item.get("line_total"),
+    } for item in items]
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, String, DateTime, ForeignKey, Enum, Index
 from datetime import datetime
 from .base import Base
 from enum import Enum as PyEnum
@@ -21,4 +21,9 @@ class Reservation(Base):
     status = Column(Enum(ReservationStatus), default=ReservationStatus.PENDING)
     created_at = Column(DateTime, server_default='now()')
     order_id = Column(String, ForeignKey("orders.id"), nullable=False)
-    source = Column(String)  # website, phone, kiosk
\ No newline at end of file
+    source = Column(String)  # website, phone, kiosk
+
+    __table_args__ = (
+        # Day views filter on a pickup_time range, optionally by status
+        Index("ix_reservations_pickup_time_status", "pickup_time", "status"),
+    )
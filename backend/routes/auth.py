@@ -1,12 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from datetime import datetime, timedelta
+import time
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from models.customer import Customer
-from database import SessionLocal
+from database import AsyncSessionLocal, get_db
+from services.password_hasher import HasherBusy, password_hasher
+from services.principal_cache import Principal, principal_cache
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -15,15 +22,19 @@ SECRET_KEY = "your-secret-key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
+# Same scheme for endpoints that also serve anonymous callers
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token", auto_error=False)
 
 class Token(BaseModel):
     access_token: str
     token_type: str
 
 class TokenData(BaseModel):
+    """Claims of a verified access token"""
+    user_id: str
     email: Optional[str] = None
+    issued_at: float = 0.0
 
 class CustomerCreate(BaseModel):
     email: str
@@ -39,43 +50,72 @@ class CustomerResponse(BaseModel):
     last_name: Optional[str]
     is_verified: bool
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+class CustomerUpdate(BaseModel):
+    phone: Optional[str] = None
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+hashing_busy = HTTPException(
+    status_code=503,
+    detail="Too many logins in progress, try again shortly",
+    headers={"Retry-After": "1"},
+)
 
-def authenticate_user(email: str, password: str):
-    db = SessionLocal()
-    try:
-        user = db.query(Customer).filter(Customer.email == email).first()
-        if not user or not verify_password(password, user.password_hash):
-            return False
-        return user
-    finally:
-        db.close()
+async def verify_password(plain_password, hashed_password):
+    return await password_hasher.verify(plain_password, hashed_password)
+
+async def get_password_hash(password):
+    # password_hash is a binary column
+    return (await password_hasher.hash(password)).encode()
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    to_encode = data.copy()
+    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=15))
+    # iat as a float so a logout revokes tokens issued earlier in the same second
+    to_encode.update({"exp": expire, "iat": time.time()})
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+async def authenticate_user(db: AsyncSession, email: str, password: str):
+    user = await db.scalar(select(Customer).where(Customer.email == email))
+    if not user or not user.password_hash:
+        return False
+    valid, new_hash = await password_hasher.verify_and_update(password, user.password_hash)
+    if not valid:
+        return False
+    if new_hash:
+        # Stored with outdated cost settings; upgrade while we have the plain password
+        user.password_hash = new_hash.encode()
+        await db.commit()
+        logger.info(f"Rehashed password of customer {user.id}")
+    return user
 
 @router.post("/register", response_model=CustomerResponse)
-async def register(customer: CustomerCreate):
-    db = SessionLocal()
+async def register(customer: CustomerCreate, db: AsyncSession = Depends(get_db)):
     try:
-        db_customer = Customer(
-            email=customer.email,
-            phone=customer.phone,
-            first_name=customer.first_name,
-            last_name=customer.last_name,
-            password_hash=get_password_hash(customer.password)
-        )
-        db.add(db_customer)
-        db.commit()
-        db.refresh(db_customer)
-        return db_customer
-    finally:
-        db.close()
+        password_hash = await get_password_hash(customer.password)
+    except HasherBusy:
+        raise hashing_busy
+    db_customer = Customer(
+        email=customer.email,
+        phone=customer.phone,
+        first_name=customer.first_name,
+        last_name=customer.last_name,
+        password_hash=password_hash
+    )
+    db.add(db_customer)
+    await db.commit()
+    await db.refresh(db_customer)
+    return db_customer
 
 @router.post("/token", response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = authenticate_user(form_data.username, form_data.password)
+async def login_for_access_token(
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_db)
+):
+    try:
+        user = await authenticate_user(db, form_data.username, form_data.password)
+    except HasherBusy:
+        raise hashing_busy
     if not user:
         raise HTTPException(
             status_code=401,
@@ -84,29 +124,85 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
         )
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data={"sub": user.email, "uid": user.id}, expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
-    credentials_exception = HTTPException(
-        status_code=401,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+@router.on_event("shutdown")
+async def shutdown_password_hasher():
+    password_hasher.shutdown()
+
+credentials_exception = HTTPException(
+    status_code=401,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+def decode_token(token: str) -> TokenData:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
     except JWTError:
         raise credentials_exception
-    
-    db = SessionLocal()
-    try:
-        user = db.query(Customer).filter(Customer.email == email).first()
-        if user is None:
-            raise credentials_exception
-        return user
-    finally:
-        db.close()
\ No newline at end of file
+    if not payload.get("uid"):
+        raise credentials_exception
+    return TokenData(user_id=payload["uid"], email=payload.get("sub"), issued_at=payload.get("iat", 0.0))
+
+def is_revoked(claims: TokenData, logged_out_at: Optional[float]) -> bool:
+    return logged_out_at is not None and claims.issued_at <= logged_out_at
+
+async def load_principal(user_id: str) -> Optional[Principal]:
+    async with AsyncSessionLocal() as db:
+        customer = await db.get(Customer, user_id)
+        return Principal.from_customer(customer) if customer else None
+
+async def get_current_claims(token: str = Depends(oauth2_scheme)) -> TokenData:
+    """Token claims only, for endpoints that just need the user ID; never touches the database"""
+    claims = decode_token(token)
+    if is_revoked(claims, await principal_cache.last_logout(claims.user_id)):
+        raise credentials_exception
+    return claims
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> Principal:
+    """The logged-in customer, served from the principal cache when possible"""
+    claims = decode_token(token)
+    user, logged_out_at = await principal_cache.get(claims.user_id, load_principal)
+    if user is None or is_revoked(claims, logged_out_at):
+        raise credentials_exception
+    return user
+
+async def get_optional_user(token: Optional[str] = Depends(optional_oauth2_scheme)) -> Optional[Principal]:
+    """The logged-in user, or None for anonymous requests"""
+    if not token:
+        return None
+    return await get_current_user(token)
+
+@router.post("/logout")
+async def logout(claims: TokenData = Depends(get_current_claims)):
+    """Revoke every token of the caller issued so far"""
+    if not await principal_cache.logout(claims.user_id, ACCESS_TOKEN_EXPIRE_MINUTES * 60):
+        raise HTTPException(status_code=503, detail="Logout could not be recorded, try again")
+    return {"status": "logged out"}
+
+@router.get("/hash-metrics")
+async def get_hash_metrics(current_user: Principal = Depends(get_current_user)):
+    """Queue depth and timings of the password hashing pool"""
+    return password_hasher.metrics()
+
+@router.get("/me", response_model=CustomerResponse)
+async def read_me(current_user: Principal = Depends(get_current_user)):
+    return current_user
+
+@router.patch("/me", response_model=CustomerResponse)
+async def update_me(
+    changes: CustomerUpdate,
+    claims: TokenData = Depends(get_current_claims),
+    db: AsyncSession = Depends(get_db)
+):
+    customer = await db.get(Customer, claims.user_id)
+    if customer is None:
+        raise credentials_exception
+    for field, value in changes.dict(exclude_unset=True).items():
+        setattr(customer, field, value)
+    await db.commit()
+    await principal_cache.invalidate(customer.id)
+    return Principal.from_customer(customer)
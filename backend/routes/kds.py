@@ -1,54 +1,286 @@
 from fastapi import APIRouter, HTTPException, Depends, WebSocket, WebSocketDisconnect, Query
-from sqlalchemy.orm import Session
-from database import SessionLocal
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, AsyncSessionLocal
+from models.menu import MenuItem
 from models.order import Order
-from services.email import EmailService
+from models.order_item import OrderItem
+from services.email import queue_order_email
+from services.firing_schedule import (
+    FIRING_STATUSES, FiringSchedule, decode_firing, firing_lines_query, group_lines
+)
+from services.kds_events import publish_kds_event, current_seq, events_since, KdsEventRelay
+from redis.exceptions import RedisError
+from sqlalchemy.exc import SQLAlchemyError
+from utils.logger import setup_logger
+import asyncio
+import base64
 import json
-from typing import List
-from datetime import datetime
+import os
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from datetime import datetime, timedelta
+
+logger = setup_logger(__name__)
 
 router = APIRouter(prefix="/kds", tags=["kds"])
 
+KDS_QUEUE_SIZE = int(os.getenv("KDS_QUEUE_SIZE", 100))  # messages buffered per screen
+KDS_SEND_TIMEOUT = float(os.getenv("KDS_SEND_TIMEOUT", 5))  # seconds
+ACTIVE_ORDER_STATUSES = ["received", "preparing", "ready"]
+# Orders the kitchen still has to cook
+PENDING_KITCHEN_STATUSES = ["received", "preparing"]
+HISTORY_PAGE_SIZE = 100
+HISTORY_MAX_PAGE_SIZE = 1000
+HISTORY_STREAM_CHUNK = 500  # rows fetched from the server-side cursor at a time
+
+# Columns returned by the order history; the rest of Order stays in the database
+HISTORY_COLUMNS = (
+    Order.id, Order.status, Order.created_at, Order.time_slot, Order.customer_id,
+    Order.items, Order.payment_method, Order.payment_status, Order.print_status, Order.total_amount,
+)
+
+class ClientConnection:
+    def __init__(self, websocket: WebSocket, queue_size: int):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.sender: asyncio.Task = None
+        # Highest event sequence number this screen has already been sent
+        self.last_seq = 0
+
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    """Fans KDS messages out to every connected screen.
+
+    Each screen gets a bounded outbound queue drained by its own sender task,
+    so one slow tablet never delays the others or the caller of broadcast().
+    Screens whose queue fills up are dropped and expected to reconnect.
+    """
 
-    async def connect(self, websocket: WebSocket):
+    def __init__(self, queue_size: int = KDS_QUEUE_SIZE, send_timeout: float = KDS_SEND_TIMEOUT):
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.active_connections: Dict[WebSocket, ClientConnection] = {}
+        self._closing: Set[asyncio.Task] = set()
+
+    async def connect(
+        self,
+        websocket: WebSocket,
+        initial_state: Optional[Callable[[], Awaitable[List[Tuple[int, str]]]]] = None,
+        last_seq: Optional[int] = None
+    ) -> bool:
+        """Register a screen and optionally catch it up before live events flow.
+
+        The screen starts buffering live events before initial_state runs, so
+        nothing published in between is lost; live events the catch-up or the
+        screen's own last_seq already covered are skipped by sequence number.
+        Returns False if the screen was dropped while catching up.
+        """
         await websocket.accept()
-        self.active_connections.append(websocket)
+        client = ClientConnection(websocket, self.queue_size)
+        client.last_seq = last_seq or 0
+        self.active_connections[websocket] = client
+        if initial_state:
+            try:
+                for seq, text in await initial_state():
+                    await asyncio.wait_for(websocket.send_text(text), self.send_timeout)
+                    client.last_seq = max(client.last_seq, seq)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Dropping KDS connection after failed catch-up: {str(e)}")
+                self.disconnect(websocket)
+                await self._close(websocket)
+                return False
+        if websocket not in self.active_connections:
+            return False
+        client.sender = asyncio.create_task(self._send_loop(client))
+        return True
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        client = self.active_connections.pop(websocket, None)
+        if client and client.sender and client.sender is not asyncio.current_task():
+            client.sender.cancel()
+
+    async def _send_loop(self, client: ClientConnection):
+        try:
+            while True:
+                seq, message = await client.queue.get()
+                if seq is not None:
+                    if seq <= client.last_seq:
+                        continue
+                    client.last_seq = seq
+                await asyncio.wait_for(client.websocket.send_text(message), self.send_timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Dropping KDS connection after failed send: {str(e)}")
+            self.disconnect(client.websocket)
+            await self._close(client.websocket)
+
+    async def _close(self, websocket: WebSocket, code: int = 1011):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass  # Socket is already gone
+
+    def _drop_slow_client(self, websocket: WebSocket):
+        logger.warning("Dropping KDS connection that fell too far behind")
+        self.disconnect(websocket)
+        # 1013 (try again later) tells the screen to reconnect
+        task = asyncio.create_task(self._close(websocket, code=1013))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
 
     async def broadcast(self, message: dict):
-        for connection in self.active_connections:
-            await connection.send_text(json.dumps(message))
+        await self.broadcast_text(json.dumps(message))
+
+    async def broadcast_text(self, text: str, seq: Optional[int] = None):
+        for websocket, client in list(self.active_connections.items()):
+            try:
+                client.queue.put_nowait((seq, text))
+            except asyncio.QueueFull:
+                self._drop_slow_client(websocket)
 
 manager = ConnectionManager()
+# This worker's copy of the firing schedule, kept current from the event stream
+firing_schedule = FiringSchedule()
 
-def get_db():
-    db = SessionLocal()
+async def relay_event(text: str, seq: int):
+    await manager.broadcast_text(text, seq)
     try:
-        yield db
-    finally:
-        db.close()
+        await update_firing(json.loads(text))
+    except (SQLAlchemyError, ValueError) as e:
+        logger.error(f"Could not update firing schedule: {str(e)}")
+
+event_relay = KdsEventRelay(relay_event)
+relay_task = None
+
+async def firing_lines(order_ids: Optional[List[str]] = None) -> Dict[str, dict]:
+    """Lines of open orders with the menu data the schedule needs, in one query"""
+    async with AsyncSessionLocal() as db:
+        return group_lines((await db.execute(firing_lines_query(order_ids))).all())
+
+async def update_firing(message: dict):
+    """Apply one KDS event to the firing schedule and push the change to this worker's screens"""
+    order_id = message.get("order_id")
+    if message.get("type") not in ("order_created", "order_update") or not order_id:
+        return
+    status = message.get("status")
+    if status is not None and status not in FIRING_STATUSES:
+        if not firing_schedule.remove(order_id):
+            return
+        entries = []
+    elif order_id in firing_schedule:
+        return  # received -> preparing doesn't move any fire times
+    else:
+        # Producers attach the order's lines; only events without them cost a query
+        if "firing" in message:
+            order = decode_firing(message["firing"])
+        else:
+            order = (await firing_lines([order_id])).get(order_id)
+        if not order:
+            return
+        entries = firing_schedule.upsert(order_id, **order)
+
+    now = datetime.now()
+    await manager.broadcast({
+        "type": "firing_update",
+        "order_id": order_id,
+        "entries": [entry.to_dict(now) for entry in entries],
+    })
+
+@router.on_event("startup")
+async def start_event_relay():
+    global relay_task
+    # Build the schedule from the database, then replay the events published since
+    try:
+        seq = await current_seq()
+        for order_id, order in (await firing_lines()).items():
+            firing_schedule.upsert(order_id, **order)
+        event_relay.last_id = f"{seq}-0"
+    except (RedisError, SQLAlchemyError) as e:
+        logger.error(f"Could not build firing schedule at startup: {str(e)}")
+    relay_task = asyncio.create_task(event_relay.run())
+
+@router.on_event("shutdown")
+async def stop_event_relay():
+    if relay_task:
+        relay_task.cancel()
+
+async def publish_order_event(message: dict):
+    """Publish once to every worker's screens, or just our own if Redis is down"""
+    try:
+        await publish_kds_event(message)
+    except RedisError as e:
+        logger.error(f"Failed to publish KDS event, broadcasting locally: {str(e)}")
+        await manager.broadcast(message)
+        await update_firing(message)
+
+def active_orders_query():
+    return (
+        select(Order.id, Order.status, Order.created_at, Order.time_slot, Order.items)
+        .where(Order.status.in_(ACTIVE_ORDER_STATUSES))
+        .order_by(Order.created_at)
+    )
+
+async def active_orders_snapshot() -> Tuple[int, str]:
+    """One message describing every active order, stamped with the log position it reflects"""
+    # Read the position first: events after it are replayed on top of the snapshot
+    try:
+        seq = await current_seq()
+    except RedisError as e:
+        logger.warning(f"KDS event log unavailable, sending unsequenced snapshot: {str(e)}")
+        seq = 0
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(active_orders_query())).all()
+    orders = [{
+        "order_id": row.id,
+        "status": row.status,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+        "time_slot": row.time_slot.isoformat() if row.time_slot else None,
+        "items": row.items,
+    } for row in rows]
+    now = datetime.now()
+    firing = [entry.to_dict(now) for entry in firing_schedule.upcoming()]
+    return seq, json.dumps({"type": "snapshot", "seq": seq, "orders": orders, "firing": firing})
+
+async def catch_up(last_seq: Optional[int]) -> List[Tuple[int, str]]:
+    """The deltas a reconnecting screen missed, or a snapshot if the log can't cover them"""
+    if last_seq is not None:
+        try:
+            missed = await events_since(last_seq)
+        except RedisError as e:
+            logger.warning(f"Could not read KDS event log, sending snapshot: {str(e)}")
+            missed = None
+        if missed is not None:
+            return missed
+    return [await active_orders_snapshot()]
 
 @router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+async def websocket_endpoint(websocket: WebSocket, last_seq: Optional[int] = Query(None)):
+    """Live KDS feed.
+
+    Screens reconnecting with the last `seq` they saw get only the events they
+    missed; new screens, or ones that fell off the log, get a snapshot of the
+    active orders first.
+    """
     try:
+        if not await manager.connect(websocket, lambda: catch_up(last_seq), last_seq):
+            return
         while True:
             await websocket.receive_text()
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(websocket)
 
 @router.patch("/orders/{order_id}/status")
 async def update_order_status(
     order_id: str,
     status: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    order = db.query(Order).filter(Order.id == order_id).first()
+    order = await db.scalar(select(Order).where(Order.id == order_id))
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
 
@@ -57,35 +289,139 @@ async def update_order_status(
         raise HTTPException(status_code=400, detail="Invalid status")
 
     order.status = status
-    db.commit()
+    await db.commit()
 
-    # Broadcast update to all connected clients
-    await manager.broadcast({
+    # Broadcast update to all connected clients on every worker
+    await publish_order_event({
         "type": "order_update",
         "order_id": order.id,
         "status": order.status
     })
 
-    # Send status update email if customer has email
+    # Hand the status email to the outbox worker; never wait on the mail server here
     if order.customer_email and status in ["ready", "completed"]:
-        email_service = EmailService()
-        email_service.send_order_confirmation(order.id)
+        try:
+            await queue_order_email(order.id, status)
+        except RedisError as e:
+            logger.error(f"Could not queue email for order {order.id}: {str(e)}")
 
     return {"status": "updated"}
 
+@router.get("/firing")
+async def get_firing_schedule(
+    station: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """Dishes of open orders in the order they have to be started, per station if given"""
+    now = datetime.now()
+    return {
+        "generated_at": now.isoformat(),
+        "entries": [entry.to_dict(now) for entry in firing_schedule.upcoming(station, limit)],
+    }
+
+def kitchen_load_query(category: Optional[str] = None):
+    query = (
+        select(MenuItem.id, MenuItem.name, MenuItem.category, func.sum(OrderItem.quantity).label("quantity"))
+        .select_from(Order)
+        .join(OrderItem, OrderItem.order_id == Order.id)
+        .join(MenuItem, MenuItem.id == OrderItem.menu_item_id)
+        .where(Order.status.in_(PENDING_KITCHEN_STATUSES))
+        .group_by(MenuItem.id, MenuItem.name, MenuItem.category)
+        .order_by(func.sum(OrderItem.quantity).desc())
+    )
+    if category:
+        query = query.where(MenuItem.category == category)
+    return query
+
+@router.get("/kitchen-load")
+async def get_kitchen_load(category: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    """Quantity of each menu item still to be prepared across all open orders"""
+    rows = (await db.execute(kitchen_load_query(category))).all()
+    return [{
+        "item_id": row.id,
+        "name": row.name,
+        "category": row.category,
+        "quantity": row.quantity,
+    } for row in rows]
+
+def encode_cursor(created_at: datetime, order_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([created_at.isoformat(), order_id]).encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        created_at, order_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), order_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def history_query(start: datetime, end: datetime, after: Optional[Tuple[datetime, str]] = None):
+    """Orders created in [start, end), oldest first, continuing after a (created_at, id) cursor"""
+    query = select(*HISTORY_COLUMNS).where(
+        Order.created_at >= start,
+        Order.created_at < end
+    ).order_by(Order.created_at, Order.id)
+    if after:
+        query = query.where(tuple_(Order.created_at, Order.id) > tuple_(*after))
+    return query
+
+def history_row(row) -> dict:
+    return {
+        "order_id": row.id,
+        "status": row.status,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+        "time_slot": row.time_slot.isoformat() if row.time_slot else None,
+        "customer_id": row.customer_id,
+        "items": row.items,
+        "payment_method": row.payment_method,
+        "payment_status": row.payment_status,
+        "print_status": row.print_status,
+        "total_amount": row.total_amount,
+    }
+
+async def history_partitions(query) -> AsyncIterator[list]:
+    """Rows of query in chunks, read through a server-side cursor"""
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=HISTORY_STREAM_CHUNK))
+        async for rows in result.partitions():
+            yield rows
+
+async def stream_history(query) -> AsyncIterator[str]:
+    """NDJSON lines for every row of query"""
+    async for rows in history_partitions(query):
+        yield "".join(json.dumps(history_row(row)) + "\n" for row in rows)
+
+async def stream_history_list(query) -> AsyncIterator[str]:
+    """Every row of query as one JSON array, without holding them all in memory"""
+    opening = "["
+    async for rows in history_partitions(query):
+        yield opening + ",".join(json.dumps(history_row(row)) for row in rows)
+        opening = ","
+    yield "]" if opening == "," else "[]"
+
 @router.get("/orders")
 async def get_orders_by_date_range(
     start_date: str = Query(..., description="Start date in YYYY-MM-DD format"),
     end_date: str = Query(..., description="End date in YYYY-MM-DD format"),
-    db: Session = Depends(get_db)
+    limit: Optional[int] = Query(None, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    db: AsyncSession = Depends(get_db)
 ):
     """
-    Get all orders within a date range.
-    
+    Get all orders within a date range, oldest first.
+
     - **start_date**: Start of date range (inclusive)
     - **end_date**: End of date range (inclusive)
-    
-    Returns list of Order objects with all order details.
+    - **limit**: Page size (default 100 once paging)
+    - **cursor**: Continue after the last order of the previous page
+    - **format**: `json` for a JSON response, `ndjson` to stream every order
+      from the cursor on, one JSON object per line
+
+    Without limit or cursor the JSON response is the plain list of every
+    order in the range, streamed. With either it is one page as
+    `{"orders": [...], "next_cursor": ...}`. Pages are keyed on
+    (created_at, id), so each one is an index range scan no matter how deep
+    into the range it is.
     """
     try:
         start_dt = datetime.strptime(start_date, "%Y-%m-%d")
@@ -103,11 +439,17 @@ async def get_orders_by_date_range(
         )
 
     # Include full end date by adding 1 day and using less than
-    end_dt_plus_1 = end_dt.replace(hour=23, minute=59, second=59)
+    end_dt_plus_1 = end_dt + timedelta(days=1)
+
+    query = history_query(start_dt, end_dt_plus_1, decode_cursor(cursor) if cursor else None)
 
-    orders = db.query(Order).filter(
-        Order.created_at >= start_dt,
-        Order.created_at <= end_dt_plus_1
-    ).all()
+    # The request session is closed before the body is sent, so the streams open their own
+    if format == "ndjson":
+        return StreamingResponse(stream_history(query), media_type="application/x-ndjson")
+    if limit is None and cursor is None:
+        return StreamingResponse(stream_history_list(query), media_type="application/json")
 
-    return orders
\ No newline at end of file
+    limit = limit or HISTORY_PAGE_SIZE
+    rows = (await db.execute(query.limit(limit))).all()
+    next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id) if len(rows) == limit else None
+    return {"orders": [history_row(row) for row in rows], "next_cursor": next_cursor}
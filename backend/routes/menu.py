@@ -1,8 +1,14 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from fastapi.encoders import jsonable_encoder
 from typing import List
 from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from models.menu import MenuItem
-from database import SessionLocal
+from database import get_db
+from services.menu_cache import menu_cache, etag_matches, CachedPayload
+import asyncio
+import json
 
 router = APIRouter(prefix="/menu", tags=["menu"])
 
@@ -18,53 +24,71 @@ class MenuItemCreate(BaseModel):
 class MenuItemResponse(MenuItemCreate):
     id: str
 
+invalidation_listener = None
+
+@router.on_event("startup")
+async def start_invalidation_listener():
+    global invalidation_listener
+    invalidation_listener = asyncio.create_task(menu_cache.listen_for_invalidations())
+
+@router.on_event("shutdown")
+async def stop_invalidation_listener():
+    if invalidation_listener:
+        invalidation_listener.cancel()
+
+def serialize_menu(data) -> bytes:
+    return json.dumps(jsonable_encoder(data)).encode()
+
+def cached_response(request: Request, payload: CachedPayload) -> Response:
+    headers = {"ETag": payload.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), payload.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=payload.body, media_type="application/json", headers=headers)
+
 @router.post("/", response_model=MenuItemResponse)
-async def create_menu_item(item: MenuItemCreate):
-    db = SessionLocal()
-    try:
-        db_item = MenuItem(**item.dict())
-        db.add(db_item)
-        db.commit()
-        db.refresh(db_item)
-        return db_item
-    finally:
-        db.close()
+async def create_menu_item(item: MenuItemCreate, db: AsyncSession = Depends(get_db)):
+    db_item = MenuItem(**item.dict())
+    db.add(db_item)
+    await db.commit()
+    await db.refresh(db_item)
+    await menu_cache.invalidate()
+    return db_item
 
 @router.put("/{item_id}", response_model=MenuItemResponse)
-async def update_menu_item(item_id: str, item: MenuItemCreate):
-    db = SessionLocal()
-    try:
-        db_item = db.query(MenuItem).filter(MenuItem.id == item_id).first()
-        if not db_item:
-            raise HTTPException(status_code=404, detail="Menu item not found")
-        
-        for key, value in item.dict().items():
-            setattr(db_item, key, value)
-            
-        db.commit()
-        db.refresh(db_item)
-        return db_item
-    finally:
-        db.close()
+async def update_menu_item(item_id: str, item: MenuItemCreate, db: AsyncSession = Depends(get_db)):
+    db_item = await db.scalar(select(MenuItem).where(MenuItem.id == item_id))
+    if not db_item:
+        raise HTTPException(status_code=404, detail="Menu item not found")
+
+    for key, value in item.dict().items():
+        setattr(db_item, key, value)
+
+    await db.commit()
+    await db.refresh(db_item)
+    await menu_cache.invalidate()
+    return db_item
 
 @router.get("/", response_model=List[MenuItemResponse])
-async def get_menu_items(category: str = None):
-    db = SessionLocal()
-    try:
-        query = db.query(MenuItem)
+async def get_menu_items(request: Request, category: str = None, db: AsyncSession = Depends(get_db)):
+    async def load():
+        query = select(MenuItem)
         if category:
-            query = query.filter(MenuItem.category == category)
-        return query.all()
-    finally:
-        db.close()
+            query = query.where(MenuItem.category == category)
+        items = (await db.scalars(query)).all()
+        return serialize_menu([MenuItemResponse.model_validate(i, from_attributes=True) for i in items])
+
+    payload = await menu_cache.get_or_load(f"list:{category or ''}", load)
+    return cached_response(request, payload)
 
 @router.get("/{item_id}", response_model=MenuItemResponse)
-async def get_menu_item(item_id: str):
-    db = SessionLocal()
-    try:
-        item = db.query(MenuItem).filter(MenuItem.id == item_id).first()
+async def get_menu_item(request: Request, item_id: str, db: AsyncSession = Depends(get_db)):
+    async def load():
+        item = await db.scalar(select(MenuItem).where(MenuItem.id == item_id))
         if not item:
-            raise HTTPException(status_code=404, detail="Menu item not found")
-        return item
-    finally:
-        db.close()
\ No newline at end of file
+            return None
+        return serialize_menu(MenuItemResponse.model_validate(item, from_attributes=True))
+
+    payload = await menu_cache.get_or_load(f"item:{item_id}", load)
+    if payload is None:
+        raise HTTPException(status_code=404, detail="Menu item not found")
+    return cached_response(request, payload)
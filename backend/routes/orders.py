@@ -1,66 +1,222 @@
 from fastapi import APIRouter, Depends, HTTPException
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
-from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from pydantic import BaseModel, Field, ValidationError
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from redis.exceptions import RedisError
+import asyncio
+import os
+import uuid
 
-from database import SessionLocal
+from database import get_db, async_redis_client
+from models.customer import Customer
 from models.order import Order
-from services.printer_service import PrinterService
+from models.order_item import OrderItem as OrderItemRow, order_item_rows
+from services.firing_schedule import encode_firing, firing_lines_query, group_lines
+from services.kds_events import publish_kds_event
+from services.order_ingest import ORDER_WRITE_BEHIND, enqueue_order, get_pending_order
+from services.print_queue_service import PRINT_QUEUE
+from services.pricing import PricedOrder, menu_snapshot, price_order, price_orders
+from services.slot_engine import basket_weight, book as book_slot, release as release_slot
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
 
 router = APIRouter(prefix="/orders", tags=["orders"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+MAX_BATCH_ORDERS = int(os.getenv("MAX_BATCH_ORDERS", 1000))
 
 class OrderItem(BaseModel):
     item_id: str
-    quantity: int
-    special_requests: str = None
+    quantity: int = Field(ge=1)
+    special_requests: Optional[str] = None
 
 class OrderCreate(BaseModel):
     customer_id: Optional[str] = None  # Nullable for anonymous orders
     phone: Optional[str] = None  # Required for anonymous orders
-    items: List[OrderItem]
+    items: List[OrderItem] = Field(min_length=1)
     payment_method: str
-    time_slot: datetime = None
+    time_slot: Optional[datetime] = None
+
+class PricedOrderItem(OrderItem):
+    unit_price: Optional[int] = None  # in cents
+    line_total: Optional[int] = None  # in cents
 
 class OrderResponse(OrderCreate):
+    items: List[PricedOrderItem]
+    total_amount: Optional[int] = None  # in cents; None for orders placed before pricing
     order_id: str
     status: str
     created_at: datetime
     print_status: str
     print_attempts: int
 
+class BatchOrder(OrderCreate):
+    order_id: Optional[str] = None  # Generated on the kiosk so replays are idempotent
+
+class OrderBatch(BaseModel):
+    # Validated one by one as BatchOrder, so an invalid order is rejected on
+    # its own instead of failing the whole batch
+    orders: List[Dict[str, Any]]
+
+class BatchOrderResult(BaseModel):
+    index: int
+    order_id: Optional[str] = None
+    status: str  # created, duplicate or rejected
+    error: Optional[str] = None
+
+def validation_error(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in e['loc']) or 'order'}: {e['msg']}" for e in error.errors()
+    )
+
+def order_row(order: OrderCreate, order_id: str, priced: PricedOrder) -> dict:
+    """Column values for a new order.
+
+    created_at is stamped here, on the app clock the KDS compares it with,
+    so direct, batch and write-behind inserts all share one time source.
+    """
+    return {
+        "id": order_id,
+        "created_at": datetime.now(),
+        "customer_id": order.customer_id,
+        "items": priced.items,
+        "total_amount": priced.total_amount,
+        "payment_method": order.payment_method,
+        "time_slot": order.time_slot,
+        "status": "received",
+        "print_status": "pending",
+        "print_attempts": 0,
+    }
+
+def row_response(row: dict) -> dict:
+    return {
+        "order_id": row["id"],
+        "status": row["status"],
+        "created_at": row["created_at"],
+        "print_status": row["print_status"],
+        "print_attempts": row["print_attempts"],
+        "customer_id": row["customer_id"],
+        "items": row["items"],
+        "total_amount": row.get("total_amount"),
+        "payment_method": row["payment_method"],
+        "time_slot": row["time_slot"]
+    }
+
+async def book_pickup_slot(order_id: str, order: OrderCreate, prep_times: dict, force: bool = False) -> bool:
+    """Reserve kitchen capacity for an order's pickup slot, 409 if it is full.
+
+    Returns whether capacity was booked. With Redis down the order is
+    accepted unbooked, like its other Redis side effects.
+    """
+    if not order.time_slot:
+        return False
+    weight, longest = basket_weight(((item.item_id, item.quantity) for item in order.items), prep_times)
+    try:
+        booked = await book_slot(order_id, order.time_slot, weight, longest, force=force)
+    except RedisError as e:
+        logger.error(f"Could not book pickup slot for {order_id}, accepting it unbooked: {str(e)}")
+        return False
+    if not booked:
+        raise HTTPException(
+            status_code=409,
+            detail="The kitchen is fully booked for this pickup time, choose another slot"
+        )
+    return True
+
+async def release_pickup_slot(order_id: str):
+    try:
+        await release_slot(order_id)
+    except RedisError as e:
+        logger.error(f"Could not release pickup slot of {order_id}: {str(e)}")
+
+async def order_created_events(db: AsyncSession, order_ids: List[str]) -> List[dict]:
+    """order_created events for new orders, carrying their firing lines.
+
+    The lines are loaded once here instead of by every worker relaying the event.
+    """
+    try:
+        firing = group_lines((await db.execute(firing_lines_query(order_ids))).all())
+    except SQLAlchemyError as e:
+        # Workers load the lines themselves for events without them
+        logger.error(f"Could not load firing lines for new orders: {str(e)}")
+        return [{"type": "order_created", "order_id": order_id} for order_id in order_ids]
+    return [
+        {"type": "order_created", "order_id": order_id, "firing": encode_firing(firing.get(order_id))}
+        for order_id in order_ids
+    ]
+
 @router.post("/", response_model=OrderResponse)
-async def create_order(order: OrderCreate, db: Session = Depends(get_db)):
+async def create_order(order: OrderCreate, db: AsyncSession = Depends(get_db)):
     # Validate either customer_id or phone is provided
     if not order.customer_id and not order.phone:
         raise HTTPException(
             status_code=400,
             detail="Either customer_id or phone must be provided"
         )
-        
-    db_order = Order(
-        customer_id=order.customer_id,
-        items=order.items,
-        payment_method=order.payment_method,
-        time_slot=order.time_slot,
-        status="received",
-        print_status="pending"
-    )
+
+    if order.customer_id:
+        # Checked up front: in write-behind mode an unknown customer would only
+        # surface in the persister, after the order was accepted
+        if await db.scalar(select(Customer.id).where(Customer.id == order.customer_id)) is None:
+            raise HTTPException(status_code=400, detail=f"Unknown customer {order.customer_id}")
+
+    snapshot = await menu_snapshot(db)
+    item_ids = {item.item_id for item in order.items}
+    missing = item_ids - snapshot.keys()
+    if missing:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown or unavailable menu items: {', '.join(sorted(missing))}"
+        )
+    # Prices come from the menu, never from the client
+    priced = price_order([item.dict() for item in order.items], snapshot)
+    prep_times = {item_id: snapshot[item_id].prep_time for item_id in item_ids}
+
+    order_id = str(uuid.uuid4())
+    booked = await book_pickup_slot(order_id, order, prep_times)
+
+    row = order_row(order, order_id, priced)
+    if ORDER_WRITE_BEHIND:
+        # Accepted once it is in the ingest stream; the persister writes it to
+        # Postgres and queues the print job
+        try:
+            await enqueue_order(row)
+        except Exception:
+            if booked:
+                await release_pickup_slot(order_id)
+            raise
+        return row_response(row)
+
+    db_order = Order(**row)
     
-    db.add(db_order)
-    db.commit()
-    db.refresh(db_order)
+    try:
+        db.add(db_order)
+        await db.flush()
+        if db_order.items:
+            await db.execute(insert(OrderItemRow), order_item_rows(db_order.id, db_order.items))
+        await db.commit()
+    except Exception:
+        if booked:
+            await release_pickup_slot(order_id)
+        raise
+    await db.refresh(db_order)
     
-    # Queue print job
-    printer = PrinterService(db)
-    printer.queue_print_job(db_order.id)
+    # Queue print job without blocking the event loop on the sync client
+    try:
+        await async_redis_client.lpush(PRINT_QUEUE, db_order.id)
+    except RedisError as e:
+        logger.error(f"Could not queue print job for {db_order.id}: {str(e)}")
+
+    # Lets every worker put the new order on its KDS firing schedule
+    try:
+        for event in await order_created_events(db, [db_order.id]):
+            await publish_kds_event(event)
+    except RedisError as e:
+        logger.error(f"Could not publish order_created for {db_order.id}: {str(e)}")
     
     return {
         "order_id": db_order.id,
@@ -68,13 +224,121 @@ async def create_order(order: OrderCreate, db: Session = Depends(get_db)):
         "created_at": db_order.created_at,
         "print_status": db_order.print_status,
         "print_attempts": db_order.print_attempts,
-        **order.dict()
+        **order.dict(),
+        "items": db_order.items,
+        "total_amount": db_order.total_amount
     }
 
+@router.post("/batch", response_model=List[BatchOrderResult])
+async def create_orders_batch(batch: OrderBatch, db: AsyncSession = Depends(get_db)):
+    """Ingest many orders at once, e.g. a kiosk replaying its offline queue.
+
+    All orders are validated up front and invalid ones are rejected
+    individually; the valid ones go in with one
+    multi-row INSERT and their print jobs with one Redis call. Orders whose
+    order_id already exists are reported as duplicates, so a replay can
+    safely be retried.
+    """
+    if len(batch.orders) > MAX_BATCH_ORDERS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {MAX_BATCH_ORDERS} orders per batch"
+        )
+
+    orders: List[Optional[BatchOrder]] = []
+    invalid: Dict[int, str] = {}
+    for index, raw in enumerate(batch.orders):
+        try:
+            orders.append(BatchOrder(**raw))
+        except ValidationError as e:
+            orders.append(None)
+            invalid[index] = validation_error(e)
+
+    # Look up every referenced menu item and customer once for the whole batch
+    snapshot = await menu_snapshot(db)
+    customer_ids = {order.customer_id for order in orders if order and order.customer_id}
+    prep_times = {item_id: price.prep_time for item_id, price in snapshot.items()}
+    known_customers = set(await db.scalars(
+        select(Customer.id).where(Customer.id.in_(customer_ids))
+    )) if customer_ids else set()
+
+    results = []
+    accepted = {}
+    for index, order in enumerate(orders):
+        if order is None:
+            raw_id = batch.orders[index].get("order_id")
+            results.append(BatchOrderResult(index=index, order_id=raw_id if isinstance(raw_id, str) else None,
+                                            status="rejected", error=invalid[index]))
+            continue
+        order_id = order.order_id or str(uuid.uuid4())
+        error = None
+        if not order.customer_id and not order.phone:
+            error = "Either customer_id or phone must be provided"
+        elif order.customer_id and order.customer_id not in known_customers:
+            error = f"Unknown customer {order.customer_id}"
+        else:
+            missing = [item.item_id for item in order.items if item.item_id not in snapshot]
+            if missing:
+                error = f"Unknown or unavailable menu items: {', '.join(missing)}"
+
+        if error:
+            results.append(BatchOrderResult(index=index, order_id=order.order_id, status="rejected", error=error))
+        elif order_id in accepted:
+            results.append(BatchOrderResult(index=index, order_id=order_id, status="duplicate"))
+        else:
+            accepted[order_id] = order
+            results.append(BatchOrderResult(index=index, order_id=order_id, status="created"))
+
+    # Price every accepted order in one pass
+    priced_orders = price_orders(([item.dict() for item in order.items] for order in accepted.values()), snapshot)
+    rows = [order_row(order, order_id, priced) for (order_id, order), priced in zip(accepted.items(), priced_orders)]
+
+    if rows:
+        inserted = set(await db.scalars(
+            insert(Order).values(rows).on_conflict_do_nothing(index_elements=[Order.id]).returning(Order.id)
+        ))
+        item_rows = [line for row in rows if row["id"] in inserted for line in order_item_rows(row["id"], row["items"])]
+        if item_rows:
+            await db.execute(insert(OrderItemRow), item_rows)
+        await db.commit()
+        for result in results:
+            if result.status == "created" and result.order_id not in inserted:
+                result.status = "duplicate"
+
+        if inserted:
+            # One LPUSH for the whole batch, in submission order
+            try:
+                await async_redis_client.lpush(PRINT_QUEUE, *[row["id"] for row in rows if row["id"] in inserted])
+            except RedisError as e:
+                logger.error(f"Could not queue print jobs for {len(inserted)} batch orders: {str(e)}")
+
+            try:
+                events = await order_created_events(db, [order_id for order_id in accepted if order_id in inserted])
+                await asyncio.gather(*(publish_kds_event(event) for event in events))
+            except RedisError as e:
+                logger.error(f"Could not publish order_created for batch orders: {str(e)}")
+
+            # Replayed orders were already promised to the customer, so their
+            # load is recorded even where it exceeds the slot capacity
+            await asyncio.gather(*(
+                book_pickup_slot(order_id, order, prep_times, force=True)
+                for order_id, order in accepted.items() if order_id in inserted
+            ))
+
+    logger.info(f"Batch of {len(batch.orders)} orders: "
+                f"{sum(r.status == 'created' for r in results)} created, "
+                f"{sum(r.status == 'duplicate' for r in results)} duplicates, "
+                f"{sum(r.status == 'rejected' for r in results)} rejected")
+    return results
+
 @router.get("/{order_id}", response_model=OrderResponse)
-async def get_order(order_id: str, db: Session = Depends(get_db)):
-    order = db.query(Order).filter(Order.id == order_id).first()
+async def get_order(order_id: str, db: AsyncSession = Depends(get_db)):
+    order = await db.scalar(select(Order).where(Order.id == order_id))
     if not order:
+        # Accepted in write-behind mode but not persisted yet
+        pending = await get_pending_order(order_id)
+        if pending:
+            return row_response(pending)
         raise HTTPException(status_code=404, detail="Order not found")
     return {
         "order_id": order.id,
@@ -84,6 +348,7 @@ async def get_order(order_id: str, db: Session = Depends(get_db)):
         "print_attempts": order.print_attempts,
         "customer_id": order.customer_id,
         "items": order.items,
+        "total_amount": order.total_amount,
         "payment_method": order.payment_method,
         "time_slot": order.time_slot
     }
\ No newline at end of file
@@ -1,70 +1,124 @@
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.responses import RedirectResponse
+from redis.exceptions import RedisError
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from models.order import Order
-from database import SessionLocal
-import requests
+from database import async_redis_client, get_db
+from services.payconiq import CircuitOpen, PayconiqError, payconiq_client, payment_status
+from utils.logger import setup_logger
+from typing import Optional
 import os
 
+logger = setup_logger(__name__)
+
 router = APIRouter(prefix="/payments", tags=["payments"])
 
-PAYCONIQ_API_URL = "https://api.payconiq.com/v3/payments"
-PAYCONIQ_API_KEY = os.getenv("PAYCONIQ_API_KEY")
+CALLBACK_PREFIX = "payments:callback:"  # payment id -> "processing" or "completed"
+CALLBACK_CLAIM_TTL = 60  # seconds a callback being handled holds off duplicates, if its handler dies
+CALLBACK_DONE_TTL = 24 * 60 * 60  # seconds duplicates of a handled callback are answered from Redis
+
+def payment_unavailable(error: PayconiqError) -> HTTPException:
+    logger.error(f"Payconiq call failed: {str(error)}")
+    if isinstance(error, CircuitOpen):
+        return HTTPException(status_code=503, detail="Payments are temporarily unavailable",
+                             headers={"Retry-After": "30"})
+    return HTTPException(status_code=502, detail="Payment provider error")
 
 async def verify_payment(payment_id: str):
-    headers = {
-        "Authorization": f"Bearer {PAYCONIQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    response = requests.get(f"{PAYCONIQ_API_URL}/{payment_id}", headers=headers)
-    return response.json().get("status") == "SUCCEEDED"
+    return await payment_status(payment_id) == "SUCCEEDED"
+
+def callback_key(payment_id: str) -> str:
+    return f"{CALLBACK_PREFIX}{payment_id}"
+
+async def claim_callback(payment_id: str, redis=async_redis_client) -> Optional[str]:
+    """Claim a callback for processing; returns the state of an earlier delivery if there is one"""
+    try:
+        previous = await redis.set(callback_key(payment_id), "processing", nx=True, get=True, ex=CALLBACK_CLAIM_TTL)
+    except RedisError as e:
+        logger.error(f"Could not deduplicate callback for {payment_id}: {str(e)}")
+        return None
+    return previous.decode() if previous else None
+
+async def finish_callback(payment_id: str, completed: bool, redis=async_redis_client):
+    """Remember a handled callback, or release the claim so a retry is processed again"""
+    try:
+        if completed:
+            await redis.set(callback_key(payment_id), "completed", ex=CALLBACK_DONE_TTL)
+        else:
+            await redis.delete(callback_key(payment_id))
+    except RedisError as e:
+        logger.error(f"Could not record callback for {payment_id}: {str(e)}")
+
+@router.on_event("shutdown")
+async def close_payconiq_client():
+    await payconiq_client.aclose()
 
 @router.post("/initiate/{order_id}")
-async def initiate_payment(order_id: str):
-    db = SessionLocal()
+async def initiate_payment(order_id: str, db: AsyncSession = Depends(get_db)):
+    order = await db.scalar(select(Order).where(Order.id == order_id))
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+
+    if order.payment_status == "completed":
+        raise HTTPException(status_code=400, detail="Order already paid")
+
+    if order.total_amount is None:
+        # Placed before orders were priced; there is no amount to charge
+        raise HTTPException(status_code=409, detail="Order has no stored total")
+
     try:
-        order = db.query(Order).filter(Order.id == order_id).first()
-        if not order:
-            raise HTTPException(status_code=404, detail="Order not found")
-        
-        if order.payment_status == "completed":
-            raise HTTPException(status_code=400, detail="Order already paid")
-
-        headers = {
-            "Authorization": f"Bearer {PAYCONIQ_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        payload = {
-            "amount": order.total_amount,
-            "currency": "EUR",
-            "reference": order_id,
-            "callbackUrl": f"{os.getenv('BASE_URL')}/payments/callback"
-        }
-
-        response = requests.post(PAYCONIQ_API_URL, json=payload, headers=headers)
-        payment_data = response.json()
-
-        order.payment_reference = payment_data.get("paymentId")
-        order.payment_status = "pending"
-        db.commit()
-
-        return {"payment_url": payment_data.get("_links", {}).get("payment", {}).get("href")}
-    finally:
-        db.close()
+        payment_data = await payconiq_client.create_payment(
+            amount=order.total_amount,
+            reference=order_id,
+            callback_url=f"{os.getenv('BASE_URL')}/payments/callback",
+        )
+    except PayconiqError as e:
+        raise payment_unavailable(e)
+
+    order.payment_reference = payment_data.get("paymentId")
+    order.payment_status = "pending"
+    await db.commit()
+
+    return {"payment_url": payment_data.get("_links", {}).get("payment", {}).get("href")}
+
+def complete_payment_query(payment_id: str):
+    """Mark a payment completed unless it already is; returns the order id if it changed"""
+    return (
+        update(Order)
+        .where(Order.payment_reference == payment_id, Order.payment_status.is_distinct_from("completed"))
+        .values(payment_status="completed")
+        .returning(Order.id)
+    )
+
+def order_by_payment_query(payment_id: str):
+    return select(Order.id).where(Order.payment_reference == payment_id)
 
 @router.get("/callback")
-async def payment_callback(paymentId: str):
-    db = SessionLocal()
+async def payment_callback(paymentId: str, db: AsyncSession = Depends(get_db)):
+    previous = await claim_callback(paymentId)
+    if previous == "completed":
+        return {"status": "success"}
+    if previous == "processing":
+        # Another delivery is being handled right now; Payconiq will retry if that one fails
+        raise HTTPException(status_code=409, detail="Callback already being processed")
+
+    completed = False
     try:
-        if not await verify_payment(paymentId):
+        try:
+            verified = await verify_payment(paymentId)
+        except PayconiqError as e:
+            raise payment_unavailable(e)
+        if not verified:
             raise HTTPException(status_code=400, detail="Payment verification failed")
 
-        order = db.query(Order).filter(Order.payment_reference == paymentId).first()
-        if not order:
+        # Idempotent: a payment that is already completed is left alone
+        order_id = await db.scalar(complete_payment_query(paymentId))
+        await db.commit()
+        if order_id is None and not await db.scalar(order_by_payment_query(paymentId)):
             raise HTTPException(status_code=404, detail="Order not found")
-
-        order.payment_status = "completed"
-        db.commit()
-
-        return {"status": "success"}
+        completed = True
     finally:
-        db.close()
\ No newline at end of file
+        await finish_callback(paymentId, completed)
+
+    return {"status": "success"}
@@ -1,8 +1,8 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response
 from typing import Optional
-from services.printer_service import PrinterService
-import os
-import logging
+from services.printer_connection import PrinterConnection
+from services.print_dispatcher import FOH_PRINTER_TYPE, FOH_PRINTER_CONFIG, station_stats, reprint_order
+from services.ticket_renderer import render_text, render_kitchen_ticket, render_image, render_cut
 
 router = APIRouter(
     prefix="/printer",
@@ -10,88 +10,75 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-# Printer configuration from environment
-PRINTER_TYPE = os.getenv("PRINTER_TYPE", "usb")
-PRINTER_CONFIG = {
-    "usb": {
-        "vendor_id": int(os.getenv("PRINTER_VENDOR_ID", "0x6868")),
-        "product_id": int(os.getenv("PRINTER_PRODUCT_ID", "0x0500")),
-    },
-    "network": {
-        "host": os.getenv("PRINTER_HOST", "192.168.1.100"),
-        "port": int(os.getenv("PRINTER_PORT", "9100")),
-    },
-    "bluetooth": {
-        "device_address": os.getenv("PRINTER_BT_ADDRESS"),
-    }
-}
-
-printer_service = None
+printer_connection = PrinterConnection.from_params(
+    name="front-of-house",
+    connection_type=FOH_PRINTER_TYPE,
+    **FOH_PRINTER_CONFIG.get(FOH_PRINTER_TYPE, {})
+)
 
 @router.on_event("startup")
 async def startup_event():
-    global printer_service
-    try:
-        printer_service = PrinterService(
-            connection_type=PRINTER_TYPE,
-            **PRINTER_CONFIG.get(PRINTER_TYPE, {})
-        )
-    except Exception as e:
-        logging.error(f"Failed to initialize printer: {str(e)}")
-        printer_service = None
+    printer_connection.start()
+
+@router.on_event("shutdown")
+async def shutdown_event():
+    printer_connection.stop()
+
+def send(data: bytes, response: Response, message: str):
+    """Print now, or hold the job until the printer reconnects (202)"""
+    if printer_connection.send(data):
+        return {"status": "success", "message": message}
+    response.status_code = 202
+    return {"status": "queued", "message": "Printer offline, job held until it reconnects"}
 
 @router.post("/text")
-async def print_text(text: str, align: Optional[str] = "left"):
-    if not printer_service:
-        raise HTTPException(status_code=503, detail="Printer not available")
-    
-    try:
-        printer_service.print_text(text, align)
-        return {"status": "success", "message": "Text printed successfully"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+def print_text(text: str, response: Response, align: Optional[str] = "left"):
+    return send(render_text(text, align), response, "Text printed successfully")
 
 @router.post("/kitchen-order")
-async def print_kitchen_order(
+def print_kitchen_order(
     order_time: str,
     ready_time: str,
     customer_name: str,
     customer_contact: str,
-    items: list[str]
+    items: list[str],
+    response: Response
 ):
-    if not printer_service:
-        raise HTTPException(status_code=503, detail="Printer not available")
-    
-    try:
-        printer_service.print_kitchen_order({
-            "order_time": order_time,
-            "ready_time": ready_time,
-            "customer_name": customer_name,
-            "customer_contact": customer_contact,
-            "items": items
-        })
-        return {"status": "success", "message": "Kitchen order printed successfully"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    ticket = render_kitchen_ticket({
+        "order_time": order_time,
+        "ready_time": ready_time,
+        "customer_name": customer_name,
+        "customer_contact": customer_contact,
+        "items": items
+    })
+    return send(ticket, response, "Kitchen order printed successfully")
 
 @router.post("/image")
-async def print_image(image_path: str):
-    if not printer_service:
-        raise HTTPException(status_code=503, detail="Printer not available")
-    
+def print_image(image_path: str, response: Response):
     try:
-        printer_service.print_image(image_path)
-        return {"status": "success", "message": "Image printed successfully"}
+        data = render_image(image_path)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=400, detail=str(e))
+    return send(data, response, "Image printed successfully")
 
 @router.post("/cut")
-async def cut_paper(partial: bool = False):
-    if not printer_service:
-        raise HTTPException(status_code=503, detail="Printer not available")
-    
-    try:
-        printer_service.cut(partial)
-        return {"status": "success", "message": "Paper cut successfully"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+def cut_paper(response: Response, partial: bool = False):
+    return send(render_cut(partial), response, "Paper cut successfully")
+
+@router.get("/health")
+def get_printer_health():
+    """Connection state and reconnect timings for the front-of-house printer"""
+    return printer_connection.stats()
+
+@router.get("/stations")
+def get_station_stats():
+    """Queue depth and throughput for each station printer"""
+    return station_stats()
+
+@router.post("/orders/{order_id}/reprint")
+def reprint(order_id: str):
+    """Reprint an order from its stored station tickets"""
+    stations = reprint_order(order_id)
+    if not stations:
+        raise HTTPException(status_code=404, detail="No stored tickets for this order")
+    return {"status": "queued", "stations": stations}
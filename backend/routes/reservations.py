@@ -1,11 +1,18 @@
 from fastapi import APIRouter, HTTPException, Depends
 from datetime import datetime, timedelta
 from typing import List, Optional
+import uuid
 from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from models.reservation import Reservation, ReservationStatus
-from models.customer import Customer
-from database import SessionLocal
-from routes.auth import oauth2_scheme, get_current_user
+from models.menu import MenuItem
+from models.order import Order
+from models.order_item import OrderItem
+from database import get_db
+from services.principal_cache import Principal
+from routes.auth import TokenData, get_current_claims, get_optional_user
+from services.slot_engine import basket_weight, book as book_slot, release as release_slot
 
 router = APIRouter(prefix="/reservations", tags=["reservations"])
 
@@ -26,117 +33,180 @@ class ReservationResponse(ReservationCreate):
     id: str
     status: str
     created_at: datetime
-    order_details: dict  # Includes menu items and prep times
+    order_details: dict = {}  # Status of the linked order
     menu_items: List[ReservationMenuItem] = []
     estimated_ready_time: Optional[datetime] = None
 
 @router.post("/", response_model=ReservationResponse)
 async def create_reservation(
-    reservation: ReservationCreate
+    reservation: ReservationCreate,
+    current_user: Optional[Principal] = Depends(get_optional_user),
+    db: AsyncSession = Depends(get_db)
 ):
-    db = SessionLocal()
-    try:
-        # Validate reservation time is in the future
-        if reservation.reservation_time < datetime.now():
+    # Validate reservation time is in the future
+    if reservation.pickup_time < datetime.now():
+        raise HTTPException(
+            status_code=400,
+            detail="Reservation time must be in the future"
+        )
+
+    # Only staff may create reservations on a customer's behalf
+    if reservation.source == "employee" and not current_user:
+        raise HTTPException(
+            status_code=403,
+            detail="Only employees can create employee reservations"
+        )
+
+    order = await db.get(Order, reservation.order_id)
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+    if order.time_slot and order.time_slot != reservation.pickup_time:
+        raise HTTPException(
+            status_code=409,
+            detail="Order is already booked for another pickup time"
+        )
+
+    # An order created with a time_slot already holds its kitchen capacity
+    booked = False
+    if not order.time_slot:
+        lines = (await db.execute(
+            select(OrderItem.menu_item_id, OrderItem.quantity, MenuItem.prep_time)
+            .join(MenuItem, MenuItem.id == OrderItem.menu_item_id)
+            .where(OrderItem.order_id == order.id)
+        )).all()
+        weight, longest = basket_weight(
+            [(line.menu_item_id, line.quantity) for line in lines],
+            {line.menu_item_id: line.prep_time for line in lines}
+        )
+        if not await book_slot(order.id, reservation.pickup_time, weight, longest):
             raise HTTPException(
-                status_code=400,
-                detail="Reservation time must be in the future"
+                status_code=409,
+                detail="The kitchen is fully booked for this pickup time, choose another slot"
             )
+        booked = True
 
-        # Set employee_id if reservation is made by staff
-        employee_id = None
-        if reservation.source == "employee":
-            if not current_user:
-                raise HTTPException(
-                    status_code=403,
-                    detail="Only employees can create employee reservations"
-                )
-            employee_id = current_user.id
-
-        db_reservation = Reservation(
-            **reservation.dict(),
-            status=ReservationStatus.PENDING,
-            employee_id=employee_id
-        )
+    db_reservation = Reservation(
+        id=str(uuid.uuid4()),
+        **reservation.dict(),
+        status=ReservationStatus.PENDING
+    )
+    try:
         db.add(db_reservation)
-        db.commit()
-        db.refresh(db_reservation)
-        return db_reservation
-    finally:
-        db.close()
+        # orders and reservations reference each other: insert first, then link
+        await db.flush()
+        order.reservation_id = db_reservation.id
+        order.time_slot = reservation.pickup_time
+        await db.commit()
+    except Exception:
+        if booked:
+            await release_slot(order.id)
+        raise
+    await db.refresh(db_reservation)
+    return (await build_kds_views(db, [db_reservation]))[0]
+
+def reservations_query(date: Optional[str] = None, status: Optional[str] = None):
+    query = select(Reservation)
+
+    if date:
+        target_date = datetime.strptime(date, "%Y-%m-%d").date()
+        query = query.where(
+            Reservation.pickup_time >= target_date,
+            Reservation.pickup_time < target_date + timedelta(days=1)
+        )
+
+    if status:
+        query = query.where(Reservation.status == status)
+
+    return query
+
+def today_reservations_query(statuses: List[ReservationStatus], today=None):
+    """Reservations picked up today with one of statuses, by pickup time"""
+    today = today or datetime.now().date()
+    return select(Reservation).where(
+        Reservation.pickup_time >= today,
+        Reservation.pickup_time < today + timedelta(days=1),
+        Reservation.status.in_(statuses)
+    ).order_by(Reservation.pickup_time)
+
+def reservation_orders_query(reservation_ids: List[str]):
+    return select(Order.reservation_id, Order.id, Order.status).where(Order.reservation_id.in_(reservation_ids))
+
+def order_lines_query(order_ids: List[str]):
+    return (
+        select(OrderItem.order_id, OrderItem.menu_item_id, OrderItem.quantity, MenuItem.name, MenuItem.prep_time)
+        .join(MenuItem, MenuItem.id == OrderItem.menu_item_id)
+        .where(OrderItem.order_id.in_(order_ids))
+        .order_by(OrderItem.order_id, OrderItem.id)
+    )
 
 @router.get("/", response_model=List[ReservationResponse])
 async def get_reservations(
     date: Optional[str] = None,
     status: Optional[str] = None,
-    current_user: Customer = Depends(get_current_user)
+    claims: TokenData = Depends(get_current_claims),
+    db: AsyncSession = Depends(get_db)
 ):
-    db = SessionLocal()
-    try:
-        query = db.query(Reservation)
-        
-        if date:
-            target_date = datetime.strptime(date, "%Y-%m-%d").date()
-            query = query.filter(
-                Reservation.reservation_time >= target_date,
-                Reservation.reservation_time < target_date + timedelta(days=1)
-            )
-            
-        if status:
-            query = query.filter(Reservation.status == status)
-            
-        return query.all()
-    finally:
-        db.close()
+    return (await db.scalars(reservations_query(date, status))).all()
+
+async def build_kds_views(db: AsyncSession, reservations: List[Reservation]) -> List[dict]:
+    """Attach order lines and ready times to reservations in two queries total"""
+    if not reservations:
+        return []
+    by_id = {reservation.id: reservation for reservation in reservations}
+
+    # Order of each reservation
+    orders = {}
+    for reservation_id, order_id, order_status in await db.execute(reservation_orders_query(list(by_id))):
+        orders.setdefault(reservation_id, (order_id, order_status))
+
+    # Lines of all those orders, with the menu data they need
+    lines = {}
+    order_ids = [order_id for order_id, _ in orders.values()]
+    if order_ids:
+        for row in await db.execute(order_lines_query(order_ids)):
+            lines.setdefault(row.order_id, []).append(ReservationMenuItem(
+                id=row.menu_item_id,
+                name=row.name,
+                quantity=row.quantity,
+                prep_time=row.prep_time
+            ))
+
+    views = []
+    for reservation in reservations:
+        order_id, order_status = orders.get(reservation.id, (None, None))
+        menu_items = lines.get(order_id, [])
+        # Ready time is the pickup time minus the longest prep time
+        estimated_ready_time = None
+        if menu_items:
+            max_prep = max(item.prep_time for item in menu_items)
+            estimated_ready_time = reservation.pickup_time - timedelta(minutes=max_prep)
+        views.append({
+            "id": reservation.id,
+            "order_id": reservation.order_id,
+            "customer_id": reservation.customer_id,
+            "phone": reservation.phone,
+            "pickup_time": reservation.pickup_time,
+            "source": reservation.source,
+            "status": reservation.status.value,
+            "created_at": reservation.created_at,
+            "order_details": {"status": order_status} if order_id else {},
+            "menu_items": menu_items,
+            "estimated_ready_time": estimated_ready_time,
+        })
+    return views
 
 @router.get("/today/kds", response_model=List[ReservationResponse])
-async def get_today_reservations_for_kds():
+async def get_today_reservations_for_kds(db: AsyncSession = Depends(get_db)):
     """Get today's reservations formatted for Kitchen Display System"""
-    db = SessionLocal()
-    try:
-        today = datetime.now().date()
-        reservations = db.query(Reservation).filter(
-            Reservation.reservation_time >= today,
-            Reservation.reservation_time < today + timedelta(days=1),
-            Reservation.status.in_([ReservationStatus.PENDING, ReservationStatus.CONFIRMED])
-        ).order_by(Reservation.reservation_time).all()
-
-        # Add menu items and calculate ready times
-        for reservation in reservations:
-            # Get associated order and its items
-            order = db.query(Order).filter(
-                Order.reservation_id == reservation.id
-            ).first()
-            
-            if order:
-                reservation.menu_items = [
-                    ReservationMenuItem(
-                        id=item.menu_item_id,
-                        name=db.query(MenuItem).get(item.menu_item_id).name,
-                        quantity=item.quantity,
-                        prep_time=db.query(MenuItem).get(item.menu_item_id).prep_time
-                    ) for item in order.items
-                ]
-                
-                # Calculate ready time (reservation time - longest prep time)
-                if reservation.menu_items:
-                    max_prep = max(item.prep_time for item in reservation.menu_items)
-                    reservation.estimated_ready_time = reservation.reservation_time - timedelta(minutes=max_prep)
-
-        return reservations
-    finally:
-        db.close()
+    reservations = (await db.scalars(
+        today_reservations_query([ReservationStatus.PENDING, ReservationStatus.CONFIRMED])
+    )).all()
+
+    return await build_kds_views(db, reservations)
 
 @router.get("/today/print", response_model=List[ReservationResponse])
-async def get_today_reservations_for_printing():
+async def get_today_reservations_for_printing(db: AsyncSession = Depends(get_db)):
     """Get today's reservations formatted for printing"""
-    db = SessionLocal()
-    try:
-        today = datetime.now().date()
-        return db.query(Reservation).filter(
-            Reservation.reservation_time >= today,
-            Reservation.reservation_time < today + timedelta(days=1),
-            Reservation.status == ReservationStatus.CONFIRMED
-        ).order_by(Reservation.reservation_time).all()
-    finally:
-        db.close()
\ No newline at end of file
+    reservations = (await db.scalars(today_reservations_query([ReservationStatus.CONFIRMED]))).all()
+
+    return await build_kds_views(db, reservations)
@@ -0,0 +1,38 @@
+from fastapi import APIRouter, Depends, HTTPException
+from datetime import date
+from typing import List
+from pydantic import BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_db
+from services.pricing import menu_snapshot
+from services.slot_engine import available_slots, basket_weight
+
+router = APIRouter(prefix="/slots", tags=["slots"])
+
+class BasketItem(BaseModel):
+    item_id: str
+    quantity: int = Field(ge=1)
+
+class SlotQuery(BaseModel):
+    date: date
+    items: List[BasketItem]
+
+async def prep_times(db: AsyncSession, item_ids) -> dict:
+    """prep_time per menu item id from the cached menu, raising 400 for unknown or unavailable items"""
+    item_ids = set(item_ids)
+    snapshot = await menu_snapshot(db)
+    missing = item_ids - snapshot.keys()
+    if missing:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown or unavailable menu items: {', '.join(sorted(missing))}"
+        )
+    return {item_id: snapshot[item_id].prep_time for item_id in item_ids}
+
+@router.post("/available")
+async def get_available_slots(query: SlotQuery, db: AsyncSession = Depends(get_db)):
+    """Pickup times on the given day with kitchen capacity left for this basket"""
+    basket = [(item.item_id, item.quantity) for item in query.items]
+    weight, longest = basket_weight(basket, await prep_times(db, [item_id for item_id, _ in basket]))
+    return {"slots": await available_slots(query.date, weight, longest)}
@@ -0,0 +1,43 @@
+"""Add the nullable model columns that are missing from an existing database.
+
+Base.metadata.create_all never alters existing tables, so databases created
+before a column was added to a model need this (e.g. orders.total_amount and
+the order_items prices). Only nullable columns are added, which Postgres does
+without rewriting the table; rows that existed before keep NULL.
+
+Usage:
+    python -m scripts.add_columns
+"""
+from sqlalchemy import inspect
+
+import models.customer  # noqa: F401  (register every table on Base.metadata)
+import models.menu  # noqa: F401
+import models.order  # noqa: F401
+import models.order_item  # noqa: F401
+import models.reservation  # noqa: F401
+from database import engine
+from models.base import Base
+
+
+def add_columns():
+    existing_tables = set(inspect(engine).get_table_names())
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue  # create_all creates it with every column
+            existing = {column["name"] for column in inspect(conn).get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                if not column.nullable:
+                    print(f"{table.name}.{column.name} skipped: NOT NULL columns need a manual migration")
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.exec_driver_sql(
+                    f'ALTER TABLE "{table.name}" ADD COLUMN IF NOT EXISTS "{column.name}" {column_type}'
+                )
+                print(f"{table.name}.{column.name} added")
+
+
+if __name__ == "__main__":
+    add_columns()
@@ -0,0 +1,61 @@
+"""Fill order_items from the Order.items JSON of orders created before the table existed.
+
+Walks orders without any order_items rows in primary key order, one batch
+per transaction, so it can be stopped and rerun at any time. Lines that
+point at menu items which no longer exist are skipped and counted.
+
+Usage:
+    python -m scripts.backfill_order_items --batch 1000
+"""
+import argparse
+
+from sqlalchemy import exists, insert, select
+
+from database import SessionLocal, engine
+from models.menu import MenuItem
+from models.order import Order
+from models.order_item import OrderItem, order_item_rows
+
+
+def backfill(batch_size: int = 1000):
+    OrderItem.__table__.create(bind=engine, checkfirst=True)
+    db = SessionLocal()
+    try:
+        menu_ids = set(db.scalars(select(MenuItem.id)))
+        last_id = ""
+        orders = lines = skipped = 0
+        while True:
+            batch = db.execute(
+                select(Order.id, Order.items)
+                .where(Order.id > last_id)
+                .where(~exists().where(OrderItem.order_id == Order.id))
+                .order_by(Order.id)
+                .limit(batch_size)
+            ).all()
+            if not batch:
+                break
+
+            rows = []
+            for order_id, items in batch:
+                for row in order_item_rows(order_id, items or []):
+                    if row["menu_item_id"] in menu_ids:
+                        rows.append(row)
+                    else:
+                        skipped += 1
+            if rows:
+                db.execute(insert(OrderItem), rows)
+            db.commit()
+
+            orders += len(batch)
+            lines += len(rows)
+            last_id = batch[-1].id
+            print(f"{orders} orders, {lines} lines backfilled")
+        print(f"Done: {orders} orders, {lines} lines, {skipped} lines skipped for unknown menu items")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch", type=int, default=1000)
+    backfill(parser.parse_args().batch)
@@ -0,0 +1,33 @@
+"""Create the model indexes that are missing from an existing database.
+
+Base.metadata.create_all only creates indexes together with new tables, so
+databases created before an index was added to a model need this. Indexes
+are built with CREATE INDEX CONCURRENTLY, which does not block writes and
+can run while the restaurant is open.
+
+Usage:
+    python -m scripts.create_indexes
+"""
+from sqlalchemy.schema import CreateIndex
+
+import models.customer  # noqa: F401  (register every table on Base.metadata)
+import models.menu  # noqa: F401
+import models.order  # noqa: F401
+import models.order_item  # noqa: F401
+import models.reservation  # noqa: F401
+from database import engine
+from models.base import Base
+
+
+def create_indexes():
+    # CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for table in Base.metadata.tables.values():
+            for index in sorted(table.indexes, key=lambda i: i.name):
+                ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=engine.dialect))
+                conn.exec_driver_sql(ddl.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1))
+                print(f"{index.name} ok")
+
+
+if __name__ == "__main__":
+    create_indexes()
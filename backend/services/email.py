@@ -1,62 +1,240 @@
 import smtplib
+import threading
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import os
-from jinja2 import Template
-from database import SessionLocal
+from typing import List, Optional
+from jinja2 import DictLoader, Environment
+from sqlalchemy import select, update
+from database import SessionLocal, redis_client, async_redis_client
 from models.order import Order
+from services.reliable_queue import ReliableQueue, restart_on_crash
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
 
 SMTP_SERVER = os.getenv("SMTP_SERVER")
 SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
 SMTP_USER = os.getenv("SMTP_USER")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
 SENDER_EMAIL = os.getenv("SENDER_EMAIL", "orders@restaurant.com")
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", 10))  # seconds per SMTP command
+SMTP_IDLE_CHECK = 30  # seconds idle after which the session is probed with NOOP
+
+EMAIL_OUTBOX = os.getenv("EMAIL_OUTBOX", "email_outbox")
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", 20))  # emails sent per claimed batch
+EMAIL_MAX_RETRIES = 5
+EMAIL_RETRY_DELAY = float(os.getenv("EMAIL_RETRY_DELAY", 60))  # seconds
+
+TEMPLATES = {
+    "order_confirmation": """
+    <html>
+    <body>
+        <h1>Order Confirmation #{{ order.id }}</h1>
+        <p>Thank you for your order!</p>
+        <h2>Order Details:</h2>
+        <ul>
+        {% for item in order.items %}
+            <li>{{ item.quantity }}x {{ item.name }}</li>
+        {% endfor %}
+        </ul>
+        <p>Status: {{ status or order.status }}</p>
+    </body>
+    </html>
+    """
+}
+
+# Compiled once at import; rendering reuses the parsed templates
+template_env = Environment(loader=DictLoader(TEMPLATES), autoescape=True)
+COMPILED_TEMPLATES = {name: template_env.get_template(name) for name in TEMPLATES}
+
+class SmtpSession:
+    """One authenticated SMTP connection, reused across sends.
+
+    Connects (STARTTLS + login) lazily on the first send, probes the server
+    with NOOP after SMTP_IDLE_CHECK seconds of inactivity, and reconnects and
+    resends once if the server dropped the connection in between.
+    """
+
+    def __init__(self, host: str = SMTP_SERVER, port: int = SMTP_PORT,
+                 user: Optional[str] = SMTP_USER, password: Optional[str] = SMTP_PASSWORD,
+                 timeout: float = SMTP_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.timeout = timeout
+        self.server: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+        self.connects = 0
+
+    def send(self, msg: MIMEMultipart):
+        with self._lock:
+            self._ensure_connected()
+            try:
+                self.server.send_message(msg)
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                logger.warning("SMTP connection dropped, reconnecting")
+                self._close()
+                self._ensure_connected()
+                self.server.send_message(msg)
+            self._last_used = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _ensure_connected(self):
+        if self.server is not None and time.monotonic() - self._last_used > SMTP_IDLE_CHECK:
+            try:
+                code, _ = self.server.noop()
+                if code != 250:
+                    self._close()
+            except (smtplib.SMTPException, OSError):
+                self._close()
+        if self.server is None:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            server.starttls()
+            if self.user:
+                server.login(self.user, self.password)
+            self.server = server
+            self.connects += 1
+            self._last_used = time.monotonic()
+
+    def _close(self):
+        if self.server is None:
+            return
+        try:
+            self.server.quit()
+        except (smtplib.SMTPException, OSError):
+            self.server.close()
+        self.server = None
+
+# Shared by every EmailService in this process
+smtp_session = SmtpSession()
 
 class EmailService:
-    def __init__(self):
-        self.templates = {
-            "order_confirmation": """
-            <html>
-            <body>
-                <h1>Order Confirmation #{{ order.id }}</h1>
-                <p>Thank you for your order!</p>
-                <h2>Order Details:</h2>
-                <ul>
-                {% for item in order.items %}
-                    <li>{{ item.quantity }}x {{ item.name }}</li>
-                {% endfor %}
-                </ul>
-                <p>Status: {{ order.status }}</p>
-            </body>
-            </html>
-            """
-        }
+    def __init__(self, session: SmtpSession = None):
+        self.session = session or smtp_session
+
+    def build_order_email(self, order: Order, status: str = None) -> MIMEMultipart:
+        msg = MIMEMultipart()
+        msg['From'] = SENDER_EMAIL
+        msg['To'] = order.customer_email
+        msg['Subject'] = f"Order Confirmation #{order.id}"
+        html = COMPILED_TEMPLATES["order_confirmation"].render(order=order, status=status)
+        msg.attach(MIMEText(html, 'html'))
+        return msg
+
+    def send_order_email(self, order: Order, status: str = None):
+        """Send the order email over the shared session; raises on failure"""
+        self.session.send(self.build_order_email(order, status))
 
     def send_order_confirmation(self, order_id: str):
         db = SessionLocal()
         try:
-            order = db.query(Order).filter(Order.id == order_id).first()
+            order = db.get(Order, order_id)
             if not order or not order.customer_email:
                 return False
 
-            msg = MIMEMultipart()
-            msg['From'] = SENDER_EMAIL
-            msg['To'] = order.customer_email
-            msg['Subject'] = f"Order Confirmation #{order.id}"
-
-            template = Template(self.templates["order_confirmation"])
-            html = template.render(order=order)
-            msg.attach(MIMEText(html, 'html'))
-
-            with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-                server.starttls()
-                server.login(SMTP_USER, SMTP_PASSWORD)
-                server.send_message(msg)
-
+            self.send_order_email(order)
             order.email_sent = True
             db.commit()
             return True
         except Exception as e:
+            logger.error(f"Sending email for order {order_id} failed: {str(e)}")
             return False
         finally:
-            db.close()
\ No newline at end of file
+            db.close()
+
+async def queue_order_email(order_id: str, status: str):
+    """Add an order status email to the outbox; the outbox worker sends it"""
+    await async_redis_client.lpush(EMAIL_OUTBOX, f"{order_id}:{status}")
+
+class EmailOutboxWorker(ReliableQueue):
+    """Drains the email outbox over one reused SMTP session.
+
+    Claims up to EMAIL_BATCH_SIZE jobs at a time, loads their orders in one
+    query, and marks the sent ones email_sent in one UPDATE. Failed sends are
+    retried after EMAIL_RETRY_DELAY and dead-lettered after EMAIL_MAX_RETRIES.
+    """
+
+    def __init__(self, queue: str = EMAIL_OUTBOX, redis=redis_client,
+                 session: SmtpSession = None, batch_size: int = EMAIL_BATCH_SIZE):
+        super().__init__(queue, redis=redis, retry_delay=EMAIL_RETRY_DELAY)
+        self.service = EmailService(session)
+        self.batch_size = batch_size
+
+    def process_queue(self):
+        while True:
+            self.run_maintenance()
+            job = self.claim_job()
+            if job:
+                self.run_batch([job] + self.claim_ready_jobs(self.batch_size - 1))
+
+    def run(self):
+        """process_queue, restarted with a backoff if it crashes between batches"""
+        restart_on_crash("email-outbox", self.process_queue)
+
+    def run_batch(self, jobs: List[str]):
+        """process_batch, putting the jobs that are still claimed back if it crashes.
+
+        Send failures are handled per job inside process_batch; this covers the
+        rest (a database or Redis error), counting as a failed attempt.
+        """
+        try:
+            self.process_batch(jobs)
+        except Exception as e:
+            logger.exception(f"Email batch of {len(jobs)} jobs crashed: {str(e)}")
+            for job in jobs:
+                if self.fail_claimed(job, EMAIL_MAX_RETRIES) == 2:
+                    logger.error(f"Max retries reached for email {job}")
+
+    def process_batch(self, jobs: List[str]):
+        parsed = [(job, *job.rsplit(":", 1)) for job in jobs]
+        db = SessionLocal()
+        try:
+            orders = {
+                order.id: order
+                for order in db.scalars(select(Order).where(Order.id.in_({order_id for _, order_id, _ in parsed})))
+            }
+            done, sent_ids = [], set()
+            for job, order_id, status in parsed:
+                order = orders.get(order_id)
+                if not order or not order.customer_email:
+                    logger.warning(f"Dropping email job {job}: no order or no address")
+                    done.append(job)
+                    continue
+                try:
+                    self.service.send_order_email(order, status)
+                except Exception as e:
+                    self._handle_failure(job, e)
+                else:
+                    done.append(job)
+                    sent_ids.add(order_id)
+
+            if sent_ids:
+                db.execute(update(Order).where(Order.id.in_(sent_ids)).values(email_sent=True))
+                db.commit()
+            if done:
+                pipe = self.redis.pipeline(transaction=True)
+                for job in done:
+                    self.ack(job, pipe)
+                pipe.execute()
+            logger.info(f"Sent {len(sent_ids)} order emails from {len(jobs)} outbox jobs")
+        finally:
+            db.close()
+
+    def _handle_failure(self, job: str, error: Exception):
+        logger.error(f"Email {job} failed: {str(error)}")
+        attempts = self.record_failure(job)
+        if attempts >= EMAIL_MAX_RETRIES:
+            self.dead_letter(job)
+            logger.error(f"Max retries reached for email {job}")
+        else:
+            self.schedule_retry(job)
+
+if __name__ == "__main__":
+    EmailOutboxWorker().run()
@@ -0,0 +1,194 @@
+import heapq
+import itertools
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from models.menu import MenuItem
+from models.order import Order
+from models.order_item import OrderItem
+from services.print_dispatcher import STATIONS, route_lines
+
+# Orders whose dishes still have to be fired
+FIRING_STATUSES = ["received", "preparing"]
+COMPACT_MIN_STALE = 64
+
+@dataclass
+class FireEntry:
+    order_id: str
+    item_id: str
+    name: str
+    station: str
+    quantity: int
+    prep_time: int  # in minutes
+    fire_at: datetime
+    ready_at: datetime
+
+    def to_dict(self, now: Optional[datetime] = None) -> dict:
+        now = now or datetime.now()
+        return {
+            "order_id": self.order_id,
+            "item_id": self.item_id,
+            "name": self.name,
+            "station": self.station,
+            "quantity": self.quantity,
+            "prep_time": self.prep_time,
+            "fire_at": self.fire_at.isoformat(),
+            "ready_at": self.ready_at.isoformat(),
+            "overdue": self.fire_at < now,
+        }
+
+class FiringSchedule:
+    """When each station has to start each dish so an order finishes together.
+
+    Every line of an open order is fired at ready time minus its prep time,
+    where the ready time is the order's time_slot, or for ASAP orders the
+    creation time plus the longest prep time in the order. Entries live in
+    one heap per station keyed on fire time, and reads walk the heaps in
+    order, so the next few dishes cost O(k log k) rather than a sort of the
+    whole schedule. Changing one order replaces only that order's entries:
+    the old ones are invalidated by version and dropped lazily, and the heaps
+    are compacted once stale entries outnumber live ones.
+    """
+
+    def __init__(self, stations: Dict[str, dict] = STATIONS):
+        # Stations that get every line (e.g. pickup) don't cook anything
+        self.stations = {name: config for name, config in stations.items() if not config.get("all_items")}
+        self._heaps: Dict[str, List[Tuple[datetime, int, int, FireEntry]]] = {}
+        self._orders: Dict[str, Tuple[int, List[FireEntry]]] = {}
+        self._counter = itertools.count()
+        self._stale = 0
+
+    def __contains__(self, order_id: str) -> bool:
+        return order_id in self._orders
+
+    def __len__(self) -> int:
+        return sum(len(entries) for _, entries in self._orders.values())
+
+    def plan(self, order_id: str, lines: List[dict], time_slot: Optional[datetime],
+             created_at: Optional[datetime]) -> List[FireEntry]:
+        """Fire entries for one order; lines carry item_id, name, category, quantity and prep_time"""
+        if not lines:
+            return []
+        longest = max(line["prep_time"] for line in lines)
+        ready_at = time_slot or (created_at or datetime.now()) + timedelta(minutes=longest)
+        entries = []
+        for station, station_lines in route_lines(lines, self.stations).items():
+            for line in station_lines:
+                entries.append(FireEntry(
+                    order_id=order_id,
+                    item_id=line["item_id"],
+                    name=line["name"],
+                    station=station,
+                    quantity=line["quantity"],
+                    prep_time=line["prep_time"],
+                    fire_at=ready_at - timedelta(minutes=line["prep_time"]),
+                    ready_at=ready_at,
+                ))
+        return entries
+
+    def upsert(self, order_id: str, lines: List[dict], time_slot: Optional[datetime],
+               created_at: Optional[datetime]) -> List[FireEntry]:
+        """Replace the entries of one order and return the new ones"""
+        self.remove(order_id)
+        entries = self.plan(order_id, lines, time_slot, created_at)
+        if not entries:
+            return []
+        version = next(self._counter)
+        self._orders[order_id] = (version, entries)
+        for entry in entries:
+            heapq.heappush(self._heaps.setdefault(entry.station, []),
+                           (entry.fire_at, next(self._counter), version, entry))
+        return entries
+
+    def remove(self, order_id: str) -> bool:
+        _, entries = self._orders.pop(order_id, (None, []))
+        self._stale += len(entries)
+        if self._stale > COMPACT_MIN_STALE and self._stale > self._heap_size() - self._stale:
+            self._compact()
+        return bool(entries)
+
+    def upcoming(self, station: Optional[str] = None, limit: Optional[int] = None) -> List[FireEntry]:
+        """Live entries in firing order, optionally for one station"""
+        heaps = [self._heaps.get(station, [])] if station else list(self._heaps.values())
+        items = heapq.merge(*(self._in_order(heap) for heap in heaps))
+        return [item[3] for item in itertools.islice(items, limit or None)]
+
+    def entries_for(self, order_id: str) -> List[FireEntry]:
+        return list(self._orders.get(order_id, (None, []))[1])
+
+    def _is_live(self, item) -> bool:
+        _, _, version, entry = item
+        current = self._orders.get(entry.order_id)
+        return current is not None and current[0] == version
+
+    def _in_order(self, heap: list) -> Iterator[tuple]:
+        """Live items of a heap in heap order, without popping them"""
+        # Stale entries on top are dropped for good; deeper ones are skipped
+        while heap and not self._is_live(heap[0]):
+            heapq.heappop(heap)
+            self._stale -= 1
+        frontier = [(heap[0], 0)] if heap else []
+        while frontier:
+            item, index = heapq.heappop(frontier)
+            if self._is_live(item):
+                yield item
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child], child))
+
+    def _heap_size(self) -> int:
+        return sum(len(heap) for heap in self._heaps.values())
+
+    def _compact(self):
+        for station, heap in self._heaps.items():
+            heap[:] = [item for item in heap if self._is_live(item)]
+            heapq.heapify(heap)
+        self._stale = 0
+
+def firing_lines_query(order_ids: Optional[List[str]] = None):
+    query = (
+        select(Order.id, Order.time_slot, Order.created_at, OrderItem.menu_item_id, OrderItem.quantity,
+               MenuItem.name, MenuItem.category, MenuItem.prep_time)
+        .join(OrderItem, OrderItem.order_id == Order.id)
+        .join(MenuItem, MenuItem.id == OrderItem.menu_item_id)
+        .where(Order.status.in_(FIRING_STATUSES))
+    )
+    if order_ids is not None:
+        query = query.where(Order.id.in_(order_ids))
+    return query
+
+def group_lines(rows: Iterable) -> Dict[str, dict]:
+    """Group (order id, time_slot, created_at, item id, quantity, name, category, prep_time) rows per order"""
+    orders: Dict[str, dict] = {}
+    for row in rows:
+        order = orders.setdefault(row.id, {"time_slot": row.time_slot, "created_at": row.created_at, "lines": []})
+        order["lines"].append({
+            "item_id": row.menu_item_id,
+            "quantity": row.quantity,
+            "name": row.name,
+            "category": row.category,
+            "prep_time": row.prep_time,
+        })
+    return orders
+
+def encode_firing(order: Optional[dict]) -> Optional[dict]:
+    """An order from group_lines as JSON for a KDS event, so no worker has to load it again"""
+    if order is None:
+        return None
+    return {
+        "time_slot": order["time_slot"].isoformat() if order["time_slot"] else None,
+        "created_at": order["created_at"].isoformat() if order["created_at"] else None,
+        "lines": order["lines"],
+    }
+
+def decode_firing(payload: Optional[dict]) -> Optional[dict]:
+    if payload is None:
+        return None
+    return {
+        "time_slot": datetime.fromisoformat(payload["time_slot"]) if payload["time_slot"] else None,
+        "created_at": datetime.fromisoformat(payload["created_at"]) if payload["created_at"] else None,
+        "lines": payload["lines"],
+    }
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import os
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from redis.exceptions import RedisError
+
+from database import async_redis_client
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+KDS_EVENT_STREAM = "kds:events"
+KDS_EVENT_SEQ_KEY = "kds:events:seq"
+KDS_EVENT_STREAM_MAXLEN = int(os.getenv("KDS_EVENT_STREAM_MAXLEN", 10000))
+# Reconnecting screens that missed more than this get a snapshot instead
+KDS_MAX_REPLAY = int(os.getenv("KDS_MAX_REPLAY", 500))
+RELAY_BATCH_SIZE = 100
+RELAY_BLOCK_MS = 5000
+
+# Allocates the next sequence number and appends the event under it as
+# stream ID "<seq>-0", atomically, so stream order and sequence order agree
+# even with several workers publishing at once.
+PUBLISH_SCRIPT = """
+local seq = redis.call('INCR', KEYS[2])
+redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[2], seq .. '-0', 'data', ARGV[1])
+return seq
+"""
+
+publish_script = async_redis_client.register_script(PUBLISH_SCRIPT)
+
+
+def attach_seq(seq: int, data: str) -> str:
+    """Splice the sequence number into an already-serialized JSON object"""
+    if data == "{}":
+        return f'{{"seq": {seq}}}'
+    return f'{{"seq": {seq}, {data[1:]}'
+
+
+def entry_seq(entry_id: bytes) -> int:
+    return int(entry_id.split(b"-", 1)[0])
+
+
+async def publish_kds_event(message: dict, redis=async_redis_client) -> int:
+    """Append a KDS event to the shared stream and return its sequence number"""
+    return await publish_script(
+        keys=[KDS_EVENT_STREAM, KDS_EVENT_SEQ_KEY],
+        args=[json.dumps(message), KDS_EVENT_STREAM_MAXLEN],
+        client=redis,
+    )
+
+
+async def current_seq(redis=async_redis_client) -> int:
+    seq = await redis.get(KDS_EVENT_SEQ_KEY)
+    return int(seq) if seq else 0
+
+
+async def events_since(last_seq: int, redis=async_redis_client) -> Optional[List[Tuple[int, str]]]:
+    """Events published after last_seq, or None if the client has to start from a snapshot.
+
+    None means the log no longer holds everything the client missed (it was
+    trimmed, or the gap is larger than KDS_MAX_REPLAY), or last_seq is ahead
+    of the log because Redis was reset.
+    """
+    head = await current_seq(redis)
+    if last_seq > head:
+        return None
+    if last_seq == head:
+        return []
+
+    entries = await redis.xrange(KDS_EVENT_STREAM, min=f"{last_seq + 1}-0", max="+", count=KDS_MAX_REPLAY + 1)
+    if not entries or len(entries) > KDS_MAX_REPLAY or entry_seq(entries[0][0]) != last_seq + 1:
+        return None
+    return [(entry_seq(entry_id), attach_seq(entry_seq(entry_id), fields[b"data"].decode()))
+            for entry_id, fields in entries]
+
+
+class KdsEventRelay:
+    """Tails the KDS event stream and hands each serialized event to a local handler.
+
+    The stream gives every event one global position, and each worker reads it
+    in that order, so updates for the same order reach every screen in the
+    order they were published. After a Redis hiccup the relay resumes from the
+    last entry it saw instead of skipping ahead.
+    """
+
+    def __init__(self, handler: Callable[[str, int], Awaitable[None]], redis=async_redis_client,
+                 block_ms: int = RELAY_BLOCK_MS, batch_size: int = RELAY_BATCH_SIZE):
+        self.handler = handler
+        self.redis = redis
+        self.block_ms = block_ms
+        self.batch_size = batch_size
+        self.last_id = "$"
+
+    async def run(self):
+        while True:
+            try:
+                response = await self.redis.xread(
+                    {KDS_EVENT_STREAM: self.last_id},
+                    count=self.batch_size,
+                    block=self.block_ms,
+                )
+                for _, entries in response:
+                    for entry_id, fields in entries:
+                        self.last_id = entry_id
+                        seq = entry_seq(entry_id)
+                        await self.handler(attach_seq(seq, fields[b"data"].decode()), seq)
+            except asyncio.CancelledError:
+                raise
+            except RedisError as e:
+                logger.warning(f"KDS event relay lost Redis, retrying: {str(e)}")
+                await asyncio.sleep(1)
+            except Exception as e:
+                logger.error(f"KDS event relay failed to handle event: {str(e)}")
@@ -0,0 +1,194 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, NamedTuple, Optional, Tuple
+
+from redis.exceptions import RedisError
+
+from database import async_redis_client
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+MENU_CACHE_KEY = "menu:cache"  # Redis hash: cache key -> serialized JSON payload
+MENU_GENERATION_KEY = "menu:generation"  # INCR'd on every invalidation
+MENU_INVALIDATE_CHANNEL = "menu:invalidate"
+LOCAL_TTL = float(os.getenv("MENU_CACHE_LOCAL_TTL", 30))  # seconds
+REDIS_TTL = int(os.getenv("MENU_CACHE_REDIS_TTL", 300))  # seconds
+LOCAL_MAX_ENTRIES = int(os.getenv("MENU_CACHE_MAX_ENTRIES", 256))
+
+# Store a loaded payload only if the menu wasn't invalidated since the load started.
+# KEYS: generation, cache hash
+# ARGV: generation read before loading, cache key, body, ttl
+STORE_SCRIPT = """
+if (redis.call('GET', KEYS[1]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('HSET', KEYS[2], ARGV[2], ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+return 1
+"""
+
+store_script = async_redis_client.register_script(STORE_SCRIPT)
+
+
+class CachedPayload(NamedTuple):
+    body: bytes
+    etag: str
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag (weak comparison)"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+class MenuCache:
+    """Two-tier menu cache: a per-process LRU/TTL dict in front of a shared Redis hash.
+
+    Writes invalidate both tiers and publish on MENU_INVALIDATE_CHANNEL so the
+    other workers drop their local copies too. Invalidations also bump
+    MENU_GENERATION_KEY, and a payload only reaches Redis if that generation is
+    still the one read before it was loaded, so a slow load can't put a stale
+    menu back after a write.
+    """
+
+    def __init__(self, redis=async_redis_client, local_ttl: float = LOCAL_TTL,
+                 redis_ttl: int = REDIS_TTL, max_entries: int = LOCAL_MAX_ENTRIES):
+        self.redis = redis
+        self.local_ttl = local_ttl
+        self.redis_ttl = redis_ttl
+        self.max_entries = max_entries
+        self._local: "OrderedDict[str, tuple[float, CachedPayload]]" = OrderedDict()
+        # Bumped on every invalidation so loads that started before it aren't stored locally
+        self._generation = 0
+
+    def _local_get(self, key: str) -> Optional[CachedPayload]:
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        expires_at, payload = entry
+        if expires_at < time.monotonic():
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return payload
+
+    def _local_set(self, key: str, payload: CachedPayload):
+        self._local[key] = (time.monotonic() + self.local_ttl, payload)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+
+    def clear_local(self):
+        self._local.clear()
+        self._generation += 1
+
+    async def _fetch(self, key: str) -> Tuple[Optional[CachedPayload], Optional[int]]:
+        """Look a key up in both tiers; also returns the Redis generation on a Redis miss"""
+        payload = self._local_get(key)
+        if payload is not None:
+            return payload, None
+
+        generation = self._generation
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.hget(MENU_CACHE_KEY, key)
+                pipe.get(MENU_GENERATION_KEY)
+                body, redis_generation = await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Menu cache read failed, falling back to database: {str(e)}")
+            return None, None
+        if body is None:
+            return None, int(redis_generation or 0)
+
+        payload = CachedPayload(body, make_etag(body))
+        if generation == self._generation:
+            self._local_set(key, payload)
+        return payload, None
+
+    async def get(self, key: str) -> Optional[CachedPayload]:
+        payload, _ = await self._fetch(key)
+        return payload
+
+    async def set(self, key: str, body: bytes, generation: Optional[int] = None,
+                  redis_generation: Optional[int] = None) -> CachedPayload:
+        """Store a payload loaded at the given local and Redis generations.
+
+        Without a Redis generation (Redis was unreachable when the load
+        started) the payload is only kept locally.
+        """
+        payload = CachedPayload(body, make_etag(body))
+        if generation is not None and generation != self._generation:
+            # Menu changed while this payload was being loaded; serve it but don't keep it
+            return payload
+
+        self._local_set(key, payload)
+        if redis_generation is None:
+            return payload
+        try:
+            stored = await store_script(
+                keys=[MENU_GENERATION_KEY, MENU_CACHE_KEY],
+                args=[redis_generation, key, body, self.redis_ttl],
+                client=self.redis,
+            )
+        except RedisError as e:
+            logger.warning(f"Menu cache write failed: {str(e)}")
+            return payload
+        if not stored:
+            # Another worker invalidated during the load; its publish clears us too,
+            # but don't wait for it
+            self._local.pop(key, None)
+        return payload
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Optional[bytes]]]) -> Optional[CachedPayload]:
+        payload, redis_generation = await self._fetch(key)
+        if payload is not None:
+            return payload
+
+        generation = self._generation
+        body = await loader()
+        if body is None:
+            return None
+        return await self.set(key, body, generation, redis_generation)
+
+    async def invalidate(self):
+        """Drop both tiers here and tell every other worker to drop its local tier"""
+        self.clear_local()
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.incr(MENU_GENERATION_KEY)
+                pipe.delete(MENU_CACHE_KEY)
+                pipe.publish(MENU_INVALIDATE_CHANNEL, b"1")
+                await pipe.execute()
+        except RedisError as e:
+            logger.error(f"Menu cache invalidation failed: {str(e)}")
+
+    async def listen_for_invalidations(self):
+        """Clear the local tier whenever any worker publishes an invalidation"""
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(MENU_INVALIDATE_CHANNEL)
+                    # Anything cached while we were unsubscribed may be stale
+                    self.clear_local()
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self.clear_local()
+            except asyncio.CancelledError:
+                raise
+            except RedisError as e:
+                logger.warning(f"Menu invalidation listener lost Redis, retrying: {str(e)}")
+                self.clear_local()
+                await asyncio.sleep(1)
+
+
+menu_cache = MenuCache()
@@ -0,0 +1,238 @@
+import json
+import os
+import socket
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from redis.exceptions import ResponseError
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from database import SessionLocal, redis_client, async_redis_client
+from models.order import Order
+from models.order_item import OrderItem, order_item_rows
+from services.firing_schedule import encode_firing, firing_lines_query, group_lines
+from services.kds_events import KDS_EVENT_SEQ_KEY, KDS_EVENT_STREAM, KDS_EVENT_STREAM_MAXLEN
+from services.print_queue_service import PRINT_QUEUE
+from services.slot_engine import release_sync as release_slot_sync
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Accept orders into Redis and persist them asynchronously instead of committing per request
+ORDER_WRITE_BEHIND = os.getenv("ORDER_WRITE_BEHIND", "false").lower() == "true"
+
+ORDER_INGEST_STREAM = "orders:ingest"
+ORDER_INGEST_GROUP = "order-persisters"
+ORDER_INGEST_DEAD = "orders:ingest:dead"
+PENDING_ORDER_PREFIX = "orders:pending:"
+DISPATCHED_PREFIX = "orders:dispatched:"  # set once an order's print job and KDS event are queued
+PENDING_ORDER_TTL = 24 * 60 * 60  # seconds an unpersisted order stays readable
+PERSISTED_GRACE = 60  # seconds the cached copy outlives the insert, covering in-flight reads
+PERSIST_BATCH_SIZE = int(os.getenv("ORDER_PERSIST_BATCH_SIZE", 200))
+PERSIST_BLOCK_MS = 1000
+RECLAIM_IDLE_MS = 60 * 1000  # entries a persister held this long without acking are taken over
+RECLAIM_INTERVAL = 30  # seconds
+
+DATETIME_FIELDS = ("created_at", "time_slot")
+
+# Queue the print job and publish order_created for a persisted order, once.
+# KEYS: dispatched marker, print queue, KDS event stream, KDS sequence
+# ARGV: order id, marker ttl, event JSON, stream maxlen
+# The KDS part matches kds_events.PUBLISH_SCRIPT.
+DISPATCH_SCRIPT = """
+if not redis.call('SET', KEYS[1], '1', 'NX', 'EX', ARGV[2]) then
+    return 0
+end
+redis.call('LPUSH', KEYS[2], ARGV[1])
+local seq = redis.call('INCR', KEYS[4])
+redis.call('XADD', KEYS[3], 'MAXLEN', '~', ARGV[4], seq .. '-0', 'data', ARGV[3])
+return 1
+"""
+
+def pending_key(order_id: str) -> str:
+    return f"{PENDING_ORDER_PREFIX}{order_id}"
+
+def encode_row(row: dict) -> str:
+    return json.dumps({
+        key: value.isoformat() if isinstance(value, datetime) else value
+        for key, value in row.items()
+    })
+
+def decode_row(data) -> dict:
+    row = json.loads(data)
+    for field in DATETIME_FIELDS:
+        if row.get(field):
+            row[field] = datetime.fromisoformat(row[field])
+    return row
+
+async def enqueue_order(row: dict, redis=async_redis_client):
+    """Make an accepted order readable and queue it for the persister, atomically"""
+    data = encode_row(row)
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.set(pending_key(row["id"]), data, ex=PENDING_ORDER_TTL)
+        pipe.xadd(ORDER_INGEST_STREAM, {"order": data})
+        await pipe.execute()
+
+async def get_pending_order(order_id: str, redis=async_redis_client) -> Optional[dict]:
+    """An accepted order that may not have reached Postgres yet"""
+    data = await redis.get(pending_key(order_id))
+    return decode_row(data) if data else None
+
+class OrderPersister:
+    """Drains the ingest stream into Postgres in batched transactions.
+
+    Runs as a member of a consumer group, so several persisters can share the
+    stream. Entries are acked only after their batch is committed; a batch
+    that fails is retried row by row and rows that still fail are moved to
+    orders:ingest:dead. Print jobs are queued once the order exists in the
+    database, since the print workers load it from there.
+    """
+
+    def __init__(self, redis=redis_client, batch_size: int = PERSIST_BATCH_SIZE, consumer: str = None):
+        self.redis = redis
+        self._dispatch = redis.register_script(DISPATCH_SCRIPT)
+        self.batch_size = batch_size
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self._last_reclaim = 0.0
+
+    def ensure_group(self):
+        try:
+            self.redis.xgroup_create(ORDER_INGEST_STREAM, ORDER_INGEST_GROUP, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def run(self):
+        self.ensure_group()
+        # Entries this consumer read but never acked before a restart come first
+        while True:
+            entries = self.read("0")
+            if not entries:
+                break
+            self.persist(entries)
+        while True:
+            self.reclaim_stale()
+            self.persist(self.read(">"))
+
+    def read(self, start: str) -> List[Tuple[str, dict]]:
+        response = self.redis.xreadgroup(
+            ORDER_INGEST_GROUP, self.consumer, {ORDER_INGEST_STREAM: start},
+            count=self.batch_size, block=None if start == "0" else PERSIST_BLOCK_MS,
+        )
+        if not response:
+            return []
+        return [(entry_id.decode(), fields) for entry_id, fields in response[0][1]]
+
+    def reclaim_stale(self):
+        now = time.monotonic()
+        if now - self._last_reclaim < RECLAIM_INTERVAL:
+            return
+        self._last_reclaim = now
+        _, entries, *_ = self.redis.xautoclaim(
+            ORDER_INGEST_STREAM, ORDER_INGEST_GROUP, self.consumer,
+            RECLAIM_IDLE_MS, start_id="0-0", count=self.batch_size,
+        )
+        if entries:
+            logger.warning(f"Reclaimed {len(entries)} stale ingest entries")
+            self.persist([(entry_id.decode(), fields) for entry_id, fields in entries])
+
+    def persist(self, entries: List[Tuple[str, dict]]):
+        if not entries:
+            return
+        rows = []
+        for entry_id, fields in entries:
+            try:
+                rows.append((entry_id, decode_row(fields[b"order"])))
+            except (KeyError, ValueError) as e:
+                logger.error(f"Unreadable ingest entry {entry_id}: {str(e)}")
+                self._dead_letter(entry_id, fields)
+
+        try:
+            inserted = self._insert([row for _, row in rows])
+        except SQLAlchemyError as e:
+            logger.error(f"Batch of {len(rows)} orders failed, retrying one by one: {str(e)}")
+            inserted, failed = set(), set()
+            for entry_id, row in rows:
+                try:
+                    inserted |= self._insert([row])
+                except SQLAlchemyError as row_error:
+                    logger.error(f"Order {row['id']} could not be persisted: {str(row_error)}")
+                    self._dead_letter(entry_id, {"order": encode_row(row), "error": str(row_error)}, row["id"])
+                    failed.add(entry_id)
+            rows = [(entry_id, row) for entry_id, row in rows if entry_id not in failed]
+        if not rows:
+            return
+
+        # Side effects go out for every row, not only the newly inserted ones:
+        # a replay after a crash between commit and ack conflicts on insert
+        # but may never have been dispatched. The marker makes that idempotent,
+        # and the ack is part of the same transaction.
+        events = self._order_created_events([row["id"] for _, row in rows])
+        pipe = self.redis.pipeline(transaction=True)
+        for _, row in rows:
+            pipe.expire(pending_key(row["id"]), PERSISTED_GRACE)
+            self._dispatch(
+                keys=[f"{DISPATCHED_PREFIX}{row['id']}", PRINT_QUEUE, KDS_EVENT_STREAM, KDS_EVENT_SEQ_KEY],
+                args=[row["id"], PENDING_ORDER_TTL, json.dumps(events[row["id"]]), KDS_EVENT_STREAM_MAXLEN],
+                client=pipe,
+            )
+        ids = [entry_id for entry_id, _ in rows]
+        pipe.xack(ORDER_INGEST_STREAM, ORDER_INGEST_GROUP, *ids)
+        pipe.xdel(ORDER_INGEST_STREAM, *ids)
+        results = pipe.execute()
+        dispatched = sum(results[1:2 * len(rows):2])
+        logger.info(f"Persisted {len(inserted)} orders from {len(entries)} ingest entries, "
+                    f"dispatched {dispatched}")
+
+    def _order_created_events(self, order_ids: List[str]) -> Dict[str, dict]:
+        """order_created per order with its firing lines, so KDS workers don't each query them"""
+        db = SessionLocal()
+        try:
+            firing = group_lines(db.execute(firing_lines_query(order_ids)).all())
+        except SQLAlchemyError as e:
+            logger.error(f"Could not load firing lines for persisted orders: {str(e)}")
+            return {order_id: {"type": "order_created", "order_id": order_id} for order_id in order_ids}
+        finally:
+            db.close()
+        return {
+            order_id: {"type": "order_created", "order_id": order_id, "firing": encode_firing(firing.get(order_id))}
+            for order_id in order_ids
+        }
+
+    def _insert(self, rows: List[dict]) -> set:
+        """Insert rows in one statement and return the IDs that were new"""
+        if not rows:
+            return set()
+        db = SessionLocal()
+        try:
+            # Replayed entries (crash between commit and ack) hit the conflict clause
+            inserted = set(db.scalars(
+                insert(Order).values(rows).on_conflict_do_nothing(index_elements=[Order.id]).returning(Order.id)
+            ))
+            item_rows = [line for row in rows if row["id"] in inserted for line in order_item_rows(row["id"], row["items"])]
+            if item_rows:
+                db.execute(insert(OrderItem), item_rows)
+            db.commit()
+            return inserted
+        except SQLAlchemyError:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _dead_letter(self, entry_id: str, fields: dict, order_id: str = None):
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.xadd(ORDER_INGEST_DEAD, fields)
+        if order_id:
+            # It will never be persisted, so stop serving it as accepted and
+            # give its pickup slot back
+            pipe.delete(pending_key(order_id))
+            release_slot_sync(order_id, pipe)
+        pipe.xack(ORDER_INGEST_STREAM, ORDER_INGEST_GROUP, entry_id)
+        pipe.xdel(ORDER_INGEST_STREAM, entry_id)
+        pipe.execute()
+
+if __name__ == "__main__":
+    OrderPersister().run()
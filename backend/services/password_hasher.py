@@ -0,0 +1,116 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple, Union
+
+from passlib.context import CryptContext
+
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# bcrypt cost; stored hashes with any other cost are rehashed on the next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+# Threads hashing at once, per API worker; bcrypt releases the GIL while it runs
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+# Callers allowed to wait for a hashing thread before new ones are turned away
+PASSWORD_HASH_MAX_WAITING = int(os.getenv("PASSWORD_HASH_MAX_WAITING", 64))
+
+def make_context(rounds: int = BCRYPT_ROUNDS) -> CryptContext:
+    # min == max == default makes every other cost count as outdated
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
+
+pwd_context = make_context()
+
+class HasherBusy(Exception):
+    """Too many callers are already waiting for a hashing thread"""
+
+class PasswordHasher:
+    """Runs bcrypt hashing and verification off the event loop.
+
+    At most `workers` hashes run at once, on a dedicated thread pool so they
+    never compete with the default executor. Up to `max_waiting` further
+    callers queue for a slot; beyond that HasherBusy is raised, so a login
+    burst is shed instead of piling up behind the pool.
+    """
+
+    def __init__(self, context: CryptContext = pwd_context, workers: int = PASSWORD_HASH_WORKERS,
+                 max_waiting: int = PASSWORD_HASH_MAX_WAITING):
+        self.context = context
+        self.workers = workers
+        self.max_waiting = max_waiting
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._slots = asyncio.Semaphore(workers)
+        self.in_flight = 0
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self._wait_seconds = 0.0
+        self._run_seconds = 0.0
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password: str, hashed: Union[str, bytes]) -> bool:
+        return await self._run(self.context.verify, password, hashed)
+
+    async def verify_and_update(self, password: str, hashed: Union[str, bytes]) -> Tuple[bool, Optional[str]]:
+        """Check a password; the second value is a fresh hash if the stored one uses old cost settings"""
+        valid, new_hash = await self._run(self.context.verify_and_update, password, hashed)
+        if new_hash:
+            self.rehashed += 1
+        return valid, new_hash
+
+    def metrics(self) -> dict:
+        return {
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "peak_waiting": self.peak_waiting,
+            "max_waiting": self.max_waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "rehashed": self.rehashed,
+            "avg_wait_ms": round(self._wait_seconds / self.completed * 1000, 2) if self.completed else 0.0,
+            "avg_hash_ms": round(self._run_seconds / self.completed * 1000, 2) if self.completed else 0.0,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, fn, *args):
+        if self._slots.locked() and self.waiting >= self.max_waiting:
+            self.rejected += 1
+            logger.warning(f"Password hashing saturated: {self.waiting} callers waiting")
+            raise HasherBusy()
+
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        self.peak_waiting = max(self.peak_waiting, self.waiting)
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        started = time.perf_counter()
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+            self.completed += 1
+            self._wait_seconds += started - queued_at
+            self._run_seconds += time.perf_counter() - started
+
+# Shared by the auth routes of this process
+password_hasher = PasswordHasher()
@@ -0,0 +1,189 @@
+import asyncio
+import os
+import random
+import time
+from typing import Optional
+
+import httpx
+from redis.exceptions import RedisError
+
+from database import async_redis_client
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+PAYCONIQ_API_URL = os.getenv("PAYCONIQ_API_URL", "https://api.payconiq.com/v3/payments")
+PAYCONIQ_API_KEY = os.getenv("PAYCONIQ_API_KEY")
+PAYCONIQ_TIMEOUT = float(os.getenv("PAYCONIQ_TIMEOUT", 5))  # seconds per read/write
+PAYCONIQ_CONNECT_TIMEOUT = 2  # seconds
+PAYCONIQ_MAX_RETRIES = int(os.getenv("PAYCONIQ_MAX_RETRIES", 2))
+RETRY_BASE_DELAY = 0.2  # seconds, doubled per attempt
+RETRY_MAX_DELAY = 2  # seconds
+MAX_CONNECTIONS = 20
+MAX_KEEPALIVE_CONNECTIONS = 10
+KEEPALIVE_EXPIRY = 30  # seconds an idle connection is kept open
+BREAKER_FAILURE_THRESHOLD = 5  # consecutive failed calls before the circuit opens
+BREAKER_RESET_TIMEOUT = 30  # seconds the circuit stays open before a trial call
+
+PAYMENT_STATUS_PREFIX = "payments:status:"  # payment id -> last status Payconiq reported
+FINAL_STATUSES = {"SUCCEEDED", "FAILED", "CANCELLED", "EXPIRED"}
+FINAL_STATUS_TTL = 24 * 60 * 60  # seconds; a final status never changes
+OPEN_STATUS_TTL = 5  # seconds; absorbs bursts of duplicate callbacks for a payment still in progress
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Errors raised before the request reached Payconiq, so even a POST is safe to resend
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+class PayconiqError(Exception):
+    """Payconiq could not be reached or rejected the request"""
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+class CircuitOpen(PayconiqError):
+    """Payconiq failed repeatedly; calls are refused until the reset timeout"""
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half-open -> closed.
+
+    After `failure_threshold` failed calls in a row every call is refused for
+    `reset_timeout` seconds. Then a single trial call is let through and the
+    timer restarts; its success closes the circuit, its failure (or no answer
+    within another reset_timeout) leads to the next trial.
+    """
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open":
+            # Back to open for everyone else while the trial call runs
+            self.opened_at = time.monotonic()
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.error(f"Payconiq circuit opened after {self.failures} failed calls")
+            self.opened_at = time.monotonic()
+
+class PayconiqClient:
+    """Async Payconiq API client sharing one keep-alive connection pool.
+
+    Reads and connection failures are retried with exponential backoff and
+    full jitter; a create_payment POST is only resent when the request never
+    left (connect errors), so a payment is never created twice. Calls that
+    still fail count towards the circuit breaker.
+    """
+
+    def __init__(self, base_url: str = PAYCONIQ_API_URL, api_key: Optional[str] = PAYCONIQ_API_KEY,
+                 timeout: float = PAYCONIQ_TIMEOUT, max_retries: int = PAYCONIQ_MAX_RETRIES,
+                 breaker: CircuitBreaker = None, transport: httpx.AsyncBaseTransport = None):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = httpx.Timeout(timeout, connect=PAYCONIQ_CONNECT_TIMEOUT)
+        self.max_retries = max_retries
+        self.breaker = breaker or CircuitBreaker()
+        self.transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created lazily so the pool belongs to the running event loop
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                headers={"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"},
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=MAX_CONNECTIONS,
+                    max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=KEEPALIVE_EXPIRY,
+                ),
+                transport=self.transport,
+            )
+        return self._client
+
+    async def create_payment(self, amount: int, reference: str, callback_url: str, currency: str = "EUR") -> dict:
+        payload = {"amount": amount, "currency": currency, "reference": reference, "callbackUrl": callback_url}
+        return await self._request("POST", self.base_url, idempotent=False, json=payload)
+
+    async def get_payment(self, payment_id: str) -> dict:
+        return await self._request("GET", f"{self.base_url}/{payment_id}")
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _request(self, method: str, url: str, idempotent: bool = True, **kwargs) -> dict:
+        if not self.breaker.allow():
+            raise CircuitOpen("Payconiq is unavailable, circuit open")
+
+        attempt = 0
+        while True:
+            try:
+                response = await self.client.request(method, url, **kwargs)
+                if response.status_code in RETRY_STATUSES and idempotent and attempt < self.max_retries:
+                    error = PayconiqError(f"Payconiq answered {response.status_code}", response.status_code)
+                elif response.status_code >= 500 or response.status_code == 429:
+                    self.breaker.record_failure()
+                    raise PayconiqError(f"Payconiq answered {response.status_code}", response.status_code)
+                else:
+                    # A 4xx is our mistake, not Payconiq being down
+                    self.breaker.record_success()
+                    if response.is_error:
+                        raise PayconiqError(f"Payconiq rejected {method} {url}: {response.status_code}",
+                                            response.status_code)
+                    return response.json()
+            except httpx.HTTPError as e:
+                if attempt >= self.max_retries or not (idempotent or isinstance(e, UNSENT_ERRORS)):
+                    self.breaker.record_failure()
+                    raise PayconiqError(f"Payconiq request failed: {e.__class__.__name__}") from e
+                error = e
+
+            attempt += 1
+            delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+            logger.warning(f"Payconiq {method} attempt {attempt} failed ({error}), retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+# Shared by the payment routes of this process
+payconiq_client = PayconiqClient()
+
+async def payment_status(payment_id: str, client: PayconiqClient = payconiq_client, redis=async_redis_client) -> str:
+    """Payconiq status of a payment, cached in Redis so repeated checks skip the API"""
+    key = f"{PAYMENT_STATUS_PREFIX}{payment_id}"
+    try:
+        cached = await redis.get(key)
+    except RedisError as e:
+        logger.error(f"Could not read cached status of payment {payment_id}: {str(e)}")
+        cached = None
+    if cached:
+        return cached.decode()
+
+    status = (await client.get_payment(payment_id)).get("status", "UNKNOWN")
+    try:
+        await redis.set(key, status, ex=FINAL_STATUS_TTL if status in FINAL_STATUSES else OPEN_STATUS_TTL)
+    except RedisError as e:
+        logger.error(f"Could not cache status of payment {payment_id}: {str(e)}")
+    return status
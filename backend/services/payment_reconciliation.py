@@ -0,0 +1,147 @@
+import asyncio
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, update
+
+from database import AsyncSessionLocal
+from models.order import Order
+from services.payconiq import CircuitOpen, PayconiqClient, PayconiqError, payconiq_client
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+RECONCILE_PAGE_SIZE = int(os.getenv("RECONCILE_PAGE_SIZE", 200))
+RECONCILE_CONCURRENCY = int(os.getenv("RECONCILE_CONCURRENCY", 8))  # Payconiq lookups in flight
+RECONCILE_MIN_AGE = int(os.getenv("RECONCILE_MIN_AGE", 15))  # minutes; younger payments may still be in progress
+
+# Final Payconiq statuses and the payment_status they settle an order on
+SETTLED_STATUSES = {
+    "SUCCEEDED": "completed",
+    "FAILED": "failed",
+    "CANCELLED": "cancelled",
+    "EXPIRED": "expired",
+}
+
+def pending_page_query(cutoff: datetime, after: str, limit: int):
+    """References of pending payments created before cutoff, keyset-paged on the reference"""
+    return (
+        select(Order.payment_reference)
+        .where(
+            Order.payment_status == "pending",
+            Order.payment_reference > after,
+            Order.created_at < cutoff,
+        )
+        .order_by(Order.payment_reference)
+        .limit(limit)
+    )
+
+def settle_query(references: List[str], payment_status: str):
+    # A callback may have settled some of them in the meantime
+    return (
+        update(Order)
+        .where(Order.payment_reference.in_(references), Order.payment_status == "pending")
+        .values(payment_status=payment_status)
+        .returning(Order.id)
+    )
+
+@dataclass
+class ReconcileReport:
+    checked: int = 0
+    reconciled: Dict[str, int] = field(default_factory=dict)  # new payment_status -> orders
+    still_pending: int = 0
+    errors: int = 0
+    aborted: bool = False
+    seconds: float = 0.0
+
+    @property
+    def total_reconciled(self) -> int:
+        return sum(self.reconciled.values())
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "total_reconciled": self.total_reconciled}
+
+class PaymentReconciler:
+    """Settles orders whose payment stayed pending, e.g. after a lost callback.
+
+    Walks pending orders older than RECONCILE_MIN_AGE by payment_reference in
+    keyset pages, asks Payconiq for each status with at most `concurrency`
+    lookups in flight, and settles each page with one UPDATE per resulting
+    status. The run stops early if the Payconiq circuit opens.
+    """
+
+    def __init__(self, session_factory=AsyncSessionLocal, client: PayconiqClient = payconiq_client,
+                 page_size: int = RECONCILE_PAGE_SIZE, concurrency: int = RECONCILE_CONCURRENCY,
+                 min_age: int = RECONCILE_MIN_AGE):
+        self.session_factory = session_factory
+        self.client = client
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self.min_age = min_age
+
+    async def run(self, now: Optional[datetime] = None) -> ReconcileReport:
+        report = ReconcileReport()
+        started = time.perf_counter()
+        cutoff = (now or datetime.now()) - timedelta(minutes=self.min_age)
+        limit = asyncio.Semaphore(self.concurrency)
+        last_reference = ""
+        while not report.aborted:
+            references = await self.pending_page(cutoff, last_reference)
+            if not references:
+                break
+            last_reference = references[-1]
+            statuses = await asyncio.gather(*(self.lookup(reference, limit, report) for reference in references))
+            await self.settle(dict(zip(references, statuses)), report)
+        report.seconds = round(time.perf_counter() - started, 3)
+        logger.info(f"Payment reconciliation: {report.to_dict()}")
+        return report
+
+    async def pending_page(self, cutoff: datetime, after: str) -> List[str]:
+        async with self.session_factory() as db:
+            return list(await db.scalars(pending_page_query(cutoff, after, self.page_size)))
+
+    async def lookup(self, reference: str, limit: asyncio.Semaphore, report: ReconcileReport) -> Optional[str]:
+        if report.aborted:
+            return None
+        async with limit:
+            try:
+                return (await self.client.get_payment(reference)).get("status")
+            except CircuitOpen:
+                report.aborted = True
+            except PayconiqError as e:
+                logger.error(f"Could not check payment {reference}: {str(e)}")
+            report.errors += 1
+            return None
+
+    async def settle(self, statuses: Dict[str, Optional[str]], report: ReconcileReport):
+        report.checked += len(statuses)
+        by_status: Dict[str, List[str]] = {}
+        for reference, status in statuses.items():
+            if status in SETTLED_STATUSES:
+                by_status.setdefault(SETTLED_STATUSES[status], []).append(reference)
+            elif status is not None:
+                report.still_pending += 1
+        if not by_status:
+            return
+        async with self.session_factory() as db:
+            for payment_status, references in by_status.items():
+                settled = await db.scalars(settle_query(references, payment_status))
+                count = len(settled.all())
+                if count:
+                    report.reconciled[payment_status] = report.reconciled.get(payment_status, 0) + count
+            await db.commit()
+
+async def main():
+    try:
+        report = await PaymentReconciler().run()
+    finally:
+        await payconiq_client.aclose()
+    summary = ", ".join(f"{count} {status}" for status, count in report.reconciled.items()) or "none"
+    print(f"Checked {report.checked} pending payments in {report.seconds:.1f}s: reconciled {summary}, "
+          f"{report.still_pending} still pending, {report.errors} errors" + (", aborted" if report.aborted else ""))
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,71 @@
+import json
+from dataclasses import dataclass
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.menu import MenuItem
+from services.menu_cache import MenuCache, menu_cache
+
+# Stored next to the menu listings, so every menu write invalidates it too
+PRICING_SNAPSHOT_KEY = "pricing:snapshot"
+
+class MenuPrice(NamedTuple):
+    price: int  # in cents
+    prep_time: int  # in minutes
+
+MenuSnapshot = Dict[str, MenuPrice]  # available menu item id -> price and prep time
+
+@dataclass
+class PricedOrder:
+    items: List[dict]  # order lines with unit_price and line_total added
+    total_amount: int  # in cents
+
+def to_cents(price: float) -> int:
+    # Through str so 4.35 becomes 435, not 434
+    return int((Decimal(str(price)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+def format_amount(cents: int, currency: str = "EUR") -> str:
+    return f"{currency} {cents // 100}.{cents % 100:02d}"
+
+# (etag, snapshot) of the last payload parsed by this process
+_parsed: Tuple[Optional[str], MenuSnapshot] = (None, {})
+
+async def menu_snapshot(db: AsyncSession, cache: MenuCache = menu_cache) -> MenuSnapshot:
+    """Prices and prep times of the available menu, from the menu cache when possible"""
+    global _parsed
+
+    async def load() -> bytes:
+        rows = await db.execute(
+            select(MenuItem.id, MenuItem.price, MenuItem.prep_time).where(MenuItem.is_available)
+        )
+        return json.dumps({row.id: [to_cents(row.price), row.prep_time] for row in rows}).encode()
+
+    payload = await cache.get_or_load(PRICING_SNAPSHOT_KEY, load)
+    etag, snapshot = _parsed
+    if payload.etag != etag:
+        snapshot = {item_id: MenuPrice(*values) for item_id, values in json.loads(payload.body).items()}
+        _parsed = (payload.etag, snapshot)
+    return snapshot
+
+def price_orders(baskets: Iterable[Iterable[dict]], snapshot: MenuSnapshot) -> List[PricedOrder]:
+    """Price many baskets of {item_id, quantity, ...} lines in one pass.
+
+    Every item must be in the snapshot; callers validate that first.
+    """
+    priced = []
+    for basket in baskets:
+        lines = []
+        total = 0
+        for item in basket:
+            unit_price = snapshot[item["item_id"]].price
+            line_total = unit_price * item["quantity"]
+            lines.append({**item, "unit_price": unit_price, "line_total": line_total})
+            total += line_total
+        priced.append(PricedOrder(items=lines, total_amount=total))
+    return priced
+
+def price_order(items: Iterable[dict], snapshot: MenuSnapshot) -> PricedOrder:
+    return price_orders([items], snapshot)[0]
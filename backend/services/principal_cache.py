@@ -0,0 +1,164 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Awaitable, Callable, Optional, Tuple
+
+from redis.exceptions import RedisError
+
+from database import async_redis_client
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Seconds a worker trusts its own copy; bounds how long a change made through another worker can go unseen
+PRINCIPAL_LOCAL_TTL = float(os.getenv("PRINCIPAL_LOCAL_TTL", 5))
+# Seconds the shared copy in Redis lives before the customer is reloaded from the database
+PRINCIPAL_REDIS_TTL = int(os.getenv("PRINCIPAL_REDIS_TTL", 300))
+PRINCIPAL_CACHE_SIZE = 10000
+
+PRINCIPAL_PREFIX = "auth:principal:"  # customer id -> principal JSON
+LOGOUT_PREFIX = "auth:logout:"  # customer id -> time of the last logout; older tokens are revoked
+
+@dataclass
+class Principal:
+    """What authenticated requests need to know about a customer"""
+    id: str
+    email: str
+    phone: str
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    is_verified: bool = False
+
+    @classmethod
+    def from_customer(cls, customer) -> "Principal":
+        return cls(
+            id=customer.id,
+            email=customer.email,
+            phone=customer.phone,
+            first_name=customer.first_name,
+            last_name=customer.last_name,
+            is_verified=bool(customer.is_verified),
+        )
+
+def principal_key(user_id: str) -> str:
+    return f"{PRINCIPAL_PREFIX}{user_id}"
+
+def logout_key(user_id: str) -> str:
+    return f"{LOGOUT_PREFIX}{user_id}"
+
+# (expires at, principal or None if not loaded yet, last logout or None)
+_Entry = Tuple[float, Optional[Principal], Optional[float]]
+
+class PrincipalCache:
+    """Token subject to customer resolution, in process and in Redis.
+
+    Each worker keeps the principal and the customer's last logout time for
+    PRINCIPAL_LOCAL_TTL seconds; on a local miss both come from Redis in one
+    round trip, and only a Redis miss loads the customer from the database.
+    Changing a customer or logging out deletes the Redis copy and the local
+    one, so other workers see it within PRINCIPAL_LOCAL_TTL.
+    """
+
+    def __init__(self, redis=async_redis_client, local_ttl: float = PRINCIPAL_LOCAL_TTL,
+                 redis_ttl: int = PRINCIPAL_REDIS_TTL, max_size: int = PRINCIPAL_CACHE_SIZE):
+        self.redis = redis
+        self.local_ttl = local_ttl
+        self.redis_ttl = redis_ttl
+        self.max_size = max_size
+        self._local: "OrderedDict[str, _Entry]" = OrderedDict()
+        self.hits = {"local": 0, "redis": 0, "database": 0}
+
+    async def get(self, user_id: str, load: Callable[[str], Awaitable[Optional[Principal]]]) -> Tuple[Optional[Principal], Optional[float]]:
+        """The principal and last logout time of a customer; load is called only when no cache has it"""
+        entry = self._local_entry(user_id)
+        if entry and entry[1] is not None:
+            self.hits["local"] += 1
+            return entry[1], entry[2]
+
+        principal, logged_out_at = await self._fetch(user_id)
+        if principal is not None:
+            self.hits["redis"] += 1
+        else:
+            principal = await load(user_id)
+            if principal is None:
+                return None, logged_out_at
+            self.hits["database"] += 1
+            await self._store(principal)
+        self._remember(user_id, principal, logged_out_at)
+        return principal, logged_out_at
+
+    async def last_logout(self, user_id: str) -> Optional[float]:
+        """Last logout time only, for callers that never need the customer itself"""
+        entry = self._local_entry(user_id)
+        if entry:
+            self.hits["local"] += 1
+            return entry[2]
+        try:
+            value = await self.redis.get(logout_key(user_id))
+        except RedisError as e:
+            logger.error(f"Could not read logout time of {user_id}: {str(e)}")
+            value = None
+        logged_out_at = float(value) if value else None
+        self.hits["redis"] += 1
+        self._remember(user_id, None, logged_out_at)
+        return logged_out_at
+
+    async def invalidate(self, user_id: str):
+        """Forget a customer everywhere, after it changed"""
+        self._local.pop(user_id, None)
+        try:
+            await self.redis.delete(principal_key(user_id))
+        except RedisError as e:
+            logger.error(f"Could not invalidate principal {user_id}: {str(e)}")
+
+    async def logout(self, user_id: str, ttl: int) -> bool:
+        """Revoke every token of a customer issued before now; ttl is the longest a token lives.
+
+        Returns whether the logout was recorded; without Redis it can't be.
+        """
+        self._local.pop(user_id, None)
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.set(logout_key(user_id), time.time(), ex=ttl)
+                pipe.delete(principal_key(user_id))
+                await pipe.execute()
+        except RedisError as e:
+            logger.error(f"Could not record logout of {user_id}: {str(e)}")
+            return False
+        return True
+
+    def _local_entry(self, user_id: str) -> Optional[_Entry]:
+        entry = self._local.get(user_id)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._local[user_id]
+            return None
+        self._local.move_to_end(user_id)
+        return entry
+
+    def _remember(self, user_id: str, principal: Optional[Principal], logged_out_at: Optional[float]):
+        self._local[user_id] = (time.monotonic() + self.local_ttl, principal, logged_out_at)
+        self._local.move_to_end(user_id)
+        while len(self._local) > self.max_size:
+            self._local.popitem(last=False)
+
+    async def _fetch(self, user_id: str) -> Tuple[Optional[Principal], Optional[float]]:
+        try:
+            data, logged_out_at = await self.redis.mget(principal_key(user_id), logout_key(user_id))
+        except RedisError as e:
+            logger.error(f"Could not read principal {user_id}: {str(e)}")
+            return None, None
+        principal = Principal(**json.loads(data)) if data else None
+        return principal, float(logged_out_at) if logged_out_at else None
+
+    async def _store(self, principal: Principal):
+        try:
+            await self.redis.set(principal_key(principal.id), json.dumps(asdict(principal)), ex=self.redis_ttl)
+        except RedisError as e:
+            logger.error(f"Could not cache principal {principal.id}: {str(e)}")
+
+# Shared by the auth dependencies of this process
+principal_cache = PrincipalCache()
@@ -0,0 +1,349 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, List
+
+from sqlalchemy import select, update
+
+from database import SessionLocal, redis_client
+from models.menu import MenuItem
+from models.order import Order
+from services.print_queue_service import PrinterService as PrintQueue, PRINT_QUEUE
+from services.printer_connection import PrinterConnection
+from services.reliable_queue import restart_on_crash
+from services.pricing import format_amount
+from services.ticket_renderer import render_kitchen_ticket, join_tickets
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+TICKET_TTL = 24 * 60 * 60  # keep station tickets around for reprints
+STATS_WINDOW = 60  # seconds covered by the throughput figure
+BATCH_SIZE = int(os.getenv("PRINT_BATCH_SIZE", 10))  # tickets sent per printer write
+
+def printer_config(prefix: str) -> Dict[str, dict]:
+    """Connection parameters per printer type from the {prefix}_* environment variables"""
+    return {
+        "usb": {
+            "vendor_id": int(os.getenv(f"{prefix}_VENDOR_ID", "0x6868"), 0),
+            "product_id": int(os.getenv(f"{prefix}_PRODUCT_ID", "0x0500"), 0),
+        },
+        "network": {
+            "host": os.getenv(f"{prefix}_HOST", "192.168.1.100"),
+            "port": int(os.getenv(f"{prefix}_PORT", "9100")),
+        },
+        "bluetooth": {
+            "device_address": os.getenv(f"{prefix}_BT_ADDRESS"),
+        },
+        "dummy": {
+            "output_file": os.getenv(f"{prefix}_OUTPUT_FILE"),
+            "latency": float(os.getenv(f"{prefix}_DUMMY_LATENCY", "0")),
+            "failure_rate": float(os.getenv(f"{prefix}_DUMMY_FAILURE_RATE", "0")),
+        }
+    }
+
+# Printer configuration from environment
+PRINTER_TYPE = os.getenv("PRINTER_TYPE", "usb")
+PRINTER_CONFIG = printer_config("PRINTER")
+# The front-of-house printer behind /printer is a separate device: a printer
+# only takes one connection, and PRINTER_* belongs to the kitchen station
+FOH_PRINTER_TYPE = os.getenv("FOH_PRINTER_TYPE", "dummy")
+FOH_PRINTER_CONFIG = printer_config("FOH_PRINTER")
+
+def load_stations() -> Dict[str, dict]:
+    """Printer stations from PRINT_STATIONS, e.g.
+
+        {"kitchen": {"connection_type": "usb", "vendor_id": 1046, "product_id": 20497, "categories": ["*"]},
+         "bar": {"connection_type": "network", "host": "10.0.0.20", "categories": ["drinks"]},
+         "pickup": {"connection_type": "network", "host": "10.0.0.21", "all_items": true}}
+
+    A station gets the lines whose menu category it lists; "*" catches
+    categories no other station claims, and all_items stations get every
+    line. "layout" picks the ticket layout (defaults to the station name). Without PRINT_STATIONS there is one kitchen station using the
+    PRINTER_* settings.
+    """
+    raw = os.getenv("PRINT_STATIONS")
+    if raw:
+        return json.loads(raw)
+    return {
+        "kitchen": {
+            "connection_type": PRINTER_TYPE,
+            **PRINTER_CONFIG.get(PRINTER_TYPE, {}),
+            "categories": ["*"],
+        }
+    }
+
+STATIONS = load_stations()
+
+def station_queue(station: str) -> str:
+    return f"{PRINT_QUEUE}:{station}"
+
+def ticket_key(station: str, order_id: str) -> str:
+    return f"{station_queue(station)}:ticket:{order_id}"
+
+def pending_key(order_id: str) -> str:
+    return f"{PRINT_QUEUE}:pending:{order_id}"
+
+def stats_key(station: str) -> str:
+    return f"{PRINT_QUEUE}:stats:{station}"
+
+def route_lines(lines: List[dict], stations: Dict[str, dict]) -> Dict[str, List[dict]]:
+    """Split order lines by station based on each line's menu category"""
+    by_category = {}
+    fallback = []
+    everything = []
+    for name, config in stations.items():
+        if config.get("all_items"):
+            everything.append(name)
+        for category in config.get("categories", []):
+            if category == "*":
+                fallback.append(name)
+            else:
+                by_category.setdefault(category, []).append(name)
+
+    routed: Dict[str, List[dict]] = {}
+    for line in lines:
+        for name in dict.fromkeys(by_category.get(line["category"], fallback) + everything):
+            routed.setdefault(name, []).append(line)
+    return routed
+
+class PrintDispatcher(PrintQueue):
+    """Consumes the order print queue and fans each order out to its stations.
+
+    The station tickets, the pending-station counter and the ack are written
+    in one Redis transaction, so an order is never half-dispatched.
+    """
+
+    def __init__(self, db, stations: Dict[str, dict] = STATIONS, redis=redis_client):
+        super().__init__(db, queue=PRINT_QUEUE, redis=redis)
+        self.stations = stations
+
+    def process_job(self, order_id: str):
+        order = self.db.get(Order, order_id)
+        if not order:
+            logger.warning(f"Dropping print job for unknown order {order_id}")
+            self.ack(order_id)
+            return
+
+        items = order.items or []
+        menu = {
+            row.id: row for row in self.db.execute(
+                select(MenuItem.id, MenuItem.name, MenuItem.category)
+                .where(MenuItem.id.in_([item["item_id"] for item in items]))
+            )
+        }
+        lines = []
+        for item in items:
+            menu_item = menu.get(item["item_id"])
+            lines.append({
+                "name": menu_item.name if menu_item else item["item_id"],
+                "category": menu_item.category if menu_item else None,
+                "quantity": item["quantity"],
+                "special_requests": item.get("special_requests"),
+            })
+        routed = route_lines(lines, self.stations)
+        if not routed:
+            # Nothing for any station to print, so no worker would ever settle it
+            logger.warning(f"No station prints any line of order {order_id}, skipping it")
+            self.db.execute(update(Order).where(Order.id == order_id).values(print_status="skipped"))
+            self.db.commit()
+            self.ack(order_id)
+            return
+
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.set(pending_key(order_id), len(routed), ex=TICKET_TTL)
+        for station, station_lines in routed.items():
+            ticket = {
+                "order_id": order_id,
+                "order_time": order.created_at.strftime("%H:%M") if order.created_at else "",
+                "ready_time": order.time_slot.strftime("%H:%M") if order.time_slot else "ASAP",
+                "customer_name": order.customer_id or "Guest",
+                "customer_contact": order.customer_email or "",
+                "items": [
+                    f"{line['quantity']}x {line['name']}"
+                    + (f" ({line['special_requests']})" if line["special_requests"] else "")
+                    for line in station_lines
+                ],
+            }
+            if self.stations[station].get("all_items") and order.total_amount is not None:
+                # The ticket that goes with the bag doubles as the receipt
+                ticket["total"] = format_amount(order.total_amount)
+            # Stored pre-rendered, so printing and reprints are a single raw write
+            layout = self.stations[station].get("layout", station)
+            pipe.set(ticket_key(station, order_id), render_kitchen_ticket(ticket, layout), ex=TICKET_TTL)
+            pipe.lpush(station_queue(station), order_id)
+        self.ack(order_id, pipe)
+        self.db.rollback()  # end the read transaction; this worker lives for a long time
+        pipe.execute()
+        logger.info(f"Dispatched order {order_id} to {', '.join(routed)}")
+
+class StationWorker(PrintQueue):
+    """Prints one station's tickets on that station's printer.
+
+    The printer connection is kept warm and reconnected in the background;
+    while it is down the worker stops claiming jobs, so they wait in Redis
+    instead of burning retries.
+    """
+
+    def __init__(self, db, station: str, config: dict, redis=redis_client):
+        super().__init__(db, queue=station_queue(station), redis=redis)
+        self.station = station
+        self.connection = PrinterConnection.from_params(
+            name=station,
+            **{k: v for k, v in config.items() if k not in ("categories", "all_items", "layout")}
+        )
+        self.batch_size = BATCH_SIZE
+
+    def process_queue(self):
+        """Print whatever is waiting for this station, several tickets per write"""
+        self.connection.start()
+        while True:
+            self.run_maintenance()
+            if not self.connection.wait_until_connected(timeout=1):
+                continue
+            order_id = self.claim_job()
+            if order_id:
+                order_ids = [order_id] + self.claim_ready_jobs(self.batch_size - 1)
+                self.run_jobs(order_ids, lambda: self.process_batch(order_ids))
+
+    def process_job(self, order_id: str):
+        self.process_batch([order_id])
+
+    def process_batch(self, order_ids: List[str]):
+        tickets = self.redis.mget([ticket_key(self.station, order_id) for order_id in order_ids])
+        batch, missing = [], []
+        for order_id, ticket in zip(order_ids, tickets):
+            if ticket is None:
+                logger.error(f"No {self.station} ticket stored for order {order_id}")
+                missing.append(order_id)
+            else:
+                batch.append((order_id, ticket))
+        if missing:
+            # Nothing left to retry: the ticket expired or was never rendered
+            self.db.execute(update(Order).where(Order.id.in_(missing)).values(print_status="failed"))
+            self.db.commit()
+            for order_id in missing:
+                self.dead_letter(order_id)
+        if not batch:
+            return
+
+        started = time.perf_counter()
+        try:
+            # A failed write marks the connection down and triggers a reconnect
+            self.connection.write(join_tickets(ticket for _, ticket in batch))
+        except Exception as e:
+            self._record(len(batch), failed=True)
+            for order_id, _ in batch:
+                self._handle_failure(order_id, e)
+            return
+
+        self._record(len(batch), elapsed_ms=(time.perf_counter() - started) * 1000)
+        for order_id, _ in batch:
+            self._handle_success(order_id)
+
+    def run_maintenance(self) -> bool:
+        if not super().run_maintenance():
+            return False
+        connection = self.connection.stats()
+        self.redis.hset(stats_key(self.station), mapping={
+            "connected": int(connection["connected"]),
+            "reconnects": connection["reconnects"],
+            "last_reconnect_seconds": connection["last_reconnect_seconds"] or 0,
+        })
+        return True
+
+    def _printed_status(self, order_id: str) -> str:
+        remaining = self.redis.decr(pending_key(order_id))
+        return "completed" if remaining <= 0 else "printing"
+
+    def _record(self, tickets: int, elapsed_ms: float = 0.0, failed: bool = False):
+        now = time.time()
+        pipe = self.redis.pipeline(transaction=False)
+        if failed:
+            pipe.hincrby(stats_key(self.station), "failed", tickets)
+        else:
+            pipe.hincrby(stats_key(self.station), "printed", tickets)
+            pipe.hincrbyfloat(stats_key(self.station), "print_ms_total", elapsed_ms)
+            pipe.zadd(f"{stats_key(self.station)}:recent", {f"{now}:{threading.get_ident()}:{tickets}": now})
+        pipe.zremrangebyscore(f"{stats_key(self.station)}:recent", "-inf", now - STATS_WINDOW)
+        pipe.execute()
+
+def station_stats(stations: Dict[str, dict] = STATIONS, redis=redis_client) -> Dict[str, dict]:
+    """Queue depth and throughput per station"""
+    now = time.time()
+    pipe = redis.pipeline(transaction=False)
+    for station in stations:
+        queue = PrintQueue(queue=station_queue(station), redis=redis)
+        pipe.llen(queue.queue)
+        pipe.llen(queue.processing_key)
+        pipe.zcard(queue.retry_key)
+        pipe.llen(queue.dead_key)
+        pipe.hgetall(stats_key(station))
+        pipe.zrangebyscore(f"{stats_key(station)}:recent", now - STATS_WINDOW, "+inf")
+    results = pipe.execute()
+
+    stats = {}
+    for i, station in enumerate(stations):
+        queued, processing, retrying, dead, totals, recent = results[i * 6:(i + 1) * 6]
+        totals = {k.decode(): float(v) for k, v in totals.items()}
+        printed = int(totals.get("printed", 0))
+        recent = sum(int(entry.rsplit(b":", 1)[1]) for entry in recent)
+        stats[station] = {
+            "queued": queued,
+            "processing": processing,
+            "retrying": retrying,
+            "dead": dead,
+            "printed": printed,
+            "failed": int(totals.get("failed", 0)),
+            "tickets_per_minute": recent * 60 / STATS_WINDOW,
+            "avg_print_ms": totals.get("print_ms_total", 0) / printed if printed else None,
+            "connected": bool(totals.get("connected", 0)),
+            "reconnects": int(totals.get("reconnects", 0)),
+            "last_reconnect_seconds": totals.get("last_reconnect_seconds"),
+        }
+    return stats
+
+def reprint_order(order_id: str, redis=redis_client) -> List[str]:
+    """Queue an order's stored tickets again without re-rendering them"""
+    stations = [s for s in STATIONS if redis.exists(ticket_key(s, order_id))]
+    if stations:
+        pipe = redis.pipeline(transaction=True)
+        pipe.set(pending_key(order_id), len(stations), ex=TICKET_TTL)
+        for station in stations:
+            pipe.lpush(station_queue(station), order_id)
+        pipe.execute()
+    return stations
+
+class PrintWorkerPool:
+    """Runs the dispatcher and one worker thread per configured printer"""
+
+    def __init__(self, stations: Dict[str, dict] = STATIONS):
+        self.stations = stations
+        self.threads: List[threading.Thread] = []
+
+    def _run(self, name: str, make_worker):
+        db = SessionLocal()
+        try:
+            restart_on_crash(f"print-{name}", make_worker(db).process_queue, on_crash=db.rollback)
+        finally:
+            db.close()
+
+    def start(self):
+        workers = {"dispatcher": lambda db: PrintDispatcher(db, self.stations)}
+        for station, config in self.stations.items():
+            workers[station] = lambda db, station=station, config=config: StationWorker(db, station, config)
+        for name, make_worker in workers.items():
+            thread = threading.Thread(target=self._run, args=(name, make_worker), name=f"print-{name}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        logger.info(f"Print workers started for {', '.join(self.stations)}")
+
+    def join(self):
+        for thread in self.threads:
+            thread.join()
+
+if __name__ == "__main__":
+    pool = PrintWorkerPool()
+    pool.start()
+    pool.join()
@@ -1,58 +1,95 @@
-import time
+import os
 import logging
+from datetime import datetime
+from typing import Callable, List
 from database import redis_client
+from services.reliable_queue import ReliableQueue
 from models.order import Order
+from sqlalchemy import func, update
 from sqlalchemy.orm import Session
 from utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
-PRINT_QUEUE = "print_queue"
+PRINT_QUEUE = os.getenv("PRINT_QUEUE", "print_queue")
 MAX_RETRIES = 3
-RETRY_DELAY = 30  # seconds
+RETRY_DELAY = float(os.getenv("PRINT_RETRY_DELAY", 30))  # seconds
 
-class PrinterService:
-    def __init__(self, db: Session):
+class PrinterService(ReliableQueue):
+    """Print job queue and worker, on top of the reliable Redis queue.
+
+    A failing ticket waits in the retry ZSET instead of blocking the worker
+    and is dead-lettered after MAX_RETRIES; print_status, print_attempts and
+    last_print_attempt on the order are kept up to date along the way.
+    """
+
+    def __init__(self, db: Session = None, queue: str = PRINT_QUEUE, redis=redis_client):
+        super().__init__(queue, redis=redis, retry_delay=RETRY_DELAY)
         self.db = db
-        
+
     def queue_print_job(self, order_id: str):
         """Add order to print queue"""
-        redis_client.lpush(PRINT_QUEUE, order_id)
-        
+        self.enqueue(order_id)
+
     def process_queue(self):
         """Process print jobs from queue"""
         while True:
-            order_id = redis_client.rpop(PRINT_QUEUE)
-            if not order_id:
-                time.sleep(1)
-                continue
-                
-            order = self.db.query(Order).get(order_id)
-            if not order:
-                continue
-                
-            try:
-                logger.debug(f"Processing print job for order {order_id}")
-                self._print_order(order)
-                order.print_status = "completed"
-                logger.info(f"Successfully printed order {order_id}")
-            except Exception as e:
-                logger.error(f"Print failed for order {order_id}: {str(e)}")
-                order.print_attempts += 1
-                if order.print_attempts >= MAX_RETRIES:
-                    order.print_status = "failed"
-                    logger.error(f"Max retries reached for order {order_id}")
-                else:
-                    logger.warning(f"Requeuing order {order_id}, attempt {order.print_attempts}")
-                    redis_client.lpush(PRINT_QUEUE, order_id)
-                    time.sleep(RETRY_DELAY)
-                    
-            order.last_print_attempt = time.time()
-            self.db.commit()
-            
-    def _print_order(self, order):
-        """Actual printing logic"""
-        # TODO: Implement printer-specific logic
-        print(f"Printing order {order.id}")
-        # Simulate print delay
-        time.sleep(1)
\ No newline at end of file
+            self.run_maintenance()
+            order_id = self.claim_job()
+            if order_id:
+                self.run_jobs([order_id], lambda: self.process_job(order_id))
+
+    def run_jobs(self, order_ids: List[str], work: Callable[[], None]):
+        """Run work on claimed jobs, putting them back if it crashes.
+
+        Print errors are handled by process_job; this catches everything else
+        (a database or Redis hiccup, a malformed order) so one bad job can't
+        kill the worker. The jobs wait out RETRY_DELAY and are dead-lettered
+        after MAX_RETRIES like any failed print.
+        """
+        try:
+            work()
+        except Exception as e:
+            logger.exception(f"Print job for {', '.join(order_ids)} on {self.queue} crashed: {str(e)}")
+            if self.db is not None:
+                self.db.rollback()
+            for order_id in order_ids:
+                if self.fail_claimed(order_id, MAX_RETRIES) == 2:
+                    logger.error(f"Max retries reached for order {order_id} on {self.queue}")
+
+    def process_job(self, order_id: str):
+        """Handle one claimed job; PrintDispatcher and StationWorker do the printing"""
+        raise NotImplementedError
+
+    def _handle_success(self, order_id: str):
+        self.db.execute(update(Order).where(Order.id == order_id).values(
+            print_status=self._printed_status(order_id),
+            last_print_attempt=datetime.utcnow(),
+        ))
+        self.db.commit()
+        self.ack(order_id)
+        logger.info(f"Successfully printed order {order_id}")
+
+    def _handle_failure(self, order_id: str, error: Exception):
+        logger.error(f"Print failed for order {order_id}: {str(error)}")
+        attempts = self.record_failure(order_id)
+        exhausted = attempts >= MAX_RETRIES
+        # Increment in SQL: several station workers may fail on the same order at once
+        values = {
+            "print_attempts": func.coalesce(Order.print_attempts, 0) + 1,
+            "last_print_attempt": datetime.utcnow(),
+        }
+        if exhausted:
+            values["print_status"] = "failed"
+        self.db.execute(update(Order).where(Order.id == order_id).values(**values))
+        self.db.commit()
+        if exhausted:
+            self.dead_letter(order_id)
+            logger.error(f"Max retries reached for order {order_id} on {self.queue}")
+        else:
+            self.schedule_retry(order_id)
+            logger.warning(f"Retrying order {order_id} in {RETRY_DELAY}s, attempt {attempts}")
+
+    def _printed_status(self, order_id: str) -> str:
+        """print_status to record after this queue printed the order"""
+        return "completed"
@@ -0,0 +1,177 @@
+import random
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+from services.printer_service import PrinterService
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+HEALTH_CHECK_INTERVAL = 10  # seconds between liveness probes while connected
+BACKOFF_INITIAL = 0.5  # seconds before the first reconnect attempt
+BACKOFF_MAX = 30  # seconds
+MAX_HELD_JOBS = 500  # jobs kept in memory while the printer is down
+
+class PrinterConnection:
+    """Keeps one printer connection warm and reconnects it when it drops.
+
+    A background thread probes the printer every HEALTH_CHECK_INTERVAL and,
+    once it is down, reconnects with exponential backoff and jitter. Jobs sent
+    while the printer is down are held in memory (up to MAX_HELD_JOBS) and
+    flushed in order once it is back.
+    """
+
+    def __init__(self, factory: Callable[[], PrinterService], name: str = "printer",
+                 health_interval: float = HEALTH_CHECK_INTERVAL,
+                 backoff_initial: float = BACKOFF_INITIAL, backoff_max: float = BACKOFF_MAX,
+                 max_held_jobs: int = MAX_HELD_JOBS):
+        self.factory = factory
+        self.name = name
+        self.health_interval = health_interval
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.printer: Optional[PrinterService] = None
+        self.held_jobs = deque(maxlen=max_held_jobs)
+        self._lock = threading.RLock()
+        self._connected = threading.Event()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._down_since: Optional[float] = time.monotonic()
+        self._ever_connected = False
+        self.reconnects = 0
+        self.last_reconnect_seconds: Optional[float] = None
+        self.total_reconnect_seconds = 0.0
+        self.last_error: Optional[str] = None
+
+    @classmethod
+    def from_params(cls, name: str = "printer", **connection_params) -> "PrinterConnection":
+        return cls(lambda: PrinterService(**connection_params), name=name)
+
+    @property
+    def connected(self) -> bool:
+        return self._connected.is_set()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return  # a restarted worker keeps its connection thread
+        self._thread = threading.Thread(target=self._run, name=f"printer-conn-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+        self._disconnect()
+
+    def wait_until_connected(self, timeout: Optional[float] = None) -> bool:
+        return self._connected.wait(timeout)
+
+    def send(self, data: bytes) -> bool:
+        """Write a rendered buffer now, or hold it until the printer is back.
+
+        Returns True if it was printed and False if it was held.
+        """
+        with self._lock:
+            if self.connected and not self.held_jobs:
+                try:
+                    self.printer.write_raw(data)
+                    return True
+                except Exception as e:
+                    self._mark_down(e)
+            if len(self.held_jobs) == self.held_jobs.maxlen:
+                logger.error(f"Printer {self.name} hold buffer full, dropping oldest job")
+            self.held_jobs.append(data)
+            return False
+
+    def write(self, data: bytes):
+        """Write a rendered buffer, raising if the printer is down; callers do their own retries"""
+        with self._lock:
+            if not self.connected:
+                raise RuntimeError(f"Printer {self.name} is not connected")
+            try:
+                self.printer.write_raw(data)
+            except Exception as e:
+                self._mark_down(e)
+                raise
+
+    def stats(self) -> dict:
+        return {
+            "connected": self.connected,
+            "held_jobs": len(self.held_jobs),
+            "reconnects": self.reconnects,
+            "last_reconnect_seconds": self.last_reconnect_seconds,
+            "avg_reconnect_seconds": self.total_reconnect_seconds / self.reconnects if self.reconnects else None,
+            "down_for_seconds": time.monotonic() - self._down_since if self._down_since else 0.0,
+            "last_error": self.last_error,
+        }
+
+    def _mark_down(self, error: Exception):
+        logger.warning(f"Printer {self.name} connection lost: {str(error)}")
+        self.last_error = str(error)
+        self._disconnect()
+        self._wake.set()
+
+    def _disconnect(self):
+        with self._lock:
+            if self._connected.is_set():
+                self._down_since = time.monotonic()
+            self._connected.clear()
+            if self.printer:
+                self.printer.close()
+                self.printer = None
+
+    def _connect(self) -> bool:
+        try:
+            printer = self.factory()
+        except Exception as e:
+            self.last_error = str(e)
+            return False
+
+        with self._lock:
+            self.printer = printer
+            self._connected.set()
+            elapsed = time.monotonic() - self._down_since
+            self._down_since = None
+            if self._ever_connected:
+                self.reconnects += 1
+                self.last_reconnect_seconds = elapsed
+                self.total_reconnect_seconds += elapsed
+            self._ever_connected = True
+            logger.info(f"Printer {self.name} connected after {elapsed:.2f}s")
+            self._flush_held_jobs()
+        return True
+
+    def _flush_held_jobs(self):
+        while self.held_jobs:
+            try:
+                self.printer.write_raw(self.held_jobs[0])
+            except Exception as e:
+                self._mark_down(e)
+                return
+            self.held_jobs.popleft()
+
+    def _run(self):
+        backoff = self.backoff_initial
+        while not self._stop.is_set():
+            if not self.connected:
+                if self._connect():
+                    backoff = self.backoff_initial
+                    continue
+                delay = backoff * random.uniform(0.8, 1.2)
+                backoff = min(backoff * 2, self.backoff_max)
+                self._stop.wait(delay)
+                continue
+
+            self._wake.wait(self.health_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            # Probed outside the lock so a slow probe never holds up writes
+            printer = self.printer
+            alive = printer is not None and printer.is_alive()
+            if not alive and self.connected and self.printer is printer:
+                self._mark_down(RuntimeError("health check failed"))
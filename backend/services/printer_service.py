@@ -1,17 +1,58 @@
-from escpos.printer import Usb, Network, Serial
-from typing import Optional, Union
+from escpos.printer import Usb, Network, Serial, Dummy
+from typing import List, Optional
+from services.ticket_renderer import render_kitchen_ticket, join_tickets
 import logging
+import random
+import select
+import socket
+import time
+
+class RecordingPrinter(Dummy):
+    """Hardware-free printer that records the ESC/POS bytes it is sent
+
+    Args:
+        output_file: Optional file the bytes are appended to as well
+        latency: Seconds each write takes, to mimic a slow link
+        failure_rate: Probability (0-1) that a write raises IOError
+        seed: Seed for the failure simulation, for reproducible runs
+    """
+
+    def __init__(self, output_file: Optional[str] = None, latency: float = 0.0,
+                 failure_rate: float = 0.0, seed: Optional[int] = None):
+        Dummy.__init__(self)
+        self.output_file = output_file
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.writes = 0
+        self.failures = 0
+        self._random = random.Random(seed)
+
+    def _raw(self, msg):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.failure_rate and self._random.random() < self.failure_rate:
+            self.failures += 1
+            raise IOError("Simulated printer failure")
+        self.writes += 1
+        Dummy._raw(self, msg)
+        if self.output_file:
+            with open(self.output_file, "ab") as f:
+                f.write(msg)
+
+    def is_online(self):
+        return True
 
 class PrinterService:
     def __init__(self, connection_type: str = 'usb', **connection_params):
         """Initialize printer connection
         
         Args:
-            connection_type: 'usb', 'network', or 'bluetooth'
+            connection_type: 'usb', 'network', 'bluetooth' or 'dummy'
             connection_params: Parameters specific to connection type
                 USB: vendor_id, product_id, in_ep, out_ep
-                Network: host, port
+                Network: host, port, timeout
                 Bluetooth: device_address
+                Dummy: output_file, latency, failure_rate, seed (see RecordingPrinter)
         """
         self.printer = None
         self.connection_type = connection_type
@@ -29,12 +70,20 @@ class PrinterService:
             elif connection_type == 'network':
                 self.printer = Network(
                     host=connection_params.get('host'),
-                    port=connection_params.get('port', 9100)
+                    port=connection_params.get('port', 9100),
+                    timeout=connection_params.get('timeout', 10)
                 )
             elif connection_type == 'bluetooth':
                 self.printer = Serial(
                     dev=connection_params.get('device_address')
                 )
+            elif connection_type == 'dummy':
+                self.printer = RecordingPrinter(
+                    output_file=connection_params.get('output_file'),
+                    latency=float(connection_params.get('latency', 0.0)),
+                    failure_rate=float(connection_params.get('failure_rate', 0.0)),
+                    seed=connection_params.get('seed')
+                )
             else:
                 raise ValueError(f"Unsupported connection type: {connection_type}")
                 
@@ -43,6 +92,41 @@ class PrinterService:
             self.logger.error(f"Failed to initialize printer: {str(e)}")
             raise
 
+    def is_alive(self) -> bool:
+        """Cheap liveness probe used by the connection health checks"""
+        if not self.printer:
+            return False
+
+        if self.connection_type == 'network':
+            # Not every network printer answers status queries; a peek is enough
+            # to tell whether the peer has closed or reset the TCP connection.
+            # Polled with a zero timeout: escpos sets a socket timeout, with
+            # which even MSG_DONTWAIT would block for the whole timeout.
+            sock = self.printer.device
+            try:
+                readable, _, _ = select.select([sock], [], [], 0)
+                if not readable:
+                    return True
+                timeout = sock.gettimeout()
+                sock.settimeout(0)
+                try:
+                    # Readable with nothing to read means the peer closed
+                    return sock.recv(1, socket.MSG_PEEK) != b""
+                finally:
+                    sock.settimeout(timeout)
+            except BlockingIOError:
+                return True
+            except (OSError, ValueError):
+                return False
+
+        try:
+            return bool(self.printer.is_online())
+        except NotImplementedError:
+            return True
+        except Exception as e:
+            self.logger.warning(f"Printer status query failed: {str(e)}")
+            return False
+
     def print_text(self, text: str, align: str = 'left'):
         """Print text with optional alignment
         
@@ -98,9 +182,27 @@ class PrinterService:
             except Exception as e:
                 self.logger.error(f"Failed to close printer: {str(e)}")
 
-    def print_kitchen_order(self, order_details: dict):
+    def write_raw(self, data: bytes):
+        """Send a pre-rendered ESC/POS buffer in a single write"""
+        if not self.printer:
+            raise RuntimeError("Printer not initialized")
+
+        try:
+            self.printer._raw(data)
+        except Exception as e:
+            self.logger.error(f"Raw write failed: {str(e)}")
+            raise
+
+    def print_batch(self, tickets: List[bytes]):
+        """Send several rendered tickets in one transmission"""
+        self.write_raw(join_tickets(tickets))
+
+    def print_kitchen_order(self, order_details: dict, layout: str = 'kitchen'):
         """Print a kitchen order ticket with formatted layout
-        
+
+        The ticket is rendered into one buffer first (see services.ticket_renderer)
+        so network and Bluetooth printers get a single write instead of one per command.
+
         Args:
             order_details: Dictionary containing:
                 - order_time: When order was placed
@@ -108,35 +210,10 @@ class PrinterService:
                 - customer_name: Customer name
                 - customer_contact: Phone/contact info
                 - items: List of order items
+            layout: Ticket layout name, selects the cached header/footer
         """
-        if not self.printer:
-            raise RuntimeError("Printer not initialized")
-            
         try:
-            # Header with order info
-            self.printer.set(align='center', text_type='B', width=2, height=2)
-            self.printer.text("KITCHEN ORDER\n")
-            self.printer.set(align='left', text_type='B', width=1, height=1)
-            
-            # Order details
-            self.printer.text(f"Order Time: {order_details['order_time']}\n")
-            self.printer.text(f"Ready By: {order_details['ready_time']}\n\n")
-            
-            # Customer info
-            self.printer.text(f"Customer: {order_details['customer_name']}\n")
-            self.printer.text(f"Contact: {order_details['customer_contact']}\n\n")
-            
-            # Order items in large font
-            self.printer.set(text_type='B', width=2, height=2)
-            self.printer.text("ORDER ITEMS:\n")
-            for item in order_details['items']:
-                self.printer.text(f"- {item}\n")
-            
-            # Reset formatting and add cut line
-            self.printer.set(text_type='normal', width=1, height=1)
-            self.printer.text("\n")
-            self.printer.cut()
-            
+            self.write_raw(render_kitchen_ticket(order_details, layout))
         except Exception as e:
             self.logger.error(f"Print kitchen order failed: {str(e)}")
-            raise
\ No newline at end of file
+            raise
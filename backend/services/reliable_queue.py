@@ -0,0 +1,200 @@
+import time
+from typing import Callable, List, Optional
+from database import redis_client
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+VISIBILITY_TIMEOUT = 120  # seconds a claimed job may stay unacknowledged
+POP_TIMEOUT = 1  # seconds to block waiting for a job
+MAINTENANCE_INTERVAL = 1  # seconds between retry/visibility sweeps
+PROMOTE_BATCH = 100
+WORKER_BACKOFF = 1  # seconds before restarting a crashed worker loop, doubled per crash
+WORKER_BACKOFF_MAX = 60
+
+# Move retries whose delay has passed back onto the ready queue
+PROMOTE_DUE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, job in ipairs(due) do
+    redis.call('ZREM', KEYS[1], job)
+    redis.call('LPUSH', KEYS[2], job)
+end
+return #due
+"""
+
+# Put a claimed job whose worker went quiet back at the head of the ready queue
+REQUEUE_EXPIRED_SCRIPT = """
+redis.call('HDEL', KEYS[2], ARGV[1])
+if redis.call('LREM', KEYS[1], 1, ARGV[1]) > 0 then
+    redis.call('RPUSH', KEYS[3], ARGV[1])
+    return 1
+end
+return 0
+"""
+
+# Retry a job later or dead-letter it once it ran out of attempts, but only
+# if it is still claimed: after a crash mid-batch some jobs may be acked already
+FAIL_CLAIMED_SCRIPT = """
+if redis.call('LREM', KEYS[1], 1, ARGV[1]) == 0 then
+    return 0
+end
+redis.call('HDEL', KEYS[2], ARGV[1])
+if redis.call('HINCRBY', KEYS[3], ARGV[1], 1) >= tonumber(ARGV[3]) then
+    redis.call('HDEL', KEYS[3], ARGV[1])
+    redis.call('LPUSH', KEYS[5], ARGV[1])
+    return 2
+end
+redis.call('ZADD', KEYS[4], ARGV[2], ARGV[1])
+return 1
+"""
+
+class ReliableQueue:
+    """Reliable Redis work queue.
+
+    Jobs are moved atomically from the ready list into a processing list when
+    claimed, and only removed from it once done, retried or dead-lettered,
+    so a worker crash never loses a job. Failed jobs wait in a delay ZSET
+    instead of blocking the worker, and claims older than VISIBILITY_TIMEOUT
+    are handed to the next worker.
+
+    Keys (for queue "print_queue"):
+        print_queue             ready jobs (LPUSH in, RPOP side out)
+        print_queue:processing  jobs claimed by a worker
+        print_queue:claims      hash of job -> claim timestamp
+        print_queue:retry       ZSET of job -> due timestamp
+        print_queue:attempts    hash of job -> failed attempts on this queue
+        print_queue:dead        jobs that exhausted their retries
+    """
+
+    def __init__(self, queue: str, redis=redis_client, retry_delay: float = 30):
+        self.redis = redis
+        self.queue = queue
+        self.retry_delay = retry_delay
+        self.processing_key = f"{queue}:processing"
+        self.claims_key = f"{queue}:claims"
+        self.retry_key = f"{queue}:retry"
+        self.attempts_key = f"{queue}:attempts"
+        self.dead_key = f"{queue}:dead"
+        self._promote_due = redis.register_script(PROMOTE_DUE_SCRIPT)
+        self._requeue_expired = redis.register_script(REQUEUE_EXPIRED_SCRIPT)
+        self._fail_claimed = redis.register_script(FAIL_CLAIMED_SCRIPT)
+        self._last_maintenance = 0.0
+
+    def enqueue(self, job: str):
+        self.redis.lpush(self.queue, job)
+
+    def claim_job(self, timeout: float = POP_TIMEOUT) -> Optional[str]:
+        """Block until a job is ready and move it to the processing list"""
+        job = self.redis.blmove(self.queue, self.processing_key, timeout, "RIGHT", "LEFT")
+        if job is None:
+            return None
+        job = job.decode() if isinstance(job, bytes) else job
+        self.redis.hset(self.claims_key, job, time.time())
+        return job
+
+    def claim_ready_jobs(self, limit: int) -> List[str]:
+        """Claim up to limit more jobs without blocking, for batched processing"""
+        pipe = self.redis.pipeline(transaction=False)
+        for _ in range(limit):
+            pipe.lmove(self.queue, self.processing_key, "RIGHT", "LEFT")
+        jobs = [job.decode() for job in pipe.execute() if job is not None]
+        if jobs:
+            now = time.time()
+            self.redis.hset(self.claims_key, mapping={job: now for job in jobs})
+        return jobs
+
+    def ack(self, job: str, pipe=None):
+        """Finish a job; pass a pipeline to make this part of a larger transaction"""
+        own_pipe = pipe is None
+        if own_pipe:
+            pipe = self.redis.pipeline(transaction=True)
+        pipe.lrem(self.processing_key, 1, job)
+        pipe.hdel(self.claims_key, job)
+        pipe.hdel(self.attempts_key, job)
+        if own_pipe:
+            pipe.execute()
+
+    def record_failure(self, job: str) -> int:
+        """Count a failed attempt at job and return the total so far"""
+        return self.redis.hincrby(self.attempts_key, job, 1)
+
+    def schedule_retry(self, job: str, delay: Optional[float] = None):
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.zadd(self.retry_key, {job: time.time() + (self.retry_delay if delay is None else delay)})
+        pipe.lrem(self.processing_key, 1, job)
+        pipe.hdel(self.claims_key, job)
+        pipe.execute()
+
+    def dead_letter(self, job: str):
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.lpush(self.dead_key, job)
+        pipe.lrem(self.processing_key, 1, job)
+        pipe.hdel(self.claims_key, job)
+        pipe.hdel(self.attempts_key, job)
+        pipe.execute()
+
+    def fail_claimed(self, job: str, max_attempts: int, delay: Optional[float] = None) -> int:
+        """Count a failed attempt at a job that may or may not still be claimed.
+
+        Returns 0 if it was no longer claimed, 1 if it was scheduled for a
+        retry and 2 if it was dead-lettered.
+        """
+        due = time.time() + (self.retry_delay if delay is None else delay)
+        return self._fail_claimed(
+            keys=[self.processing_key, self.claims_key, self.attempts_key, self.retry_key, self.dead_key],
+            args=[job, due, max_attempts],
+        )
+
+    def promote_due_retries(self) -> int:
+        return self._promote_due(keys=[self.retry_key, self.queue], args=[time.time(), PROMOTE_BATCH])
+
+    def requeue_expired_claims(self) -> int:
+        now = time.time()
+        claims = {job.decode(): float(ts) for job, ts in self.redis.hgetall(self.claims_key).items()}
+        # A worker that died between claiming and recording the claim leaves an
+        # unclaimed job in processing; start its visibility clock now
+        for job in set(j.decode() for j in self.redis.lrange(self.processing_key, 0, -1)) - claims.keys():
+            self.redis.hsetnx(self.claims_key, job, now)
+
+        requeued = 0
+        for job, claimed_at in claims.items():
+            if now - claimed_at > VISIBILITY_TIMEOUT:
+                requeued += self._requeue_expired(
+                    keys=[self.processing_key, self.claims_key, self.queue], args=[job]
+                )
+                logger.warning(f"Job {job} on {self.queue} exceeded visibility timeout, requeued")
+        return requeued
+
+    def run_maintenance(self) -> bool:
+        """Run the retry/visibility sweeps if they are due; returns whether they ran"""
+        now = time.monotonic()
+        if now - self._last_maintenance < MAINTENANCE_INTERVAL:
+            return False
+        self._last_maintenance = now
+        self.promote_due_retries()
+        self.requeue_expired_claims()
+        return True
+
+def restart_on_crash(name: str, loop: Callable[[], None], on_crash: Optional[Callable[[], None]] = None):
+    """Run a worker loop forever, restarting it with a growing backoff when it crashes.
+
+    Workers put failing jobs back themselves; what reaches this is an error
+    between jobs, e.g. Redis or the database being unreachable.
+    """
+    backoff = WORKER_BACKOFF
+    last_crash = float("-inf")
+    while True:
+        try:
+            loop()
+        except Exception as e:
+            now = time.monotonic()
+            # Back to the shortest delay once it ran cleanly for a while
+            if now - last_crash > WORKER_BACKOFF_MAX:
+                backoff = WORKER_BACKOFF
+            else:
+                backoff = min(backoff * 2, WORKER_BACKOFF_MAX)
+            last_crash = now
+            logger.exception(f"Worker {name} crashed, restarting in {backoff}s: {str(e)}")
+            if on_crash:
+                on_crash()
+            time.sleep(backoff)
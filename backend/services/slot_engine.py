@@ -0,0 +1,194 @@
+import json
+import math
+import os
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from database import async_redis_client, redis_client
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+SLOT_MINUTES = int(os.getenv("SLOT_MINUTES", 15))
+# Prep minutes the kitchen can absorb per slot, e.g. 60 for four cooks on 15 minute slots
+SLOT_CAPACITY = int(os.getenv("SLOT_CAPACITY", 60))
+OPENING_HOUR = int(os.getenv("OPENING_HOUR", 11))
+CLOSING_HOUR = int(os.getenv("CLOSING_HOUR", 22))
+SLOT_KEY_TTL = 3 * 24 * 60 * 60  # seconds a day's load is kept after its last booking
+
+SLOT_LOAD_PREFIX = "slots:load:"  # hash per day: slot start "HH:MM" -> booked prep minutes
+SLOT_BOOKING_PREFIX = "slots:booking:"  # per order: the increments it added, for release
+
+# KEYS[1] booking key, KEYS[2..n] day hash of each slot
+# ARGV[1] capacity, ARGV[2] force, ARGV[3] ttl, ARGV[4] booking record,
+# then one (field, minutes) pair per slot key
+BOOK_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 1
+end
+if ARGV[2] ~= '1' then
+    for i = 2, #KEYS do
+        local field = ARGV[3 + (i - 1) * 2]
+        local minutes = tonumber(ARGV[4 + (i - 1) * 2])
+        local load = tonumber(redis.call('HGET', KEYS[i], field) or '0')
+        if load + minutes > tonumber(ARGV[1]) then
+            return 0
+        end
+    end
+end
+for i = 2, #KEYS do
+    redis.call('HINCRBY', KEYS[i], ARGV[3 + (i - 1) * 2], ARGV[4 + (i - 1) * 2])
+    redis.call('EXPIRE', KEYS[i], ARGV[3])
+end
+redis.call('SET', KEYS[1], ARGV[4], 'EX', ARGV[3])
+return 1
+"""
+
+RELEASE_SCRIPT = """
+local record = redis.call('GET', KEYS[1])
+if not record then
+    return 0
+end
+for _, inc in ipairs(cjson.decode(record)) do
+    redis.call('HINCRBY', inc[1], inc[2], -inc[3])
+end
+redis.call('DEL', KEYS[1])
+return 1
+"""
+
+book_script = async_redis_client.register_script(BOOK_SCRIPT)
+release_script = async_redis_client.register_script(RELEASE_SCRIPT)
+# For the blocking background workers
+release_script_sync = redis_client.register_script(RELEASE_SCRIPT)
+
+SlotLoad = Tuple[str, str, int]  # (day key, slot field, prep minutes)
+
+
+def load_key(day: date) -> str:
+    return f"{SLOT_LOAD_PREFIX}{day.isoformat()}"
+
+
+def booking_key(order_id: str) -> str:
+    return f"{SLOT_BOOKING_PREFIX}{order_id}"
+
+
+def slot_start(moment: datetime) -> datetime:
+    return moment.replace(minute=moment.minute - moment.minute % SLOT_MINUTES, second=0, microsecond=0)
+
+
+def basket_weight(items: Iterable[Tuple[str, int]], prep_times: Dict[str, int]) -> Tuple[int, int]:
+    """Total prep minutes of a basket of (item_id, quantity), and its longest single prep time"""
+    weight = longest = 0
+    for item_id, quantity in items:
+        prep_time = prep_times[item_id]
+        weight += prep_time * quantity
+        longest = max(longest, prep_time)
+    return weight, longest
+
+
+def cooking_minutes(weight: int, longest: int, capacity: int = SLOT_CAPACITY) -> int:
+    """How long a basket is cooked: its longest dish, or longer if the kitchen
+    needs more time than that to get through all of its prep minutes"""
+    return max(longest, math.ceil(weight * SLOT_MINUTES / capacity), 1)
+
+
+def slot_loads(pickup: datetime, weight: int, longest: int, capacity: int = SLOT_CAPACITY) -> List[SlotLoad]:
+    """Spread a basket's prep minutes over the slots it is cooked in.
+
+    Cooking runs from pickup - cooking_minutes to pickup; each slot overlapping
+    that window gets the share of the weight that falls inside it. The window
+    is stretched for heavy baskets, so no share exceeds what the kitchen can
+    do in that part of the slot and any basket fits an empty kitchen.
+    """
+    if weight <= 0:
+        return []
+    end = pickup
+    start = pickup - timedelta(minutes=cooking_minutes(weight, longest, capacity))
+    window = (end - start).total_seconds()
+    loads = []
+    slot = slot_start(start)
+    while slot < end:
+        slot_end = slot + timedelta(minutes=SLOT_MINUTES)
+        overlap = (min(slot_end, end) - max(slot, start)).total_seconds()
+        share = weight * overlap / window
+        loads.append([load_key(slot.date()), slot.strftime("%H:%M"), math.floor(share), share % 1])
+        slot = slot_end
+    # Largest remainders get the minutes lost to rounding down, so the total
+    # is exact and no slot ends above the ceiling of its share
+    for load in sorted(loads, key=lambda load: load[3], reverse=True)[:weight - sum(load[2] for load in loads)]:
+        load[2] += 1
+    return [tuple(load[:3]) for load in loads if load[2] > 0]
+
+
+def fits(loads: List[SlotLoad], booked: Dict[str, Dict[str, int]], capacity: int = SLOT_CAPACITY) -> bool:
+    return all(booked.get(key, {}).get(field, 0) + minutes <= capacity for key, field, minutes in loads)
+
+
+async def day_loads(days: Iterable[date], redis=async_redis_client) -> Dict[str, Dict[str, int]]:
+    """Booked prep minutes per slot for each day, one round trip"""
+    keys = [load_key(day) for day in days]
+    async with redis.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.hgetall(key)
+        results = await pipe.execute()
+    return {
+        key: {field.decode(): int(value) for field, value in loads.items()}
+        for key, loads in zip(keys, results)
+    }
+
+
+async def available_slots(day: date, weight: int, longest: int, now: Optional[datetime] = None,
+                          redis=async_redis_client) -> List[dict]:
+    """Pickup times on day that can still take a basket of this weight"""
+    now = now or datetime.now()
+    opening = datetime.combine(day, datetime.min.time()).replace(hour=OPENING_HOUR)
+    closing = datetime.combine(day, datetime.min.time()).replace(hour=CLOSING_HOUR)
+    # The cooking window of the first slot may start the day before
+    booked = await day_loads({day - timedelta(days=1), day}, redis)
+
+    earliest = now + timedelta(minutes=cooking_minutes(weight, longest))
+    slots = []
+    pickup = opening
+    while pickup <= closing:
+        if pickup >= earliest:
+            loads = slot_loads(pickup, weight, longest)
+            if fits(loads, booked):
+                # Headroom left in the busiest slot this basket would use
+                remaining = min(
+                    (SLOT_CAPACITY - booked.get(key, {}).get(field, 0) - minutes for key, field, minutes in loads),
+                    default=SLOT_CAPACITY,
+                )
+                slots.append({"pickup_time": pickup, "remaining": remaining})
+        pickup += timedelta(minutes=SLOT_MINUTES)
+    return slots
+
+
+async def book(order_id: str, pickup: datetime, weight: int, longest: int,
+               force: bool = False, redis=async_redis_client) -> bool:
+    """Atomically add an order's load to its slots if they all have room.
+
+    Booking the same order twice is a no-op that succeeds. With force the
+    load is recorded even over capacity, for orders that already happened.
+    """
+    loads = slot_loads(pickup, weight, longest)
+    if not loads:
+        return True
+    args = [SLOT_CAPACITY, "1" if force else "0", SLOT_KEY_TTL, json.dumps(loads)]
+    for _, field, minutes in loads:
+        args += [field, minutes]
+    booked = await book_script(
+        keys=[booking_key(order_id)] + [key for key, _, _ in loads],
+        args=args,
+        client=redis,
+    )
+    return bool(booked)
+
+
+async def release(order_id: str, redis=async_redis_client) -> bool:
+    """Give an order's slot load back, e.g. when its insert failed"""
+    return bool(await release_script(keys=[booking_key(order_id)], client=redis))
+
+
+def release_sync(order_id: str, redis=redis_client):
+    """release for code outside the event loop; pass a pipeline to make it part of a transaction"""
+    return release_script_sync(keys=[booking_key(order_id)], client=redis)
@@ -0,0 +1,94 @@
+from functools import lru_cache
+from typing import Iterable
+
+from escpos.printer import Dummy
+
+# Fixed text per ticket layout; everything else on a ticket is per-order
+LAYOUTS = {
+    "kitchen": {"title": "KITCHEN ORDER", "items_heading": "ORDER ITEMS:"},
+    "bar": {"title": "BAR ORDER", "items_heading": "DRINKS:"},
+    "pickup": {"title": "PICKUP", "items_heading": "ORDER ITEMS:"},
+}
+
+def _capture(draw) -> bytes:
+    printer = Dummy()
+    draw(printer)
+    return printer.output
+
+@lru_cache(maxsize=None)
+def render_header(layout: str) -> bytes:
+    """Title block, rendered once per layout"""
+    title = LAYOUTS.get(layout, LAYOUTS["kitchen"])["title"]
+
+    def draw(printer):
+        printer.set(align='center', bold=True, double_width=True, double_height=True)
+        printer.text(f"{title}\n")
+        printer.set(align='left', bold=True)
+    return _capture(draw)
+
+@lru_cache(maxsize=None)
+def render_items_heading(layout: str) -> bytes:
+    heading = LAYOUTS.get(layout, LAYOUTS["kitchen"])["items_heading"]
+
+    def draw(printer):
+        printer.set(bold=True, double_width=True, double_height=True)
+        printer.text(f"{heading}\n")
+    return _capture(draw)
+
+@lru_cache(maxsize=None)
+def render_footer(layout: str) -> bytes:
+    """Reset formatting, feed and cut"""
+    def draw(printer):
+        printer.set(bold=False)
+        printer.text("\n")
+        printer.cut()
+    return _capture(draw)
+
+def encode_text(text: str) -> bytes:
+    """Encode ticket text, skipping the code page search when it isn't needed"""
+    # ASCII is identical in every ESC/POS code page, so it can go out as-is
+    if text.isascii():
+        return text.encode("ascii")
+    # Own Dummy per fragment, so its code page selection is self-contained
+    return _capture(lambda printer: printer.text(text))
+
+def render_kitchen_ticket(order_details: dict, layout: str = "kitchen") -> bytes:
+    """Render a kitchen ticket to one ESC/POS buffer that can be sent in a single write
+
+    Args:
+        order_details: Same dictionary as PrinterService.print_kitchen_order
+        layout: Key into LAYOUTS selecting the cached header/footer fragments
+    """
+    details = (
+        f"Order Time: {order_details['order_time']}\n"
+        f"Ready By: {order_details['ready_time']}\n\n"
+        f"Customer: {order_details['customer_name']}\n"
+        f"Contact: {order_details['customer_contact']}\n\n"
+    )
+    items = "".join(f"- {item}\n" for item in order_details['items'])
+    if order_details.get('total'):
+        items += f"\nTOTAL: {order_details['total']}\n"
+    return b"".join((
+        render_header(layout),
+        encode_text(details),
+        render_items_heading(layout),
+        encode_text(items),
+        render_footer(layout),
+    ))
+
+def render_text(text: str, align: str = "left") -> bytes:
+    def draw(printer):
+        printer.set(align=align if align in ("center", "right") else "left")
+        printer.text(text + "\n")
+        printer.set(align="left")
+    return _capture(draw)
+
+def render_image(image_path: str) -> bytes:
+    return _capture(lambda printer: printer.image(image_path))
+
+def render_cut(partial: bool = False) -> bytes:
+    return _capture(lambda printer: printer.cut(mode="PART" if partial else "FULL"))
+
+def join_tickets(tickets: Iterable[bytes]) -> bytes:
+    """Concatenate rendered tickets into one transmission"""
+    return b"".join(tickets)
@@ -0,0 +1,91 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List
+
+import fakeredis
+import fakeredis.aioredis
+import pytest
+import redis
+import redis.asyncio
+from redis.exceptions import ConnectionError as RedisConnectionError
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import models.customer  # noqa: F401  (register every table on Base.metadata)
+import models.reservation  # noqa: F401
+import database
+from models.base import Base
+
+class DownRedis:
+    """Unreachable Redis, leaving only the per-process tier of a cache and its loader"""
+    async def hget(self, *args):
+        raise RedisConnectionError()
+
+    async def mget(self, *keys):
+        raise RedisConnectionError()
+
+    async def get(self, key):
+        raise RedisConnectionError()
+
+    async def set(self, *args, **kwargs):
+        raise RedisConnectionError()
+
+    async def delete(self, *keys):
+        raise RedisConnectionError()
+
+    def pipeline(self, *args, **kwargs):
+        raise RedisConnectionError()
+
+@asynccontextmanager
+async def memory_database() -> AsyncIterator[async_sessionmaker]:
+    """A fresh in-memory SQLite database with every table, as a session factory"""
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    try:
+        yield async_sessionmaker(engine, expire_on_commit=False)
+    finally:
+        await engine.dispose()
+
+def log_statements(sessions: async_sessionmaker) -> List[str]:
+    """Record every SQL statement run through sessions from now on"""
+    statements = []
+    event.listen(sessions.kw["bind"].sync_engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+    return statements
+
+@pytest.fixture
+def memory_db():
+    """`async with memory_db() as Session:` gives each call its own database"""
+    return memory_database
+
+@pytest.fixture
+def sync_db():
+    """Session factory over an in-memory SQLite database, for the sync workers"""
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+@pytest.fixture
+def statement_log():
+    return log_statements
+
+@pytest.fixture
+def down_redis():
+    return DownRedis()
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """Point the shared sync and async Redis clients at one in-memory fakeredis server.
+
+    Async connections are bound to the event loop that opened them, so use
+    the async client from a single asyncio.run per test.
+    """
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(database.redis_client, "connection_pool",
+                        redis.ConnectionPool(connection_class=fakeredis.FakeRedisConnection, server=server))
+    monkeypatch.setattr(database.async_redis_client, "connection_pool",
+                        redis.asyncio.ConnectionPool(connection_class=fakeredis.aioredis.FakeAsyncRedisConnection, server=server))
+    return database.redis_client
@@ -0,0 +1,56 @@
+import asyncio
+
+from routes.kds import ConnectionManager
+
+class FakeScreen:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.sent = []
+        self.closed = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        if self.fail:
+            raise ConnectionResetError("gone")
+        self.sent.append(text)
+
+    async def close(self, code=1000):
+        self.closed = code
+
+def test_reconnecting_screen_skips_events_it_already_has():
+    async def run():
+        manager = ConnectionManager()
+        screen = FakeScreen()
+
+        async def nothing_missed():
+            # Published while the screen catches up; seq 4 is older than what it saw
+            await manager.broadcast_text("event-4", 4)
+            await manager.broadcast_text("event-6", 6)
+            return []
+
+        connected = await manager.connect(screen, nothing_missed, last_seq=5)
+        await asyncio.sleep(0.01)
+        manager.disconnect(screen)
+        return connected, screen.sent
+
+    connected, sent = asyncio.run(run())
+    assert connected
+    assert sent == ["event-6"]
+
+def test_failed_catch_up_drops_the_screen():
+    async def run():
+        manager = ConnectionManager()
+        screen = FakeScreen(fail=True)
+
+        async def snapshot():
+            return [(7, "snapshot")]
+
+        connected = await manager.connect(screen, snapshot)
+        return connected, manager.active_connections, screen.closed
+
+    connected, active, closed = asyncio.run(run())
+    assert not connected
+    assert active == {}
+    assert closed == 1011
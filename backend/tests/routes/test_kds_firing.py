@@ -0,0 +1,42 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import routes.kds
+from models.menu import MenuItem
+from routes.kds import update_firing
+from routes.orders import OrderCreate, create_order
+from services.firing_schedule import FiringSchedule
+from services.kds_events import events_since
+from services.menu_cache import menu_cache
+
+def test_relayed_order_created_event_needs_no_query(memory_db, fake_redis, monkeypatch):
+    menu_cache.clear_local()
+    schedule = FiringSchedule()
+
+    async def no_query(order_ids=None):
+        raise AssertionError("the event should carry the firing lines")
+
+    monkeypatch.setattr(routes.kds, "firing_schedule", schedule)
+    monkeypatch.setattr(routes.kds, "firing_lines", no_query)
+    pickup = datetime.now().replace(microsecond=0) + timedelta(hours=2)
+    order = OrderCreate(phone="+32 1", payment_method="cash", time_slot=pickup,
+                        items=[{"item_id": "burger", "quantity": 2}])
+
+    async def run():
+        async with memory_db() as Session:
+            async with Session() as db:
+                db.add(MenuItem(id="burger", name="Burger", price=12.5, category="mains", prep_time=12))
+                await db.commit()
+            await menu_cache.invalidate()
+            async with Session() as db:
+                response = await create_order(order, db)
+        events = await events_since(0)
+        for _, text in events:
+            await update_firing(json.loads(text))
+        return response["order_id"]
+
+    order_id = asyncio.run(run())
+    [entry] = schedule.entries_for(order_id)
+    assert (entry.item_id, entry.name, entry.quantity) == ("burger", "Burger", 2)
+    assert entry.fire_at == pickup - timedelta(minutes=12)
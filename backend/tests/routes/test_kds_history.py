@@ -0,0 +1,77 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+import routes.kds
+from models.order import Order
+from routes.kds import get_orders_by_date_range
+
+DAY = datetime(2026, 3, 14, 11, 0)
+
+async def body(response) -> str:
+    return "".join([chunk async for chunk in response.body_iterator])
+
+@pytest.fixture
+def history(memory_db, monkeypatch):
+    """Runs `work(db)` against a database of 7 orders, 10 minutes apart on DAY"""
+    def run(work):
+        async def main():
+            async with memory_db() as Session:
+                # The streamed responses open their own session
+                monkeypatch.setattr(routes.kds, "AsyncSessionLocal", Session)
+                async with Session() as db:
+                    db.add_all([
+                        Order(id=f"o{i}", payment_method="cash", status="completed",
+                              created_at=DAY + timedelta(minutes=10 * i))
+                        for i in range(7)
+                    ])
+                    db.add(Order(id="next-day", payment_method="cash", created_at=DAY + timedelta(days=1)))
+                    await db.commit()
+                async with Session() as db:
+                    return await work(db)
+        return asyncio.run(main())
+    return run
+
+def history_page(db, **params):
+    return get_orders_by_date_range(start_date="2026-03-14", end_date="2026-03-14", db=db,
+                                    **{"limit": None, "cursor": None, "format": "json", **params})
+
+def test_plain_request_returns_the_bare_list(history):
+    async def work(db):
+        return json.loads(await body(await history_page(db)))
+
+    orders = history(work)
+    assert [order["order_id"] for order in orders] == [f"o{i}" for i in range(7)]
+
+def test_cursor_pages_round_trip_without_gaps_or_repeats(history):
+    async def work(db):
+        pages, cursor = [], None
+        while True:
+            page = await history_page(db, limit=3, cursor=cursor)
+            pages.append([order["order_id"] for order in page["orders"]])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return pages
+
+    assert history(work) == [["o0", "o1", "o2"], ["o3", "o4", "o5"], ["o6"]]
+
+def test_bad_cursor_is_a_400(history):
+    async def work(db):
+        with pytest.raises(HTTPException) as error:
+            await history_page(db, cursor="not-a-cursor")
+        return error.value
+
+    assert history(work).status_code == 400
+
+def test_ndjson_export_streams_every_order_after_the_cursor(history):
+    async def work(db):
+        first = await history_page(db, limit=2)
+        response = await history_page(db, format="ndjson", cursor=first["next_cursor"])
+        return response.media_type, await body(response)
+
+    media_type, text = history(work)
+    assert media_type == "application/x-ndjson"
+    assert [json.loads(line)["order_id"] for line in text.splitlines()] == ["o2", "o3", "o4", "o5", "o6"]
@@ -0,0 +1,36 @@
+import asyncio
+from datetime import datetime
+
+from models.menu import MenuItem
+from models.order import Order
+from models.order_item import OrderItem
+from routes.kds import get_kitchen_load
+
+def test_kitchen_load_sums_open_orders_per_item(memory_db):
+    async def run():
+        async with memory_db() as Session:
+            async with Session() as db:
+                db.add_all([
+                    MenuItem(id="burger", name="Burger", price=12.5, category="mains", prep_time=12),
+                    MenuItem(id="fries", name="Fries", price=4, category="sides", prep_time=5),
+                    MenuItem(id="cola", name="Cola", price=3, category="drinks", prep_time=1),
+                ])
+                for order_id, status in (("o1", "received"), ("o2", "preparing"), ("o3", "ready"), ("o4", "completed")):
+                    db.add(Order(id=order_id, status=status, payment_method="cash", created_at=datetime.now()))
+                await db.flush()
+                db.add_all([
+                    OrderItem(order_id="o1", menu_item_id="burger", quantity=2),
+                    OrderItem(order_id="o1", menu_item_id="fries", quantity=1),
+                    OrderItem(order_id="o2", menu_item_id="burger", quantity=1),
+                    OrderItem(order_id="o2", menu_item_id="cola", quantity=4),
+                    # Already cooked or done: not part of the load
+                    OrderItem(order_id="o3", menu_item_id="fries", quantity=5),
+                    OrderItem(order_id="o4", menu_item_id="burger", quantity=9),
+                ])
+                await db.commit()
+            async with Session() as db:
+                return await get_kitchen_load(db=db), await get_kitchen_load(category="mains", db=db)
+
+    load, mains = asyncio.run(run())
+    assert [(row["item_id"], row["quantity"]) for row in load] == [("cola", 4), ("burger", 3), ("fries", 1)]
+    assert mains == [{"item_id": "burger", "name": "Burger", "category": "mains", "quantity": 3}]
@@ -0,0 +1,20 @@
+import importlib
+import sys
+
+from fastapi.testclient import TestClient
+
+from models.base import Base
+
+def test_app_mounts_the_printer_routes(monkeypatch):
+    # main creates the tables on import; there is no database here
+    monkeypatch.setattr(Base.metadata, "create_all", lambda *args, **kwargs: None)
+    monkeypatch.delitem(sys.modules, "main", raising=False)
+    main = importlib.import_module("main")
+
+    paths = {route.path for route in main.app.routes}
+    assert {"/printer/health", "/printer/stations", "/printer/orders/{order_id}/reprint"} <= paths
+
+    # Without the lifespan the connection is never started, so it reports down
+    response = TestClient(main.app).get("/printer/health")
+    assert response.status_code == 200
+    assert response.json()["connected"] is False
@@ -0,0 +1,59 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from redis.exceptions import ConnectionError as RedisConnectionError
+from sqlalchemy import select
+
+import routes.orders
+from models.menu import MenuItem
+from models.order import Order
+from routes.orders import OrderCreate, create_order
+from services.menu_cache import menu_cache
+
+def test_order_is_accepted_unbooked_when_the_slot_store_is_down(memory_db, fake_redis, monkeypatch):
+    menu_cache.clear_local()
+    released = []
+
+    async def down_book(*args, **kwargs):
+        raise RedisConnectionError()
+
+    async def release(order_id):
+        released.append(order_id)
+
+    monkeypatch.setattr(routes.orders, "book_slot", down_book)
+    monkeypatch.setattr(routes.orders, "release_slot", release)
+    pickup = datetime.now().replace(microsecond=0) + timedelta(hours=2)
+    order = OrderCreate(phone="+32 1", payment_method="cash", time_slot=pickup,
+                        items=[{"item_id": "burger", "quantity": 1}])
+
+    async def run():
+        async with memory_db() as Session:
+            async with Session() as db:
+                db.add(MenuItem(id="burger", name="Burger", price=12.5, category="mains", prep_time=12))
+                await db.commit()
+            await menu_cache.invalidate()
+            async with Session() as db:
+                response = await create_order(order, db)
+            async with Session() as db:
+                stored = await db.scalar(select(Order.time_slot).where(Order.id == response["order_id"]))
+        return response, stored
+
+    response, stored = asyncio.run(run())
+    assert response["status"] == "received"
+    assert stored == pickup
+    assert released == []
+
+def test_unknown_customer_is_rejected(memory_db):
+    order = OrderCreate(customer_id="nobody", payment_method="cash", items=[{"item_id": "burger", "quantity": 1}])
+
+    async def run():
+        async with memory_db() as Session:
+            async with Session() as db:
+                with pytest.raises(HTTPException) as error:
+                    await create_order(order, db)
+        return error.value
+
+    error = asyncio.run(run())
+    assert (error.status_code, error.detail) == (400, "Unknown customer nobody")
@@ -0,0 +1,108 @@
+import asyncio
+
+from sqlalchemy import func, select
+
+import routes.orders
+from models.menu import MenuItem
+from models.order import Order
+from models.order_item import OrderItem
+from routes.orders import OrderBatch, create_orders_batch
+from services.menu_cache import menu_cache
+from services.print_queue_service import PRINT_QUEUE
+
+def basket(order_id, **overrides):
+    return {"order_id": order_id, "phone": "+32 1", "payment_method": "cash",
+            "items": [{"item_id": "burger", "quantity": 2}], **overrides}
+
+def test_invalid_orders_are_rejected_one_by_one(memory_db, statement_log, fake_redis):
+    menu_cache.clear_local()
+    batch = OrderBatch(orders=[
+        basket("kiosk-1"),
+        basket("kiosk-2", items=[{"item_id": "burger", "quantity": 0}]),
+        basket("kiosk-3", items=[]),
+        basket("kiosk-4", items=[{"item_id": "soup", "quantity": 1}]),
+        basket("kiosk-1"),
+        basket("kiosk-5"),
+    ])
+
+    async def run():
+        async with memory_db() as Session:
+            async with Session() as db:
+                db.add(MenuItem(id="burger", name="Burger", price=12.5, category="mains", prep_time=12))
+                await db.commit()
+            async with Session() as db:
+                await menu_cache.invalidate()
+                statements = statement_log(Session)
+                results = await create_orders_batch(batch, db)
+            executed = list(statements)
+            async with Session() as db:
+                orders = dict((await db.execute(select(Order.id, Order.total_amount))).all())
+                lines = await db.scalar(select(func.count()).select_from(OrderItem))
+        return results, executed, orders, lines
+
+    results, statements, orders, lines = asyncio.run(run())
+
+    assert [(r.order_id, r.status) for r in results] == [
+        ("kiosk-1", "created"), ("kiosk-2", "rejected"), ("kiosk-3", "rejected"),
+        ("kiosk-4", "rejected"), ("kiosk-1", "duplicate"), ("kiosk-5", "created"),
+    ]
+    assert "greater than or equal to 1" in results[1].error
+    assert results[2].error.startswith("items:")
+    assert "soup" in results[3].error
+    assert orders == {"kiosk-1": 2500, "kiosk-5": 2500}
+    assert lines == 2
+    # One multi-row INSERT for the orders and one for their lines
+    inserts = [s for s in statements if s.lstrip().upper().startswith("INSERT")]
+    assert len(inserts) == 2
+    assert fake_redis.lrange(PRINT_QUEUE, 0, -1) == [b"kiosk-5", b"kiosk-1"]
+
+def test_replayed_batch_reports_duplicates_and_queues_nothing(memory_db, fake_redis):
+    menu_cache.clear_local()
+    batch = OrderBatch(orders=[basket("kiosk-1"), basket("kiosk-2")])
+
+    async def run():
+        async with memory_db() as Session:
+            async with Session() as db:
+                db.add(MenuItem(id="burger", name="Burger", price=12.5, category="mains", prep_time=12))
+                await db.commit()
+            await menu_cache.invalidate()
+            async with Session() as db:
+                first = await create_orders_batch(batch, db)
+            async with Session() as db:
+                replay = await create_orders_batch(batch, db)
+        return first, replay
+
+    first, replay = asyncio.run(run())
+    assert [r.status for r in first] == ["created", "created"]
+    assert [r.status for r in replay] == ["duplicate", "duplicate"]
+    assert fake_redis.llen(PRINT_QUEUE) == 2
+
+def test_large_batch_is_one_insert_per_table_and_one_print_push(memory_db, statement_log, fake_redis, monkeypatch):
+    menu_cache.clear_local()
+    batch = OrderBatch(orders=[basket(f"kiosk-{i}") for i in range(200)])
+    pushes = []
+    lpush = routes.orders.async_redis_client.lpush
+
+    async def counted_lpush(key, *values):
+        pushes.append((key, len(values)))
+        return await lpush(key, *values)
+
+    monkeypatch.setattr(routes.orders.async_redis_client, "lpush", counted_lpush)
+
+    async def run():
+        async with memory_db() as Session:
+            async with Session() as db:
+                db.add(MenuItem(id="burger", name="Burger", price=12.5, category="mains", prep_time=12))
+                await db.commit()
+            await menu_cache.invalidate()
+            async with Session() as db:
+                statements = statement_log(Session)
+                results = await create_orders_batch(batch, db)
+        return results, list(statements)
+
+    results, statements = asyncio.run(run())
+    assert {r.status for r in results} == {"created"}
+    inserts = [s for s in statements if s.lstrip().upper().startswith("INSERT")]
+    assert len(inserts) == 2 and "ON CONFLICT" in inserts[0].upper()
+    assert pushes == [(PRINT_QUEUE, 200)]
+    assert fake_redis.llen(PRINT_QUEUE) == 200
@@ -0,0 +1,111 @@
+import asyncio
+from datetime import datetime
+from functools import partial
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+
+import routes.payments as payments
+from models.order import Order
+from services.payconiq import payment_status
+
+class MemoryRedis:
+    """The few string commands the callback path uses"""
+    def __init__(self):
+        self.data = {}
+        self.calls = 0
+
+    async def set(self, key, value, ex=None, nx=False, get=False):
+        self.calls += 1
+        previous = self.data.get(key)
+        if not (nx and previous is not None):
+            self.data[key] = str(value).encode()
+        return previous if get else True
+
+    async def get(self, key):
+        self.calls += 1
+        return self.data.get(key)
+
+    async def delete(self, *keys):
+        self.calls += 1
+        for key in keys:
+            self.data.pop(key, None)
+
+class FakePayconiq:
+    def __init__(self, status):
+        self.status = status
+        self.calls = 0
+
+    async def get_payment(self, payment_id):
+        self.calls += 1
+        return {"paymentId": payment_id, "status": self.status}
+
+@pytest.fixture
+def callback(monkeypatch):
+    redis = MemoryRedis()
+
+    def setup(status):
+        api = FakePayconiq(status)
+        monkeypatch.setattr(payments, "payment_status", partial(payment_status, client=api, redis=redis))
+        monkeypatch.setattr(payments, "claim_callback", partial(payments.claim_callback, redis=redis))
+        monkeypatch.setattr(payments, "finish_callback", partial(payments.finish_callback, redis=redis))
+        return api, redis
+    return setup
+
+@pytest.fixture
+def deliver(memory_db, statement_log):
+    async def run(payment_ids):
+        """Seed one pending order paid with pay-1, deliver callbacks and return (results, statements, order status)"""
+        async with memory_db() as Session:
+            async with Session() as db:
+                db.add(Order(id="order-1", payment_method="payconiq", payment_status="pending",
+                             payment_reference="pay-1", status="received", created_at=datetime.now(), items=[]))
+                await db.commit()
+
+            statements = statement_log(Session)
+            results = []
+            for payment_id in payment_ids:
+                async with Session() as db:
+                    try:
+                        results.append(await payments.payment_callback(payment_id, db))
+                    except HTTPException as e:
+                        results.append(e.status_code)
+            executed = list(statements)
+            async with Session() as db:
+                status = await db.scalar(select(Order.payment_status).where(Order.id == "order-1"))
+        return results, executed, status
+    return run
+
+def test_duplicate_callbacks_cost_one_redis_hit(callback, deliver):
+    api, redis = callback("SUCCEEDED")
+    results, statements, status = asyncio.run(deliver(["pay-1"]))
+    assert results == [{"status": "success"}]
+    assert status == "completed"
+    assert api.calls == 1
+    assert sum(statement.lstrip().upper().startswith("UPDATE") for statement in statements) == 1
+
+    redis.calls = 0
+    results, statements, _ = asyncio.run(deliver(["pay-1", "pay-1"]))
+    assert results == [{"status": "success"}] * 2
+    assert api.calls == 1 and statements == [] and redis.calls == 2
+
+def test_unverified_callback_releases_its_claim(callback, deliver):
+    api, redis = callback("PENDING")
+    results, _, status = asyncio.run(deliver(["pay-1"]))
+    assert results == [400]
+    assert status == "pending"
+    assert payments.callback_key("pay-1") not in redis.data
+
+    # Payconiq retries once the payment went through
+    api.status = "SUCCEEDED"
+    redis.data.clear()  # let the cached PENDING status expire
+    results, _, status = asyncio.run(deliver(["pay-1"]))
+    assert results == [{"status": "success"}]
+    assert status == "completed"
+
+def test_unknown_payment_is_not_found(callback, deliver):
+    callback("SUCCEEDED")
+    results, _, status = asyncio.run(deliver(["pay-2"]))
+    assert results == [404]
+    assert status == "pending"
@@ -0,0 +1,64 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from models.menu import MenuItem
+from models.order import Order
+from models.order_item import OrderItem
+from models.reservation import Reservation, ReservationStatus
+from routes.reservations import get_today_reservations_for_kds
+
+MENU = [
+    MenuItem(id="burger", name="Burger", price=12.5, category="mains", prep_time=12),
+    MenuItem(id="fries", name="Fries", price=4.0, category="sides", prep_time=5),
+    MenuItem(id="cola", name="Cola", price=3.0, category="drinks", prep_time=1),
+]
+
+@pytest.fixture
+def kds_view(memory_db, statement_log):
+    async def run(reservation_count: int):
+        """Seed reservation_count reservations for today and return (view, statements run)"""
+        now = datetime.now()
+        today = datetime(now.year, now.month, now.day)
+        async with memory_db() as Session:
+            async with Session() as db:
+                db.add_all([MenuItem(**{c.name: getattr(item, c.name) for c in MenuItem.__table__.columns})
+                            for item in MENU])
+                for i in range(reservation_count):
+                    order_id, reservation_id = f"order-{i}", f"res-{i}"
+                    db.add(Order(id=order_id, reservation_id=reservation_id, payment_method="cash",
+                                 status="received", created_at=now, items=[]))
+                    db.add(Reservation(id=reservation_id, order_id=order_id, phone="+32000000",
+                                       pickup_time=today + timedelta(minutes=30 + i % 600),
+                                       status=ReservationStatus.CONFIRMED, created_at=now, source="website"))
+                    await db.flush()
+                    db.add_all([
+                        OrderItem(order_id=order_id, menu_item_id="burger", quantity=1 + i % 2),
+                        OrderItem(order_id=order_id, menu_item_id="fries", quantity=1),
+                        OrderItem(order_id=order_id, menu_item_id="cola", quantity=2),
+                    ])
+                await db.commit()
+
+            statements = statement_log(Session)
+            async with Session() as db:
+                view = await get_today_reservations_for_kds(db)
+        return view, statements
+    return run
+
+@pytest.mark.parametrize("reservation_count", [1, 10, 200])
+def test_kds_view_query_count_is_constant(kds_view, reservation_count):
+    view, statements = asyncio.run(kds_view(reservation_count))
+
+    assert len(view) == reservation_count
+    # Reservations, their orders, and the lines of those orders
+    assert len(statements) == 3
+
+def test_kds_view_lines_and_ready_time(kds_view):
+    view, _ = asyncio.run(kds_view(2))
+
+    first = view[0]
+    assert [(item.name, item.quantity) for item in first["menu_items"]] == [("Burger", 1), ("Fries", 1), ("Cola", 2)]
+    # Longest prep time in the basket is the burger's 12 minutes
+    assert first["estimated_ready_time"] == first["pickup_time"] - timedelta(minutes=12)
+    assert first["order_details"] == {"status": "received"}
@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+from models.menu import MenuItem
+from routes.slots import BasketItem, prep_times
+from services.menu_cache import menu_cache
+
+def test_basket_quantity_must_be_positive():
+    with pytest.raises(ValidationError):
+        BasketItem(item_id="burger", quantity=0)
+
+def test_prep_times_come_from_the_available_menu(memory_db, fake_redis, statement_log):
+    menu_cache.clear_local()
+
+    async def run():
+        async with memory_db() as Session:
+            async with Session() as db:
+                db.add_all([
+                    MenuItem(id="burger", name="Burger", price=12.5, category="mains", prep_time=12),
+                    MenuItem(id="soup", name="Soup", price=6, category="starters", prep_time=5, is_available=False),
+                ])
+                await db.commit()
+            await menu_cache.invalidate()
+            async with Session() as db:
+                times = await prep_times(db, ["burger"])
+                statements = statement_log(Session)
+                cached = await prep_times(db, ["burger"])
+                with pytest.raises(HTTPException) as unavailable:
+                    await prep_times(db, ["burger", "soup"])
+        return times, cached, list(statements), unavailable.value
+
+    times, cached, statements, unavailable = asyncio.run(run())
+    assert times == cached == {"burger": 12}
+    assert statements == []
+    assert unavailable.status_code == 400
+    assert unavailable.detail == "Unknown or unavailable menu items: soup"
@@ -0,0 +1,94 @@
+from datetime import datetime
+
+import pytest
+
+import services.email as email
+import services.reliable_queue as reliable_queue
+from models.order import Order
+from services.email import EMAIL_MAX_RETRIES, EmailOutboxWorker
+from services.reliable_queue import restart_on_crash
+
+class FakeSmtp:
+    """Records sent messages; fails for the addresses in fail"""
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.sent = []
+
+    def send(self, msg):
+        if msg["To"] in self.fail:
+            raise ConnectionError("mailbox unavailable")
+        self.sent.append(msg["To"])
+
+@pytest.fixture
+def outbox(sync_db, fake_redis, monkeypatch):
+    monkeypatch.setattr(email, "SessionLocal", sync_db)
+    with sync_db() as db:
+        db.add_all([
+            Order(id="o1", payment_method="cash", customer_email="a@example.com", created_at=datetime.now(), items=[]),
+            Order(id="o2", payment_method="cash", customer_email="b@example.com", created_at=datetime.now(), items=[]),
+            Order(id="o3", payment_method="cash", created_at=datetime.now(), items=[]),
+        ])
+        db.commit()
+    smtp = FakeSmtp(fail={"b@example.com"})
+    worker = EmailOutboxWorker(redis=fake_redis, session=smtp, batch_size=10)
+    for job in ("o1:ready", "o2:ready", "o3:ready"):
+        fake_redis.lpush(worker.queue, job)
+    return worker, smtp
+
+def claim_all(worker):
+    job = worker.claim_job(timeout=0.01)
+    return [job] + worker.claim_ready_jobs(worker.batch_size - 1) if job else []
+
+def test_sent_emails_are_acked_and_failures_retried(outbox, sync_db):
+    worker, smtp = outbox
+    worker.run_batch(claim_all(worker))
+
+    assert smtp.sent == ["a@example.com"]
+    with sync_db() as db:
+        assert {o.id: o.email_sent for o in db.query(Order)} == {"o1": True, "o2": False, "o3": False}
+    redis = worker.redis
+    assert redis.lrange(worker.processing_key, 0, -1) == []
+    assert redis.hgetall(worker.claims_key) == {}
+    assert redis.zrange(worker.retry_key, 0, -1) == [b"o2:ready"]
+    assert redis.hget(worker.attempts_key, "o2:ready") == b"1"
+
+def test_failing_email_is_dead_lettered_after_max_retries(outbox):
+    worker, smtp = outbox
+    worker.retry_delay = 0
+    for _ in range(EMAIL_MAX_RETRIES):
+        worker.promote_due_retries()
+        worker.run_batch(claim_all(worker))
+
+    assert worker.redis.lrange(worker.dead_key, 0, -1) == [b"o2:ready"]
+    assert worker.redis.zcard(worker.retry_key) == 0
+    assert worker.redis.hget(worker.attempts_key, "o2:ready") is None
+    assert smtp.sent == ["a@example.com"]
+
+def test_crashing_batch_puts_its_jobs_back(outbox, monkeypatch):
+    worker, smtp = outbox
+
+    def database_down():
+        raise ConnectionError("database is down")
+    monkeypatch.setattr(email, "SessionLocal", database_down)
+    worker.run_batch(claim_all(worker))
+
+    assert smtp.sent == []
+    assert worker.redis.llen(worker.processing_key) == 0
+    assert sorted(worker.redis.zrange(worker.retry_key, 0, -1)) == [b"o1:ready", b"o2:ready", b"o3:ready"]
+
+class Stop(BaseException):
+    pass
+
+def test_crashed_worker_loop_restarts_with_backoff(monkeypatch):
+    sleeps, runs = [], []
+    monkeypatch.setattr(reliable_queue.time, "sleep", sleeps.append)
+
+    def loop():
+        runs.append(1)
+        if len(runs) > 4:
+            raise Stop()
+        raise ConnectionError("redis is down")
+
+    with pytest.raises(Stop):
+        restart_on_crash("test", loop)
+    assert sleeps == [1, 2, 4, 8]
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+from services.firing_schedule import FiringSchedule
+
+STATIONS = {
+    "grill": {"categories": ["mains"]},
+    "fryer": {"categories": ["sides"]},
+    "bar": {"categories": ["drinks"]},
+    "pickup": {"all_items": True},
+}
+NOON = datetime(2026, 3, 14, 12, 0)
+
+def line(item_id, category, prep_time, quantity=1):
+    return {"item_id": item_id, "name": item_id.title(), "category": category,
+            "quantity": quantity, "prep_time": prep_time}
+
+BASKET = [line("burger", "mains", 12), line("fries", "sides", 5, 2), line("cola", "drinks", 1)]
+
+def test_lines_fire_so_the_order_finishes_together():
+    schedule = FiringSchedule(STATIONS)
+    schedule.upsert("o1", BASKET, time_slot=NOON, created_at=None)
+
+    fire_times = {(entry.station, entry.item_id): entry.fire_at for entry in schedule.upcoming()}
+    # The pickup station gets every line on its ticket but cooks nothing
+    assert fire_times == {
+        ("grill", "burger"): NOON - timedelta(minutes=12),
+        ("fryer", "fries"): NOON - timedelta(minutes=5),
+        ("bar", "cola"): NOON - timedelta(minutes=1),
+    }
+
+def test_asap_orders_are_ready_after_their_longest_dish():
+    schedule = FiringSchedule(STATIONS)
+    schedule.upsert("o1", BASKET, time_slot=None, created_at=NOON)
+
+    assert {entry.ready_at for entry in schedule.upcoming()} == {NOON + timedelta(minutes=12)}
+    assert schedule.upcoming()[0].fire_at == NOON
+
+def test_only_the_changed_order_moves():
+    schedule = FiringSchedule(STATIONS)
+    schedule.upsert("early", BASKET, time_slot=NOON, created_at=None)
+    schedule.upsert("late", BASKET, time_slot=NOON + timedelta(hours=1), created_at=None)
+    before = schedule.entries_for("late")
+
+    schedule.upsert("early", BASKET, time_slot=NOON + timedelta(hours=2), created_at=None)
+
+    assert schedule.entries_for("late") == before
+    assert [entry.order_id for entry in schedule.upcoming(station="grill")] == ["late", "early"]
+
+def test_removed_orders_leave_the_schedule_and_the_heap_is_compacted():
+    schedule = FiringSchedule(STATIONS)
+    for i in range(200):
+        schedule.upsert(f"o{i}", BASKET, time_slot=NOON + timedelta(minutes=i), created_at=None)
+    for i in range(150):
+        schedule.remove(f"o{i}")
+
+    assert "o10" not in schedule
+    assert len(schedule) == 50 * 3
+    assert schedule._heap_size() < 200 * 3
+    assert schedule.upcoming(limit=1)[0].order_id == "o150"
+
+def test_upcoming_merges_the_station_heaps_in_fire_order():
+    schedule = FiringSchedule(STATIONS)
+    for i in range(20):
+        schedule.upsert(f"o{i}", BASKET, time_slot=NOON + timedelta(minutes=7 * (i % 5) + i), created_at=None)
+    schedule.remove("o0")
+
+    everything = schedule.upcoming()
+    assert [entry.fire_at for entry in everything] == sorted(entry.fire_at for entry in everything)
+    assert len(everything) == 19 * 3
+    assert schedule.upcoming(limit=4) == everything[:4]
+    assert schedule.upcoming(station="bar", limit=3) == [e for e in everything if e.station == "bar"][:3]
@@ -0,0 +1,69 @@
+import asyncio
+
+from services.menu_cache import MENU_CACHE_KEY, MenuCache
+
+class FakeRedis:
+    """Just enough of Redis for the menu cache, with STORE_SCRIPT emulated in evalsha"""
+    def __init__(self):
+        self.values = {}
+        self.hashes = {}
+
+    def pipeline(self, *args, **kwargs):
+        return FakePipeline(self)
+
+    async def evalsha(self, sha, numkeys, generation_key, cache_key, expected, key, body, ttl):
+        if str(self.values.get(generation_key, 0)) != str(expected):
+            return 0
+        self.hashes.setdefault(cache_key, {})[key] = body
+        return 1
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args: self.commands.append((name, args))
+
+    async def execute(self):
+        results = []
+        for name, args in self.commands:
+            if name == "hget":
+                results.append(self.redis.hashes.get(args[0], {}).get(args[1]))
+            elif name == "get":
+                results.append(self.redis.values.get(args[0]))
+            elif name == "incr":
+                self.redis.values[args[0]] = self.redis.values.get(args[0], 0) + 1
+                results.append(self.redis.values[args[0]])
+            elif name == "delete":
+                results.append(int(self.redis.hashes.pop(args[0], None) is not None))
+            else:
+                results.append(None)
+        return results
+
+def test_load_that_raced_an_invalidation_is_not_stored():
+    redis = FakeRedis()
+    reader, writer = MenuCache(redis=redis), MenuCache(redis=redis)
+
+    async def run():
+        async def stale_load():
+            # Another worker changes the menu while this one reads the old rows
+            await writer.invalidate()
+            return b"old"
+
+        served = await reader.get_or_load("list:", stale_load)
+        after_race = dict(redis.hashes.get(MENU_CACHE_KEY, {}))
+        fresh = await reader.get_or_load("list:", lambda: asyncio.sleep(0, b"new"))
+        return served, after_race, fresh
+
+    served, after_race, fresh = asyncio.run(run())
+    assert served.body == b"old"
+    assert after_race == {}
+    assert fresh.body == b"new"
+    assert redis.hashes[MENU_CACHE_KEY] == {"list:": b"new"}
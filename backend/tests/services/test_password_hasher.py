@@ -0,0 +1,56 @@
+import asyncio
+import threading
+
+import pytest
+
+from services.password_hasher import HasherBusy, PasswordHasher, make_context
+
+def test_hash_and_verify_off_the_loop():
+    async def run():
+        hasher = PasswordHasher(make_context(4), workers=2)
+        hashed = await hasher.hash("secret")
+        # Stored hashes come back from the binary column as bytes
+        results = await asyncio.gather(hasher.verify("secret", hashed.encode()), hasher.verify("wrong", hashed))
+        hasher.shutdown()
+        return results, hasher.metrics()
+
+    results, metrics = asyncio.run(run())
+    assert results == [True, False]
+    assert metrics["completed"] == 3
+    assert metrics["in_flight"] == 0 and metrics["waiting"] == 0
+
+def test_login_upgrades_hash_when_cost_changes():
+    async def run():
+        old = await PasswordHasher(make_context(4)).hash("secret")
+        hasher = PasswordHasher(make_context(5))
+        valid, new_hash = await hasher.verify_and_update("secret", old)
+        unchanged = await hasher.verify_and_update("secret", new_hash)
+        return valid, new_hash, unchanged, hasher.rehashed
+
+    valid, new_hash, unchanged, rehashed = asyncio.run(run())
+    assert valid
+    assert new_hash.startswith("$2b$05$")
+    assert unchanged == (True, None)
+    assert rehashed == 1
+
+def test_callers_beyond_the_queue_limit_are_rejected():
+    release = threading.Event()
+
+    async def run():
+        hasher = PasswordHasher(make_context(4), workers=1, max_waiting=1)
+        hasher.context = type("Blocking", (), {"hash": staticmethod(lambda password: release.wait(5) and "h")})()
+        running = asyncio.ensure_future(hasher.hash("a"))
+        queued = asyncio.ensure_future(hasher.hash("b"))
+        await asyncio.sleep(0.05)
+        assert hasher.metrics()["in_flight"] == 1 and hasher.metrics()["waiting"] == 1
+        with pytest.raises(HasherBusy):
+            await hasher.hash("c")
+        release.set()
+        await asyncio.gather(running, queued)
+        hasher.shutdown()
+        return hasher.metrics()
+
+    metrics = asyncio.run(run())
+    assert metrics["rejected"] == 1
+    assert metrics["completed"] == 2
+    assert metrics["peak_waiting"] == 1
@@ -0,0 +1,112 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import services.payconiq as payconiq
+from services.payconiq import CircuitBreaker, CircuitOpen, PayconiqClient, PayconiqError
+
+class StubPayconiq(BaseHTTPRequestHandler):
+    """Answers with the next scripted (status, delay) and records every request"""
+    protocol_version = "HTTP/1.1"  # keep-alive
+    script = []
+    requests = []
+    connections = set()
+
+    def do_GET(self):
+        self._answer()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._answer()
+
+    def _answer(self):
+        type(self).requests.append((self.command, self.path))
+        type(self).connections.add(self.client_address)
+        status, delay = type(self).script.pop(0) if type(self).script else (200, 0)
+        time.sleep(delay)
+        body = json.dumps({"paymentId": "p1", "status": "SUCCEEDED"}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def stub(monkeypatch):
+    monkeypatch.setattr(payconiq, "RETRY_BASE_DELAY", 0.001)
+    StubPayconiq.script, StubPayconiq.requests, StubPayconiq.connections = [], [], set()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubPayconiq)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/v3/payments"
+    server.shutdown()
+    server.server_close()
+
+def test_reuses_one_connection(stub):
+    async def run():
+        client = PayconiqClient(stub, api_key="key")
+        results = [await client.get_payment(f"p{i}") for i in range(5)]
+        await client.aclose()
+        return results
+
+    results = asyncio.run(run())
+    assert all(result["status"] == "SUCCEEDED" for result in results)
+    assert len(StubPayconiq.requests) == 5
+    assert len(StubPayconiq.connections) == 1
+
+def test_reads_are_retried_on_errors_and_timeouts(stub):
+    StubPayconiq.script = [(503, 0), (200, 0.5), (200, 0)]
+
+    async def run():
+        client = PayconiqClient(stub, api_key="key", timeout=0.2, max_retries=2)
+        result = await client.get_payment("p1")
+        await client.aclose()
+        return result, client.breaker.failures
+
+    result, failures = asyncio.run(run())
+    assert result["paymentId"] == "p1"
+    assert len(StubPayconiq.requests) == 3
+    assert failures == 0
+
+def test_payment_creation_is_not_resent_after_reaching_the_server(stub):
+    StubPayconiq.script = [(500, 0)]
+
+    async def run():
+        client = PayconiqClient(stub, api_key="key", max_retries=2)
+        try:
+            with pytest.raises(PayconiqError) as error:
+                await client.create_payment(1250, "order-1", "http://localhost/payments/callback")
+            return error.value.status_code
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(run()) == 500
+    assert StubPayconiq.requests == [("POST", "/v3/payments")]
+
+def test_circuit_opens_and_recovers(stub):
+    StubPayconiq.script = [(503, 0)] * 2
+
+    async def run():
+        client = PayconiqClient(stub, api_key="key", max_retries=0,
+                                breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.1))
+        for _ in range(2):
+            with pytest.raises(PayconiqError):
+                await client.get_payment("p1")
+        with pytest.raises(CircuitOpen):
+            await client.get_payment("p1")
+        refused_at = len(StubPayconiq.requests)
+        await asyncio.sleep(0.15)
+        result = await client.get_payment("p1")
+        await client.aclose()
+        return refused_at, result, client.breaker.state
+
+    refused_at, result, state = asyncio.run(run())
+    assert refused_at == 2
+    assert result["status"] == "SUCCEEDED"
+    assert state == "closed"
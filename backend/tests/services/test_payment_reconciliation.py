@@ -0,0 +1,80 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from models.order import Order
+from services.payconiq import CircuitOpen, PayconiqError
+from services.payment_reconciliation import PaymentReconciler
+
+NOW = datetime(2026, 3, 14, 23, 0)
+
+class FakePayconiq:
+    """Payment statuses by reference; tracks how many lookups run at once"""
+    def __init__(self, statuses, fail=(), open_after=None):
+        self.statuses = statuses
+        self.fail = set(fail)
+        self.open_after = open_after
+        self.calls = []
+        self.running = self.peak = 0
+
+    async def get_payment(self, payment_id):
+        if self.open_after is not None and len(self.calls) >= self.open_after:
+            raise CircuitOpen("open")
+        self.calls.append(payment_id)
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        await asyncio.sleep(0.001)
+        self.running -= 1
+        if payment_id in self.fail:
+            raise PayconiqError("boom", 500)
+        return {"paymentId": payment_id, "status": self.statuses.get(payment_id, "PENDING")}
+
+@pytest.fixture
+def reconcile(memory_db):
+    async def run(api, orders, **kwargs):
+        """Seed (reference, payment_status, age in minutes) orders, run once and return (report, statuses)"""
+        async with memory_db() as Session:
+            async with Session() as db:
+                db.add_all([
+                    Order(id=f"order-{reference}", payment_method="payconiq", payment_status=status,
+                          payment_reference=reference, status="received", items=[],
+                          created_at=NOW - timedelta(minutes=age))
+                    for reference, status, age in orders
+                ])
+                await db.commit()
+            report = await PaymentReconciler(Session, api, **kwargs).run(now=NOW)
+            async with Session() as db:
+                statuses = dict((await db.execute(select(Order.payment_reference, Order.payment_status))).all())
+        return report, statuses
+    return run
+
+def test_settles_stale_pending_orders_in_pages(reconcile):
+    orders = [(f"pay-{i:03}", "pending", 60) for i in range(25)]
+    orders += [("pay-new", "pending", 5), ("pay-paid", "completed", 60)]
+    statuses = {f"pay-{i:03}": "SUCCEEDED" for i in range(0, 25, 2)}
+    statuses.update({"pay-001": "EXPIRED", "pay-003": "CANCELLED", "pay-new": "SUCCEEDED"})
+    api = FakePayconiq(statuses, fail={"pay-005"})
+
+    report, result = asyncio.run(reconcile(api, orders, page_size=10, concurrency=3))
+
+    assert report.checked == 25
+    assert report.reconciled == {"completed": 13, "expired": 1, "cancelled": 1}
+    assert report.errors == 1 and report.still_pending == 9
+    assert api.peak <= 3
+    # Too young to reconcile, and already paid: never looked up
+    assert "pay-new" not in api.calls and "pay-paid" not in api.calls
+    assert result["pay-new"] == "pending"
+    assert result["pay-002"] == "completed" and result["pay-001"] == "expired" and result["pay-005"] == "pending"
+
+def test_stops_when_the_circuit_opens(reconcile):
+    orders = [(f"pay-{i:03}", "pending", 60) for i in range(30)]
+    api = FakePayconiq({f"pay-{i:03}": "SUCCEEDED" for i in range(30)}, open_after=4)
+
+    report, result = asyncio.run(reconcile(api, orders, page_size=10, concurrency=1))
+
+    assert report.aborted
+    assert report.reconciled == {"completed": 4}
+    assert report.checked == 10
+    assert sum(status == "completed" for status in result.values()) == 4
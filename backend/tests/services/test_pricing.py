@@ -0,0 +1,52 @@
+import asyncio
+
+from models.menu import MenuItem
+from services.menu_cache import MenuCache
+from services.pricing import MenuPrice, format_amount, menu_snapshot, price_order, price_orders, to_cents
+
+SNAPSHOT = {"burger": MenuPrice(1250, 12), "fries": MenuPrice(435, 5), "cola": MenuPrice(300, 1)}
+
+def test_prices_are_exact_cents():
+    assert to_cents(4.35) == 435
+    assert to_cents(0.1 + 0.2) == 30
+    assert format_amount(1705) == "EUR 17.05"
+
+def test_lines_and_totals_come_from_the_snapshot():
+    priced = price_order([
+        {"item_id": "burger", "quantity": 2, "special_requests": "no onions"},
+        {"item_id": "fries", "quantity": 3, "unit_price": 1},  # client-sent prices are overwritten
+    ], SNAPSHOT)
+    assert priced.total_amount == 2 * 1250 + 3 * 435
+    assert priced.items[0] == {"item_id": "burger", "quantity": 2, "special_requests": "no onions",
+                               "unit_price": 1250, "line_total": 2500}
+    assert priced.items[1]["unit_price"] == 435 and priced.items[1]["line_total"] == 1305
+
+def test_batch_pricing_keeps_order():
+    totals = [p.total_amount for p in price_orders([
+        [{"item_id": "cola", "quantity": 1}],
+        [],
+        [{"item_id": "burger", "quantity": 1}, {"item_id": "cola", "quantity": 2}],
+    ], SNAPSHOT)]
+    assert totals == [300, 0, 1850]
+
+def test_snapshot_is_loaded_once_and_skips_unavailable_items(memory_db, statement_log, down_redis):
+    async def run():
+        async with memory_db() as Session:
+            async with Session() as db:
+                db.add_all([
+                    MenuItem(id="burger", name="Burger", price=12.5, category="mains", prep_time=12),
+                    MenuItem(id="soup", name="Soup", price=6.0, category="starters", prep_time=4, is_available=False),
+                ])
+                await db.commit()
+
+            statements = statement_log(Session)
+            cache = MenuCache(redis=down_redis)
+            async with Session() as db:
+                first = await menu_snapshot(db, cache)
+                second = await menu_snapshot(db, cache)
+        return first, second, statements
+
+    first, second, statements = asyncio.run(run())
+    assert first == {"burger": MenuPrice(1250, 12)}
+    assert second is first
+    assert len(statements) == 1
@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+from routes.auth import create_access_token, decode_token, is_revoked
+from services.principal_cache import Principal, PrincipalCache
+
+def test_local_layer_skips_the_loader_until_invalidated(down_redis):
+    loads = []
+
+    async def load(user_id):
+        loads.append(user_id)
+        return Principal(id=user_id, email=f"{user_id}@example.com", phone="+32 1")
+
+    async def run():
+        cache = PrincipalCache(redis=down_redis, local_ttl=60)
+        first, _ = await cache.get("c1", load)
+        second, _ = await cache.get("c1", load)
+        await cache.invalidate("c1")
+        third, _ = await cache.get("c1", load)
+        return first, second, third, cache.hits
+
+    first, second, third, hits = asyncio.run(run())
+    assert first == second == third
+    assert loads == ["c1", "c1"]
+    assert hits == {"local": 1, "redis": 0, "database": 2}
+
+def test_local_entries_expire_and_are_bounded(down_redis):
+    async def load(user_id):
+        return Principal(id=user_id, email="a@example.com", phone="+32 1")
+
+    async def run():
+        cache = PrincipalCache(redis=down_redis, local_ttl=60, max_size=2)
+        for user_id in ("c1", "c2", "c3"):
+            await cache.get(user_id, load)
+        bounded = list(cache._local)
+        cache.local_ttl = 0
+        await cache.get("c4", load)
+        time.sleep(0.001)
+        await cache.get("c4", load)
+        return bounded, cache.hits
+
+    bounded, hits = asyncio.run(run())
+    assert bounded == ["c2", "c3"]
+    assert hits["local"] == 0 and hits["database"] == 5
+
+def test_tokens_issued_before_logout_are_revoked():
+    claims = decode_token(create_access_token({"sub": "a@example.com", "uid": "c1"}))
+    assert claims.user_id == "c1" and claims.email == "a@example.com"
+    assert not is_revoked(claims, None)
+    assert is_revoked(claims, time.time())
+    assert not is_revoked(claims, claims.issued_at - 1)
+
+def test_logout_without_redis_reports_it_was_not_recorded(down_redis):
+    async def run():
+        cache = PrincipalCache(redis=down_redis)
+        return await cache.logout("c1", ttl=60)
+
+    assert asyncio.run(run()) is False
@@ -0,0 +1,26 @@
+from datetime import datetime
+
+from models.order import Order
+from services.print_dispatcher import StationWorker, pending_key, station_queue, ticket_key
+
+def test_order_without_a_stored_ticket_is_marked_failed(sync_db, fake_redis):
+    db = sync_db()
+    db.add_all([
+        Order(id="o1", payment_method="cash", print_status="pending", created_at=datetime.now()),
+        Order(id="o2", payment_method="cash", print_status="pending", created_at=datetime.now()),
+    ])
+    db.commit()
+    fake_redis.set(ticket_key("kitchen", "o1"), b"ticket")
+    fake_redis.set(pending_key("o1"), 1)
+
+    worker = StationWorker(db, "kitchen", {"connection_type": "dummy", "categories": ["*"]})
+    assert worker.connection._connect()
+    for order_id in ("o1", "o2"):
+        worker.enqueue(order_id)
+    claimed = [worker.claim_job(timeout=1)] + worker.claim_ready_jobs(1)
+    worker.process_batch(claimed)
+
+    assert dict(db.query(Order.id, Order.print_status)) == {"o1": "completed", "o2": "failed"}
+    assert fake_redis.lrange(f"{station_queue('kitchen')}:dead", 0, -1) == [b"o2"]
+    assert fake_redis.llen(f"{station_queue('kitchen')}:processing") == 0
+    db.close()
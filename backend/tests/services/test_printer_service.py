@@ -1,5 +1,8 @@
 import logging
+import pytest
+from services.print_dispatcher import printer_config
 from services.printer_service import PrinterService
+import socket
 import time
 
 # Configure logging
@@ -38,6 +41,59 @@ def test_printer(connection_type='usb', **kwargs):
         if 'printer' in locals():
             printer.close()
 
+def test_network_probe_does_not_block_on_a_live_printer():
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+    printer = PrinterService('network', host="127.0.0.1", port=server.getsockname()[1], timeout=2)
+    peer, _ = server.accept()
+    try:
+        start = time.monotonic()
+        assert printer.is_alive()
+        assert time.monotonic() - start < 0.5
+        assert printer.printer.device.gettimeout() == 2
+
+        peer.close()
+        time.sleep(0.05)
+        assert not printer.is_alive()
+    finally:
+        # escpos closes the socket itself when the printer is collected
+        server.close()
+
+def test_dummy_printer_records_kitchen_ticket(tmp_path):
+    output_file = tmp_path / "tickets.bin"
+    printer = PrinterService('dummy', output_file=str(output_file))
+
+    printer.print_kitchen_order({
+        "order_time": "12:15",
+        "ready_time": "12:30",
+        "customer_name": "John Doe",
+        "customer_contact": "+32 123 456 789",
+        "items": ["2x Burger with fries", "1x Coca-Cola"]
+    })
+
+    assert printer.printer.writes == 1
+    assert b"KITCHEN ORDER" in printer.printer.output
+    assert b"- 2x Burger with fries\n" in printer.printer.output
+    assert output_file.read_bytes() == printer.printer.output
+
+
+def test_dummy_printer_simulates_failures():
+    printer = PrinterService('dummy', failure_rate=1.0)
+
+    with pytest.raises(IOError):
+        printer.write_raw(b"ticket")
+
+    assert printer.printer.failures == 1
+    assert printer.printer.output == b""
+
+def test_front_of_house_printer_has_its_own_settings(monkeypatch):
+    monkeypatch.setenv("PRINTER_HOST", "10.0.0.10")
+    monkeypatch.setenv("FOH_PRINTER_HOST", "10.0.0.30")
+
+    assert printer_config("PRINTER")["network"]["host"] == "10.0.0.10"
+    assert printer_config("FOH_PRINTER")["network"]["host"] == "10.0.0.30"
+
 if __name__ == "__main__":
     # Example configurations - modify these for your printer
     # Try all possible endpoint combinations
@@ -81,4 +137,4 @@ if __name__ == "__main__":
         except Exception as e:
             print(f"Network connection failed: {e}")
             print("Trying Bluetooth connection...")
-            test_printer('bluetooth', **bluetooth_config)
\ No newline at end of file
+            test_printer('bluetooth', **bluetooth_config)
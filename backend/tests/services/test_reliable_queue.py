@@ -0,0 +1,93 @@
+import pytest
+
+from services import reliable_queue
+from services.reliable_queue import VISIBILITY_TIMEOUT, ReliableQueue
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(reliable_queue.time, "time", clock)
+    return clock
+
+@pytest.fixture
+def queue(fake_redis, clock):
+    return ReliableQueue("jobs", redis=fake_redis, retry_delay=30)
+
+def state(redis, queue):
+    return {
+        "ready": [job.decode() for job in redis.lrange(queue.queue, 0, -1)],
+        "processing": [job.decode() for job in redis.lrange(queue.processing_key, 0, -1)],
+        "claims": sorted(job.decode() for job in redis.hkeys(queue.claims_key)),
+        "retry": [job.decode() for job in redis.zrange(queue.retry_key, 0, -1)],
+        "dead": [job.decode() for job in redis.lrange(queue.dead_key, 0, -1)],
+    }
+
+def test_claim_and_ack(queue, fake_redis):
+    for job in ("a", "b", "c"):
+        queue.enqueue(job)
+
+    claimed = [queue.claim_job(timeout=1)] + queue.claim_ready_jobs(5)
+    assert claimed == ["a", "b", "c"]
+    assert state(fake_redis, queue)["claims"] == ["a", "b", "c"]
+
+    queue.ack("b")
+    assert state(fake_redis, queue) == {
+        "ready": [], "processing": ["c", "a"], "claims": ["a", "c"], "retry": [], "dead": [],
+    }
+
+def test_failed_job_is_retried_when_due(queue, fake_redis, clock):
+    queue.enqueue("a")
+    queue.claim_job(timeout=1)
+
+    assert queue.fail_claimed("a", max_attempts=3) == 1
+    assert state(fake_redis, queue)["retry"] == ["a"]
+    assert queue.promote_due_retries() == 0
+
+    clock.now += 31
+    assert queue.promote_due_retries() == 1
+    assert state(fake_redis, queue) == {"ready": ["a"], "processing": [], "claims": [], "retry": [], "dead": []}
+
+def test_job_is_dead_lettered_after_max_attempts(queue, fake_redis, clock):
+    queue.enqueue("a")
+    for _ in range(2):
+        assert queue.claim_job(timeout=1) == "a"
+        assert queue.fail_claimed("a", max_attempts=3) == 1
+        clock.now += 31
+        queue.promote_due_retries()
+
+    assert queue.claim_job(timeout=1) == "a"
+    assert queue.fail_claimed("a", max_attempts=3) == 2
+    assert state(fake_redis, queue) == {"ready": [], "processing": [], "claims": [], "retry": [], "dead": ["a"]}
+    assert fake_redis.hget(queue.attempts_key, "a") is None
+
+def test_fail_claimed_leaves_acked_jobs_alone(queue, fake_redis):
+    queue.enqueue("a")
+    queue.claim_job(timeout=1)
+    queue.ack("a")
+
+    assert queue.fail_claimed("a", max_attempts=3) == 0
+    assert state(fake_redis, queue) == {"ready": [], "processing": [], "claims": [], "retry": [], "dead": []}
+
+def test_expired_claims_go_back_to_the_head_of_the_queue(queue, fake_redis, clock):
+    for job in ("a", "b"):
+        queue.enqueue(job)
+    queue.claim_job(timeout=1)
+    # A worker that died between BLMOVE and recording its claim
+    fake_redis.lmove(queue.queue, queue.processing_key, "RIGHT", "LEFT")
+    queue.enqueue("c")
+
+    assert queue.requeue_expired_claims() == 0
+    assert state(fake_redis, queue)["claims"] == ["a", "b"]
+
+    clock.now += VISIBILITY_TIMEOUT + 1
+    assert queue.requeue_expired_claims() == 2
+    # Requeued jobs are claimed before the ones that were waiting
+    claimed = [queue.claim_job(timeout=1) for _ in range(3)]
+    assert sorted(claimed[:2]) == ["a", "b"] and claimed[2] == "c"
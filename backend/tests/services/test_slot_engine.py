@@ -0,0 +1,38 @@
+from datetime import date, datetime
+
+from services.slot_engine import basket_weight, fits, load_key, slot_loads
+
+DAY = date(2026, 3, 14)
+KEY = load_key(DAY)
+
+def test_basket_weight_sums_prep_minutes():
+    prep_times = {"burger": 12, "fries": 5, "cola": 1}
+    assert basket_weight([("burger", 2), ("fries", 1), ("cola", 3)], prep_times) == (32, 12)
+
+def test_load_spreads_over_cooking_window():
+    # Cooked from 12:18 to 12:30, all inside the 12:15 slot
+    assert slot_loads(datetime(2026, 3, 14, 12, 30), 24, 12) == [(KEY, "12:15", 24)]
+    # Cooked from 12:20 to 12:40: half in the 12:15 slot, half in the 12:30 slot
+    assert slot_loads(datetime(2026, 3, 14, 12, 40), 30, 20) == [(KEY, "12:15", 15), (KEY, "12:30", 15)]
+
+def test_load_total_is_exact_after_rounding():
+    loads = slot_loads(datetime(2026, 3, 14, 13, 7), 31, 40)
+    assert sum(minutes for _, _, minutes in loads) == 31
+    assert [field for _, field, _ in loads] == ["12:15", "12:30", "12:45", "13:00"]
+
+def test_fits_checks_every_slot_against_capacity():
+    loads = [(KEY, "12:15", 15), (KEY, "12:30", 15)]
+    assert fits(loads, {KEY: {"12:15": 45}}, capacity=60)
+    assert not fits(loads, {KEY: {"12:15": 45, "12:30": 50}}, capacity=60)
+    assert fits(loads, {}, capacity=15)
+
+def test_basket_above_capacity_spreads_over_earlier_slots():
+    prep_times = {"burger": 12, "fries": 5}
+    for basket in ([("burger", 6)], [("burger", 4), ("fries", 4)], [("burger", 40)]):
+        weight, longest = basket_weight(basket, prep_times)
+        loads = slot_loads(datetime(2026, 3, 14, 12, 30), weight, longest, capacity=60)
+        assert sum(minutes for _, _, minutes in loads) == weight
+        assert all(minutes <= 60 for _, _, minutes in loads)
+        assert fits(loads, {}, capacity=60)
+    # 72 prep minutes take 18 minutes of a 60-per-slot kitchen: 12:12 to 12:30
+    assert slot_loads(datetime(2026, 3, 14, 12, 30), 72, 12, capacity=60) == [(KEY, "12:00", 12), (KEY, "12:15", 60)]